@@ -0,0 +1,281 @@
+"""
+End-to-End Audit Benchmark
+Serves generated drawings (see benchmarks.dxf_generator) from a local HTTP
+server and audits them through the real entry points: the streaming audit
+(stream_audit_large_dxf) and the sync endpoint path (process_cad_file_sync:
+download, then ezdxf or the streaming audit in the worker pool).
+
+Reports MB/s and lines/s (at the median latency), p50 / p99 latency and the
+peak RSS increase of this process plus the worker pool. Every run is
+appended to benchmarks/results/e2e.jsonl and compared with the last run on
+the same machine; the script exits with status 1 when a case got slower or
+heavier by more than the threshold.
+
+Usage (from backend/):
+    python -m benchmarks.bench_e2e [SIZE ...] [--repeat N] [--targets stream,sync]
+        [--threshold SHARE] [--data-dir DIR] [--no-store]
+
+SIZE as in dxf_generator (default: 1MB 10MB 100MB). Generated drawings are
+kept in the data directory and reused.
+"""
+
+import asyncio
+import functools
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from benchmarks.dxf_generator import parse_size, write_drawing
+from core.audit_engine import EZDXF_MAX_FILE_BYTES, process_cad_file_sync
+from core.memory_stats import current_rss
+from core.streaming_audit import stream_audit_large_dxf
+from core.worker_pool import get_process_pool, shutdown_process_pool
+
+DEFAULT_SIZES = ('1MB', '10MB', '100MB')
+
+RESULTS_FILE = os.path.join(os.path.dirname(__file__), 'results', 'e2e.jsonl')
+
+# Slowdown (or memory growth) against the last stored run that counts as a regression
+DEFAULT_THRESHOLD = 0.10
+
+# Peak RSS changes below this are noise, whatever the threshold
+RSS_SLACK_MB = 32
+
+# Options of the generated drawings; a change regenerates the cached files
+DRAWING_OPTIONS = {'layers': 200, 'blocks': 20, 'colored': 0.05, 'seed': 7}
+
+_MB = 1024 * 1024
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(directory: str) -> ThreadingHTTPServer:
+    """Serve `directory` on a free local port, from a background thread."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def prepare_drawing(data_dir: str, size: int) -> dict:
+    """Generate (or reuse) the drawing for `size`; returns its file name, bytes, lines and entities."""
+    name = f"drawing-{size}.dxf"
+    path = os.path.join(data_dir, name)
+    meta_path = path + '.json'
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('options') == DRAWING_OPTIONS and meta.get('bytes') == os.path.getsize(path):
+            return meta
+    print(f"Generating {name}...", flush=True)
+    generator = write_drawing(path, total_bytes=size, **DRAWING_OPTIONS)
+    meta = {
+        'file': name,
+        'bytes': os.path.getsize(path),
+        'lines': generator.lines,
+        'entities': generator.entities,
+        'options': DRAWING_OPTIONS
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+class RssSampler:
+    """Peak resident memory of this process plus the audit worker pool, sampled from a thread."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.baseline = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def total() -> int:
+        # The executor keeps no public list of its workers
+        pids = [None] + list(getattr(get_process_pool(), '_processes', None) or {})
+        return sum(current_rss(pid) or 0 for pid in pids)
+
+    def __enter__(self):
+        self.baseline = self.peak = self.total()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.total())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.total())
+
+    @property
+    def increase_mb(self) -> float:
+        return round((self.peak - self.baseline) / _MB, 1)
+
+
+def percentile(values: List[float], share: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+async def run_case(target: str, url: str, drawing: dict, repeat: int) -> dict:
+    audit = stream_audit_large_dxf if target == 'stream' else process_cad_file_sync
+    latencies, peaks = [], []
+    for _ in range(repeat):
+        with RssSampler() as sampler:
+            start = time.perf_counter()
+            result = await audit(url)
+            latencies.append(time.perf_counter() - start)
+        peaks.append(sampler.increase_mb)
+        if result.get('status') == 'error':
+            raise RuntimeError(f"{target} audit failed: {result['summary'].get('error')}")
+
+    p50 = statistics.median(latencies)
+    if target == 'stream':
+        engine = 'stream'
+    else:
+        engine = 'stream-pool' if drawing['bytes'] > EZDXF_MAX_FILE_BYTES else 'ezdxf'
+    return {
+        'case': f"{target} {drawing['file']}",
+        'engine': engine,
+        'bytes': drawing['bytes'],
+        'lines': drawing['lines'],
+        'entities': drawing['entities'],
+        'repeat': repeat,
+        'p50_s': round(p50, 4),
+        'p99_s': round(percentile(latencies, 0.99), 4),
+        'mb_s': round(drawing['bytes'] / _MB / p50, 2),
+        'lines_s': round(drawing['lines'] / p50),
+        'peak_rss_increase_mb': max(peaks)
+    }
+
+
+def machine_id() -> str:
+    return f"{platform.node()}/{os.cpu_count()} CPU/Python {platform.python_version()}"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def load_previous(results_file: str, machine: str) -> Dict[str, dict]:
+    """Latest stored figures per case from earlier runs on this machine."""
+    previous = {}
+    if not os.path.exists(results_file):
+        return previous
+    with open(results_file) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            run = json.loads(line)
+            if run.get('machine') == machine:
+                previous.update({case['case']: case for case in run['cases']})
+    return previous
+
+
+def regressions(case: dict, before: Optional[dict], threshold: float) -> List[str]:
+    if before is None:
+        return []
+    found = []
+    if case['mb_s'] < before['mb_s'] * (1 - threshold):
+        found.append(f"throughput {before['mb_s']} -> {case['mb_s']} MB/s")
+    if case['peak_rss_increase_mb'] > before['peak_rss_increase_mb'] * (1 + threshold) + RSS_SLACK_MB:
+        found.append(f"peak RSS {before['peak_rss_increase_mb']} -> {case['peak_rss_increase_mb']} MB")
+    return found
+
+
+async def run(sizes: List[int], targets: List[str], repeat: int, data_dir: str) -> List[dict]:
+    os.makedirs(data_dir, exist_ok=True)
+    drawings = [prepare_drawing(data_dir, size) for size in sizes]
+    server = start_server(data_dir)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    # Start the worker pool outside the measurements ('test' audits the built-in drawing)
+    await process_cad_file_sync('test')
+    try:
+        cases = []
+        for drawing in drawings:
+            for target in targets:
+                cases.append(await run_case(target, f"{base_url}/{drawing['file']}", drawing, repeat))
+        return cases
+    finally:
+        server.shutdown()
+        shutdown_process_pool()
+
+
+def main():
+    logger.remove()  # Per-audit logs would drown the table
+
+    sizes, targets, repeat = [], ['stream', 'sync'], 5
+    threshold, store = DEFAULT_THRESHOLD, True
+    data_dir = os.path.join(tempfile.gettempdir(), 'sigebim-bench')
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg == '--repeat':
+            repeat = int(next(args))
+        elif arg == '--targets':
+            targets = next(args).split(',')
+        elif arg == '--threshold':
+            threshold = float(next(args))
+        elif arg == '--data-dir':
+            data_dir = next(args)
+        elif arg == '--no-store':
+            store = False
+        else:
+            sizes.append(parse_size(arg))
+    sizes = sizes or [parse_size(size) for size in DEFAULT_SIZES]
+
+    machine = machine_id()
+    previous = load_previous(RESULTS_FILE, machine)
+    cases = asyncio.run(run(sizes, targets, repeat, data_dir))
+
+    print(f"{'case':<28} {'engine':<12} {'MB/s':>8} {'lines/s':>12} {'p50':>9} {'p99':>9} {'peak +RSS':>10}")
+    failed = False
+    for case in cases:
+        print(
+            f"{case['case']:<28} {case['engine']:<12} {case['mb_s']:>8.1f} {case['lines_s']:>12,} "
+            f"{case['p50_s']:>8.3f}s {case['p99_s']:>8.3f}s {case['peak_rss_increase_mb']:>7.1f} MB"
+        )
+        for problem in regressions(case, previous.get(case['case']), threshold):
+            print(f"    REGRESSION: {problem}")
+            failed = True
+
+    if store:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        record = {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'commit': git_commit(),
+            'machine': machine,
+            'cases': cases
+        }
+        with open(RESULTS_FILE, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"Results appended to {RESULTS_FILE}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
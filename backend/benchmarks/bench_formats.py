@@ -0,0 +1,71 @@
+"""
+Upload Format Benchmark
+Streaming audit throughput for the same drawing stored as ASCII DXF, binary
+DXF and their gzip / zstd compressed versions: bytes to transfer, audit time
+and throughput over the raw (as stored) bytes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_formats [entities]
+"""
+
+import gzip
+import sys
+import time
+
+import zstandard
+
+from benchmarks.synthetic import build_dxf, iter_chunks, to_binary_dxf
+from core.dxf_formats import StreamDecoder
+from core.streaming_audit import AUDIT_CHUNK_SIZE, DxfStreamAuditor
+
+
+def audit(data: bytes) -> dict:
+    """What _audit_chunks does with a stream, without the network."""
+    decoder = StreamDecoder()
+    auditor = DxfStreamAuditor()
+    for chunk in iter_chunks(data, AUDIT_CHUNK_SIZE):
+        for block in decoder.feed(chunk):
+            auditor.feed(block)
+    for block in decoder.close():
+        auditor.feed(block)
+    auditor.close()
+    return auditor.build_report()
+
+
+def best(data: bytes, repeat: int = 3):
+    times, report = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        report = audit(data)
+        times.append(time.perf_counter() - start)
+    return report, min(times)
+
+
+def main():
+    entities = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    ascii_dxf = build_dxf(entities=entities)
+    binary_dxf = to_binary_dxf(ascii_dxf)
+    zstd = zstandard.ZstdCompressor(level=3)
+    payloads = {
+        'ascii': ascii_dxf,
+        'binary': binary_dxf,
+        'ascii+gzip': gzip.compress(ascii_dxf, compresslevel=6),
+        'ascii+zstd': zstd.compress(ascii_dxf),
+        'binary+gzip': gzip.compress(binary_dxf, compresslevel=6),
+        'binary+zstd': zstd.compress(binary_dxf),
+    }
+    print(f"{entities:,} entities, chunk size {AUDIT_CHUNK_SIZE // 1024} KB")
+    print(f"{'format':<12} {'stored MB':>10} {'vs ascii':>9} {'audit ms':>9} {'MB/s':>8} {'M ent/s':>8}")
+
+    reference = None
+    for name, data in payloads.items():
+        report, elapsed = best(data)
+        if reference is None:
+            reference = report
+        assert report == reference, f"{name} report differs from the ASCII audit"
+        print(f"{name:<12} {len(data) / 1e6:>10.1f} {len(data) / len(ascii_dxf):>8.0%} {elapsed * 1000:>9.0f} "
+              f"{len(data) / elapsed / 1e6:>8.1f} {entities / elapsed / 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
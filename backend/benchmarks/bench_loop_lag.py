@@ -0,0 +1,51 @@
+"""
+Event Loop Lag Benchmark
+Measures event loop lag while an ezdxf audit runs, inline (the old
+behaviour) versus offloaded to the worker pool.
+
+Usage (from backend/):
+    python -m benchmarks.bench_loop_lag [entities]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import build_dxf
+from core.audit_engine import audit_dxf_document
+from core.loop_monitor import LoopLagMonitor
+from core.worker_pool import get_process_pool, shutdown_process_pool
+
+
+async def run(label: str, path: str, offload: bool) -> None:
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.1)
+    start = time.perf_counter()
+    if offload:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(get_process_pool(), audit_dxf_document, path)
+    else:
+        audit_dxf_document(path)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.1)
+    monitor.stop()
+    lag = monitor.snapshot()
+    print(f"{label:<10} audit {elapsed * 1000:8.1f} ms   lag p99 {lag['p99_ms']:8.1f} ms   max {lag['max_ms']:8.1f} ms")
+
+
+async def main():
+    entities = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with tempfile.NamedTemporaryFile(suffix='.dxf') as f:
+        f.write(build_dxf(entities=entities))
+        f.flush()
+        # Warm the pool so process start-up is not counted
+        await asyncio.get_running_loop().run_in_executor(get_process_pool(), audit_dxf_document, '')
+        await run("inline", f.name, offload=False)
+        await run("offloaded", f.name, offload=True)
+    shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
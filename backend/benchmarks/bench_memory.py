@@ -0,0 +1,82 @@
+"""
+Audit Memory Ceiling Check
+Streams synthetic DXF files of several GB through the auditor (generated on
+the fly, never held in memory) plus a few pathological inputs, and checks
+that the peak RSS increase of each audit stays under a ceiling. Exits with
+status 1 when a case goes over it.
+
+Cases: a regular drawing whose distinct layer count grows with the size,
+classic Mac ('\\r') line endings, 1 MB lines, and a file without any line
+break at all.
+
+Usage (from backend/):
+    python -m benchmarks.bench_memory [gigabytes ...] [--ceiling MB]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import iter_large_dxf
+from core.memory_stats import MemoryMonitor
+from core.streaming_audit import AUDIT_CHUNK_SIZE, DxfStreamAuditor
+
+# Peak RSS increase allowed per audit
+DEFAULT_CEILING_MB = 256
+
+# Size of the pathological cases
+EDGE_CASE_BYTES = 256 * 1024 * 1024
+
+
+def no_line_breaks(total_bytes: int):
+    """A DXF header followed by one endless line."""
+    yield b'  0\nSECTION\n  2\nENTITIES\n  0\nTEXT\n  1\n'
+    blob = b'X' * AUDIT_CHUNK_SIZE
+    for _ in range(total_bytes // len(blob)):
+        yield blob
+
+
+def run_case(name: str, chunks, ceiling_mb: float) -> bool:
+    memory = MemoryMonitor(trace=False)
+    auditor = DxfStreamAuditor()
+    size = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        auditor.feed(chunk)
+        size += len(chunk)
+        memory.sample()
+    auditor.close()
+    report = auditor.build_report()
+    elapsed = time.perf_counter() - start
+    figures = memory.finish()
+    ok = figures['peak_increase_mb'] <= ceiling_mb
+    overflow = report['summary'].get('overflow', {})
+    print(f"{name:<22} {size / 1e9:>6.2f} GB {elapsed:>7.1f} s {size / elapsed / 1e6:>7.1f} MB/s "
+          f"{figures['peak_increase_mb']:>8.1f} MB {'ok' if ok else 'OVER'}  "
+          f"{report['summary']['entities']:,} entities, {report['summary']['total_layers']:,} layers, overflow {overflow}")
+    return ok
+
+
+def main():
+    args = sys.argv[1:]
+    ceiling = DEFAULT_CEILING_MB
+    if '--ceiling' in args:
+        at = args.index('--ceiling')
+        ceiling = float(args[at + 1])
+        del args[at:at + 2]
+    sizes = [float(a) for a in args] or [1.0]
+
+    print(f"Ceiling: {ceiling:.0f} MB peak RSS increase per audit")
+    print(f"{'case':<22} {'size':>9} {'time':>9} {'speed':>12} {'peak +RSS':>11}")
+    results = [
+        run_case('CR line endings', iter_large_dxf(EDGE_CASE_BYTES, line_ending=b'\r'), ceiling),
+        run_case('1 MB lines', iter_large_dxf(EDGE_CASE_BYTES, long_line_bytes=1024 * 1024), ceiling),
+        run_case('no line breaks', no_line_breaks(EDGE_CASE_BYTES), ceiling),
+    ]
+    for gigabytes in sizes:
+        results.append(run_case(f'{gigabytes:g} GB drawing', iter_large_dxf(int(gigabytes * 1e9)), ceiling))
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+R2 Client Benchmark
+Per-request latency of building a fresh boto3 client (the old behaviour)
+versus reusing the shared client, measured on presigned URL generation,
+and the cost of signing all part URLs of a large multipart upload.
+No network access is needed; dummy credentials are used when R2 is not configured.
+
+Usage (from backend/):
+    python -m benchmarks.bench_r2_client [requests]
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault("R2_ENDPOINT", "https://example.r2.cloudflarestorage.com")
+os.environ.setdefault("R2_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("R2_SECRET_ACCESS_KEY", "benchmark")
+
+from core import r2_client  # noqa: E402
+from core.r2_presign import get_part_url_signer  # noqa: E402
+
+
+def presign(client, part_number: int) -> str:
+    return client.generate_presigned_url(
+        'upload_part',
+        Params={'Bucket': r2_client.R2_BUCKET, 'Key': 'bench/file.dxf', 'UploadId': 'bench', 'PartNumber': part_number},
+        ExpiresIn=3600
+    )
+
+
+def measure(label: str, get_client, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(1, requests + 1):
+        presign(get_client(), i)
+    per_request = (time.perf_counter() - start) / requests * 1000
+    print(f"{label:<14} {per_request:8.3f} ms/request")
+    return per_request
+
+
+def measure_part_urls(parts: int) -> None:
+    client = r2_client.get_r2_client()
+    start = time.perf_counter()
+    for i in range(1, parts + 1):
+        presign(client, i)
+    boto_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    get_part_url_signer().sign_part_urls('bench/file.dxf', 'bench', 1, parts)
+    local_ms = (time.perf_counter() - start) * 1000
+    print(f"{parts} part URLs: boto3 {boto_ms:8.1f} ms   local bulk {local_ms:8.1f} ms   ({boto_ms / local_ms:.1f}x)")
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    fresh = measure("fresh client", r2_client._build_client, requests)
+    shared = measure("shared client", r2_client.get_r2_client, requests)
+    print(f"Speed-up: {fresh / shared:.1f}x")
+    measure_part_urls(1000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Revision Audit Benchmark
+Full audit versus incremental audit of a revision that edits 1% of the
+entities (one contiguous stretch of the drawing, plus a few insertions).
+
+Usage (from backend/):
+    python -m benchmarks.bench_revision [entities]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import build_dxf, iter_chunks
+from core.audit_rules import load_ruleset
+from core.revision_audit import RevisionAuditor, RevisionFingerprint
+from core.streaming_audit import AUDIT_CHUNK_SIZE, DxfStreamAuditor, build_audit_report
+
+
+def make_revision(data: bytes, share: float = 0.01) -> bytes:
+    """Move the LINE entities of one stretch of the file and add a few new ones."""
+    parts = data.decode('ascii').split('  0\n')
+    start = len(parts) // 3
+    end = start + max(1, int(len(parts) * share))
+    for i in range(start, end):
+        if parts[i].startswith('LINE'):
+            parts[i] = parts[i].replace(' 11\n', ' 11\n1', 1)
+    for i in range(5):
+        parts.insert(end + 100 * i, f'CIRCLE\n  5\nFFFF{i}\n  8\nNUEVA\n 10\n1.0\n 20\n2.0\n 30\n0.0\n 40\n1.0\n')
+    return '  0\n'.join(parts).encode('ascii')
+
+
+def full_audit(data: bytes, rules) -> dict:
+    auditor = DxfStreamAuditor(rules=rules)
+    for chunk in iter_chunks(data, AUDIT_CHUNK_SIZE):
+        auditor.feed(chunk)
+        if auditor.done:
+            break
+    auditor.close()
+    return auditor.build_report()
+
+
+def revision_audit(data: bytes, rules, previous):
+    auditor = RevisionAuditor(rules, previous)
+    for chunk in iter_chunks(data, AUDIT_CHUNK_SIZE):
+        auditor.feed(chunk)
+        if auditor.done:
+            break
+    auditor.close()
+    report = build_audit_report(auditor.statistics(), auditor.total_lines, rules)
+    fingerprint = auditor.fingerprint([i for i in report['details'] if i['severity'] != 'pass'])
+    return auditor, report, fingerprint
+
+
+def best(fn, *args, repeat: int = 3):
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    entities = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    rules = load_ruleset()
+    first = build_dxf(entities=entities)
+    second = make_revision(first)
+    print(f"Payload: {len(second) / 1e6:.1f} MB, {entities:,} entities, 1% edited")
+
+    (_, _, fingerprint), first_time = best(revision_audit, first, rules, None, repeat=1)
+    stored = fingerprint.to_bytes()
+    previous = RevisionFingerprint.from_bytes(stored)
+    print(f"First revision (fingerprint): {first_time * 1000:.0f} ms, fingerprint {len(stored) / 1e6:.2f} MB")
+
+    reference, full_time = best(full_audit, second, rules)
+    (auditor, report, _), incremental_time = best(revision_audit, second, rules, previous)
+    assert report == reference, "incremental report differs from the full audit"
+    print(f"Full audit:        {full_time * 1000:>8.0f} ms")
+    print(f"Incremental audit: {incremental_time * 1000:>8.0f} ms  ({full_time / incremental_time:.1f}x), "
+          f"{auditor.reused_blocks}/{len(auditor.blocks)} blocks reused, "
+          f"{auditor.parsed_bytes / len(second):.1%} of the bytes parsed")
+
+
+if __name__ == "__main__":
+    main()
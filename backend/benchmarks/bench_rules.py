@@ -0,0 +1,81 @@
+"""
+Rule Engine Scaling Benchmark
+Streaming audit throughput with 0, 10, 100 and 1,000 compiled rules.
+
+Half of each generated rule set are per-entity value rules (dispatched during
+the pass); the rest are drawing-level rules evaluated on the final statistics.
+
+Usage (from backend/):
+    python -m benchmarks.bench_rules [entities]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import build_dxf, iter_chunks
+from core.audit_rules import compile_ruleset
+from core.streaming_audit import AUDIT_CHUNK_SIZE, DxfStreamAuditor
+
+# (entity type, group code, typical value range) present in the synthetic drawing
+VALUE_TARGETS = [
+    ('LINE', 10, (0, 5000)),
+    ('LINE', 21, (0, 5010)),
+    ('CIRCLE', 40, (2.5, 2.5)),
+    ('TEXT', 40, (2.0, 2.0)),
+    ('*', 20, (0, 5000)),
+]
+
+
+def generate_ruleset(count: int, layers: int = 50) -> dict:
+    rules = []
+    layer_names = [f"CAPA-{i:03d}" for i in range(layers)]
+    for i in range(count):
+        kind = i % 6
+        if kind in (0, 1):
+            entity, code, (lo, hi) = VALUE_TARGETS[i % len(VALUE_TARGETS)]
+            rules.append({'id': f'R{i}', 'type': 'entity_value', 'entity': entity, 'group_code': code,
+                          'min': lo - 1 - i % 7, 'max': hi + 1 + i % 11})
+        elif kind == 2:
+            rules.append({'id': f'R{i}', 'type': 'entity_value', 'entity': 'LINE', 'group_code': 8,
+                          'allowed': layer_names})
+        elif kind == 3:
+            rules.append({'id': f'R{i}', 'type': 'layer_name', 'pattern': r'CAPA-\d{3}'})
+        elif kind == 4:
+            rules.append({'id': f'R{i}', 'type': 'required_layer', 'layers': [layer_names[i % layers]]})
+        else:
+            rules.append({'id': f'R{i}', 'type': 'entity_limit', 'entity': 'TEXT', 'max': 10 ** 7})
+    return {'id': f'bench-{count}', 'rules': rules}
+
+
+def run(data: bytes, ruleset, repeat: int = 3):
+    best_parse = best_report = float('inf')
+    for _ in range(repeat):
+        auditor = DxfStreamAuditor(rules=ruleset)
+        start = time.perf_counter()
+        for chunk in iter_chunks(data, AUDIT_CHUNK_SIZE):
+            auditor.feed(chunk)
+        auditor.close()
+        parsed = time.perf_counter()
+        report = auditor.build_report()
+        best_parse = min(best_parse, parsed - start)
+        best_report = min(best_report, time.perf_counter() - parsed)
+    return best_parse, best_report, report
+
+
+def main():
+    entities = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    data = build_dxf(entities=entities)
+    print(f"Payload: {len(data) / 1e6:.1f} MB, {entities:,} entities")
+    print(f"{'rules':>6} {'parse ms':>10} {'MB/s':>8} {'vs 0':>7} {'report ms':>10} {'issues':>7}")
+
+    baseline = None
+    for count in (0, 10, 100, 1000):
+        ruleset = compile_ruleset(generate_ruleset(count))
+        parse, report_time, report = run(data, ruleset)
+        baseline = baseline or parse
+        issues = len([d for d in report['details'] if d['severity'] != 'pass'])
+        print(f"{count:>6} {parse * 1000:>10.1f} {len(data) / parse / 1e6:>8.1f} {parse / baseline:>6.2f}x {report_time * 1000:>10.1f} {issues:>7}")
+
+
+if __name__ == "__main__":
+    main()
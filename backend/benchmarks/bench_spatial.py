@@ -0,0 +1,83 @@
+"""
+Spatial Check Benchmark
+Overlap and clearance checks on the spatial grid at up to 1M entity extents,
+against the brute-force n² comparison (measured on small inputs, extrapolated
+for the large ones).
+
+Extents mimic a floor plan: short wall segments, columns and texts spread
+over an area that grows with the entity count, plus a few large boxes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_spatial [max_entities]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from core.spatial_index import SpatialGrid, _gaps, find_clearance_violations, find_overlaps
+
+# Brute force is measured directly up to this size
+BRUTE_FORCE_LIMIT = 20000
+
+CLEARANCE = 0.5
+
+
+def build_extents(count: int, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    side = np.sqrt(count) * 10.0
+    x = rng.uniform(0, side, count)
+    y = rng.uniform(0, side, count)
+    kind = np.arange(count) % 3
+    # Walls: 10 units long, horizontal or vertical; columns 0.6 square; texts 4 x 1
+    horizontal = rng.random(count) < 0.5
+    w = np.where(kind == 0, np.where(horizontal, 10.0, 0.2), np.where(kind == 1, 0.6, 4.0))
+    h = np.where(kind == 0, np.where(horizontal, 0.2, 10.0), np.where(kind == 1, 0.6, 1.0))
+    big = rng.random(count) < 1e-4
+    w[big] *= 50
+    h[big] *= 50
+    return np.column_stack((x, y, x + w, y + h))
+
+
+def brute_force(bounds: np.ndarray, distance: float) -> int:
+    """Pairs within `distance`, comparing every row with all the rows after it."""
+    found = 0
+    for row in range(len(bounds) - 1):
+        rest = np.arange(row + 1, len(bounds))
+        found += int((_gaps(bounds, np.full(len(rest), row), rest) <= distance).sum())
+    return found
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sizes = [n for n in (10_000, 100_000, 1_000_000) if n <= largest] or [largest]
+    print(f"{'entities':>10} {'build ms':>9} {'overlap ms':>11} {'pairs':>9} {'clear ms':>9} {'pairs':>9} {'brute s':>9}")
+
+    brute_rate = None
+    for count in sizes:
+        bounds = build_extents(count)
+        _, build = timed(SpatialGrid, bounds)
+        (overlaps, _, _), overlap_time = timed(find_overlaps, bounds)
+        (close, _, _), clearance_time = timed(find_clearance_violations, bounds, CLEARANCE)
+
+        if count <= BRUTE_FORCE_LIMIT:
+            found, brute = timed(brute_force, bounds, 0.0)
+            grid_found = len(SpatialGrid(bounds).pairs(0.0)[0])
+            assert found == grid_found, f"grid found {grid_found} pairs, brute force {found}"
+            brute_rate = brute / (count * count)
+            brute_label = f"{brute:>9.2f}"
+        else:
+            brute_label = f"~{brute_rate * count * count:>8.0f}" if brute_rate else f"{'-':>9}"
+        print(f"{count:>10,} {build * 1000:>9.0f} {overlap_time * 1000:>11.0f} {len(overlaps):>9,} "
+              f"{clearance_time * 1000:>9.0f} {len(close):>9,} {brute_label}")
+
+
+if __name__ == "__main__":
+    main()
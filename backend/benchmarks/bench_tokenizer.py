@@ -0,0 +1,107 @@
+"""
+Tokenizer Throughput Benchmark
+Compares the legacy text line loop against the byte-level group-code tokenizer.
+
+Usage (from backend/):
+    python -m benchmarks.bench_tokenizer [entities]
+"""
+
+import sys
+import time
+
+from benchmarks.synthetic import build_dxf, iter_chunks
+from core.streaming_audit import AUDIT_CHUNK_SIZE, DxfStreamAuditor
+
+
+def legacy_line_loop(data: bytes, chunk_size: int) -> int:
+    """The pre-tokenizer loop: decode, re-split the buffer, compare strings."""
+    stats = {'total_lines': 0, 'layers': {}, 'entities': {'LINE': 0, 'CIRCLE': 0, 'TEXT': 0, 'OTHER': 0},
+             'min_x': float('inf'), 'max_x': float('-inf'), 'min_y': float('inf'), 'max_y': float('-inf'),
+             'min_z': float('inf'), 'max_z': float('-inf'), 'version': 'Unknown'}
+    in_entities_section = False
+    in_header_section = False
+    prev_line = ""
+    buffer = ""
+    for raw in iter_chunks(data, chunk_size):
+        buffer += raw.decode('utf-8')
+        lines = buffer.split('\n')
+        buffer = lines[-1]
+        for line in lines[:-1]:
+            line = line.strip()
+            stats['total_lines'] += 1
+            if line == 'HEADER':
+                in_header_section = True
+                in_entities_section = False
+            elif line == 'ENTITIES':
+                in_entities_section = True
+                in_header_section = False
+            elif line == 'ENDSEC':
+                in_header_section = False
+                in_entities_section = False
+            if in_header_section and prev_line == '1' and line.startswith('AC'):
+                stats['version'] = line
+            if in_entities_section and prev_line == '0':
+                if line in stats['entities']:
+                    stats['entities'][line] += 1
+                elif line not in ['ENDSEC', 'SEQEND', 'ATTRIB', 'VERTEX']:
+                    stats['entities']['OTHER'] += 1
+            if prev_line == '8' and in_entities_section:
+                if line not in stats['layers']:
+                    stats['layers'][line] = {'count': 0, 'color': 7}
+                stats['layers'][line]['count'] += 1
+            if prev_line == '10':
+                try:
+                    x = float(line)
+                    stats['min_x'] = min(stats['min_x'], x)
+                    stats['max_x'] = max(stats['max_x'], x)
+                except ValueError:
+                    pass
+            if prev_line == '20':
+                try:
+                    y = float(line)
+                    stats['min_y'] = min(stats['min_y'], y)
+                    stats['max_y'] = max(stats['max_y'], y)
+                except ValueError:
+                    pass
+            if prev_line == '30':
+                try:
+                    z = float(line)
+                    stats['min_z'] = min(stats['min_z'], z)
+                    stats['max_z'] = max(stats['max_z'], z)
+                except ValueError:
+                    pass
+            prev_line = line
+    return stats['total_lines']
+
+
+def tokenizer_loop(data: bytes, chunk_size: int) -> int:
+    auditor = DxfStreamAuditor()
+    for chunk in iter_chunks(data, chunk_size):
+        auditor.feed(chunk)
+    auditor.close()
+    auditor.build_report()
+    return auditor.total_lines
+
+
+def measure(label: str, func, data: bytes, chunk_size: int, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines = func(data, chunk_size)
+        best = min(best, time.perf_counter() - start)
+    mb_s = len(data) / best / 1e6
+    print(f"{label:<12} {best * 1000:8.1f} ms  {mb_s:8.1f} MB/s  {lines / best / 1e6:6.2f} M lines/s")
+    return mb_s
+
+
+def main():
+    entities = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    data = build_dxf(entities=entities)
+    print(f"Payload: {len(data) / 1e6:.1f} MB, chunk size {AUDIT_CHUNK_SIZE // 1024} KB")
+    legacy = measure("legacy", legacy_line_loop, data, AUDIT_CHUNK_SIZE)
+    tokenized = measure("tokenizer", tokenizer_loop, data, AUDIT_CHUNK_SIZE)
+    print(f"Speed-up: {tokenized / legacy:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Synthetic Drawing Generator
+Writes realistic DXF files of any size (1 MB to several GB) for the
+benchmarks: header, tables, blocks and objects built by ezdxf around an
+ENTITIES section streamed to disk with a configurable entity mix, so both
+ezdxf and the streaming auditor read the result.
+
+Usage (from backend/):
+    python -m benchmarks.dxf_generator OUTPUT SIZE [--layers N] [--blocks N]
+        [--mix LINE=40,LWPOLYLINE=20,CIRCLE=10,ARC=10,TEXT=12,INSERT=8]
+        [--colored SHARE] [--seed N] [--gzip]
+
+SIZE is a byte count or has a KB / MB / GB suffix (100MB, 5GB).
+"""
+
+import gzip
+import io
+import random
+import re
+import sys
+import time
+from typing import Dict, Iterator, Optional
+
+import ezdxf
+
+# Share of each entity type in the ENTITIES section
+DEFAULT_MIX = {'LINE': 40, 'LWPOLYLINE': 20, 'CIRCLE': 10, 'ARC': 10, 'TEXT': 12, 'INSERT': 8}
+
+# Layers every architectural drawing is expected to have (see rules/arquitectura.json)
+BASE_LAYERS = (('MUROS', 1, 'Continuous'), ('COLUMNAS', 2, 'Continuous'), ('EJES', 4, 'CENTER'), ('TEXTO', 7, 'Continuous'))
+
+# Entities written per output block
+ENTITIES_PER_BLOCK = 5000
+
+# Smallest entity the templates produce, to bound the handles a size can need
+MIN_ENTITY_BYTES = 100
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    """Byte count from '5000', '500KB', '100MB' or '5GB'."""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?B?)\s*', text.upper())
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """Entity mix from 'LINE=40,CIRCLE=10'."""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip().upper()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unsupported entity type: {name} (use {', '.join(DEFAULT_MIX)})")
+        mix[name] = int(weight)
+    return mix
+
+
+class DrawingGenerator:
+    """
+    Streams one synthetic R2010 drawing of about `total_bytes`.
+
+    Entities go to `layers` layers (the BASE_LAYERS plus CAPA-nnnn ones, a
+    few on layer 0), INSERTs reference `blocks` block definitions (ROTULO
+    plus BLK-nnn ones) and a `colored` share carries an explicit color.
+    Coordinates cover a 5 km square. `counts` (entities per type) and
+    `lines` hold what was written once the stream has been consumed.
+    """
+
+    def __init__(
+        self,
+        total_bytes: int,
+        layers: int = 200,
+        blocks: int = 20,
+        mix: Optional[Dict[str, int]] = None,
+        colored: float = 0.05,
+        seed: int = 7
+    ):
+        self.total_bytes = total_bytes
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.colored = colored
+        self.seed = seed
+        self.counts: Dict[str, int] = {name: 0 for name in self.mix}
+        self.lines = 0
+        self.layer_names = [name for name, _, _ in BASE_LAYERS][:layers]
+        self.layer_names += [f"CAPA-{i:04d}" for i in range(max(0, layers - len(BASE_LAYERS)))]
+        self.block_names = ['ROTULO'] + [f"BLK-{i:03d}" for i in range(max(0, blocks - 1))]
+        self._head, self._tail, self._owner, self._first_handle = self._document_parts()
+
+    @property
+    def entities(self) -> int:
+        return sum(self.counts.values())
+
+    def _document_parts(self):
+        """Everything but the entities, as written by ezdxf, split around ENTITIES."""
+        doc = ezdxf.new('R2010', setup=True)
+        for name, color, linetype in BASE_LAYERS:
+            if name in self.layer_names:
+                doc.layers.add(name, color=color, linetype=linetype)
+        rng = random.Random(self.seed)
+        for name in self.layer_names[len(BASE_LAYERS):]:
+            doc.layers.add(name, color=rng.randint(1, 250))
+        for name in self.block_names:
+            block = doc.blocks.new(name)
+            block.add_lwpolyline([(0, 0), (100, 0), (100, 50), (0, 50)], close=True)
+            block.add_text(name, dxfattribs={'height': 2.5, 'insert': (5, 5)})
+
+        stream = io.StringIO()
+        doc.write(stream)
+        text = stream.getvalue()
+        first_handle = int(doc.entitydb.handles.next(), 16)
+        last_handle = first_handle + self.total_bytes // MIN_ENTITY_BYTES + 1
+        # Handles are handed out as entities are written, so the seed covers the largest count
+        text = re.sub(r'(\$HANDSEED\n  5\n)[0-9A-F]+\n', rf'\g<1>{last_handle:X}\n', text, count=1)
+        marker = '  2\nENTITIES\n'
+        split = text.index(marker) + len(marker)
+        return text[:split].encode('utf-8'), text[split:].encode('utf-8'), doc.modelspace().layout_key, first_handle
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        """The drawing, in blocks of ENTITIES_PER_BLOCK entities."""
+        rng = random.Random(self.seed)
+        kinds = list(self.mix)
+        weights = [self.mix[name] for name in kinds]
+        writers = {
+            'LINE': self._line, 'LWPOLYLINE': self._lwpolyline, 'CIRCLE': self._circle,
+            'ARC': self._arc, 'TEXT': self._text, 'INSERT': self._insert
+        }
+        # A few entities on layer 0 make LAYER_DEFAULT fire, as in real drawings
+        layers = self.layer_names + ['0']
+        layer_weights = [100] * len(self.layer_names) + [1]
+        handle = self._first_handle
+        owner = self._owner
+
+        self.lines = self._head.count(b'\n') + self._tail.count(b'\n')
+        yield self._head
+        written = len(self._head) + len(self._tail)
+        while written < self.total_bytes:
+            out = []
+            for kind in rng.choices(kinds, weights, k=ENTITIES_PER_BLOCK):
+                layer = rng.choices(layers, layer_weights)[0]
+                color = f"\n 62\n{rng.randint(1, 255)}" if rng.random() < self.colored else ''
+                common = f"  5\n{handle:X}\n330\n{owner}\n100\nAcDbEntity\n  8\n{layer}{color}\n"
+                out.append(writers[kind](rng, common))
+                self.counts[kind] += 1
+                handle += 1
+            data = ''.join(out).encode('utf-8')
+            # The last block is cut at an entity so the file stays close to the requested size
+            if written + len(data) > self.total_bytes:
+                cut = data.find(b'  0\n', max(0, self.total_bytes - written))
+                if cut != -1:
+                    self._uncount(data[cut:])
+                    data = data[:cut]
+            self.lines += data.count(b'\n')
+            yield data
+            written += len(data)
+        yield self._tail
+
+    def _uncount(self, dropped: bytes) -> None:
+        for kind in re.findall(rb'  0\n([A-Z]+)\n', dropped):
+            self.counts[kind.decode('ascii')] -= 1
+
+    @staticmethod
+    def _point(rng: random.Random) -> str:
+        return f" 10\n{rng.uniform(0, 5000):.4f}\n 20\n{rng.uniform(0, 5000):.4f}\n 30\n0.0\n"
+
+    def _line(self, rng: random.Random, common: str) -> str:
+        x, y = rng.uniform(0, 5000), rng.uniform(0, 5000)
+        return (
+            f"  0\nLINE\n{common}100\nAcDbLine\n 10\n{x:.4f}\n 20\n{y:.4f}\n 30\n0.0\n"
+            f" 11\n{x + rng.uniform(-20, 20):.4f}\n 21\n{y + rng.uniform(-20, 20):.4f}\n 31\n0.0\n"
+        )
+
+    def _lwpolyline(self, rng: random.Random, common: str) -> str:
+        x, y = rng.uniform(0, 5000), rng.uniform(0, 5000)
+        points = rng.randint(3, 12)
+        vertices = ''.join(
+            f" 10\n{x + rng.uniform(0, 30):.4f}\n 20\n{y + rng.uniform(0, 30):.4f}\n" for _ in range(points)
+        )
+        return f"  0\nLWPOLYLINE\n{common}100\nAcDbPolyline\n 90\n{points}\n 70\n{rng.randint(0, 1)}\n 43\n0.0\n{vertices}"
+
+    def _circle(self, rng: random.Random, common: str) -> str:
+        return f"  0\nCIRCLE\n{common}100\nAcDbCircle\n{self._point(rng)} 40\n{rng.uniform(0.5, 10):.4f}\n"
+
+    def _arc(self, rng: random.Random, common: str) -> str:
+        return (
+            f"  0\nARC\n{common}100\nAcDbCircle\n{self._point(rng)} 40\n{rng.uniform(0.5, 10):.4f}\n"
+            f"100\nAcDbArc\n 50\n{rng.uniform(0, 180):.4f}\n 51\n{rng.uniform(180, 360):.4f}\n"
+        )
+
+    def _text(self, rng: random.Random, common: str) -> str:
+        label = rng.choice(('EJE', 'COTA', 'NIVEL', 'LOCAL', 'P'))
+        return (
+            f"  0\nTEXT\n{common}100\nAcDbText\n{self._point(rng)} 40\n{rng.choice((1.5, 2.0, 2.5, 5.0))}\n"
+            f"  1\n{label} {rng.randint(1, 999)}\n100\nAcDbText\n"
+        )
+
+    def _insert(self, rng: random.Random, common: str) -> str:
+        return f"  0\nINSERT\n{common}100\nAcDbBlockReference\n  2\n{rng.choice(self.block_names)}\n{self._point(rng)}"
+
+
+def write_drawing(path: str, compress: bool = False, **options) -> DrawingGenerator:
+    """Write a synthetic drawing (gzip compressed when `compress`); options go to DrawingGenerator."""
+    generator = DrawingGenerator(**options)
+    opener = gzip.open if compress else open
+    with opener(path, 'wb') as f:
+        for data in generator.iter_bytes():
+            f.write(data)
+    return generator
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print(__doc__)
+        sys.exit(2)
+    options = {'total_bytes': parse_size(args[1])}
+    compress = False
+    rest = iter(args[2:])
+    for flag in rest:
+        if flag == '--gzip':
+            compress = True
+        elif flag == '--layers':
+            options['layers'] = int(next(rest))
+        elif flag == '--blocks':
+            options['blocks'] = int(next(rest))
+        elif flag == '--mix':
+            options['mix'] = parse_mix(next(rest))
+        elif flag == '--colored':
+            options['colored'] = float(next(rest))
+        elif flag == '--seed':
+            options['seed'] = int(next(rest))
+        else:
+            raise SystemExit(f"Unknown option: {flag}")
+
+    start = time.perf_counter()
+    generator = write_drawing(args[0], compress=compress, **options)
+    elapsed = time.perf_counter() - start
+    mix = ', '.join(f"{name} {count:,}" for name, count in generator.counts.items())
+    print(f"{args[0]}: {generator.entities:,} entities ({mix}) in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Synthetic DXF Builder
+Produces in-memory ASCII (or binary) DXF payloads for the benchmark scripts.
+"""
+
+import random
+import struct
+
+from core.dxf_tokenizer import (
+    BINARY_SENTINEL, GroupCodeTokenizer, _BOOL, _CHUNK, _DOUBLE, _INT16, _INT32, _INT64, _VALUE_KINDS
+)
+
+
+def build_dxf(entities: int = 200000, layers: int = 50, seed: int = 7) -> bytes:
+    """
+    Build an ASCII DXF with a HEADER section and an ENTITIES section holding
+    a mix of LINE, CIRCLE and TEXT entities spread over `layers` layers.
+    """
+    rng = random.Random(seed)
+    layer_names = [f"CAPA-{i:03d}" for i in range(layers)]
+    out = [
+        "  0\nSECTION\n  2\nHEADER\n  9\n$ACADVER\n  1\nAC1024\n  0\nENDSEC\n",
+        "  0\nSECTION\n  2\nENTITIES\n",
+    ]
+    for handle in range(entities):
+        layer = layer_names[handle % layers]
+        x = rng.uniform(0, 5000)
+        y = rng.uniform(0, 5000)
+        kind = handle % 3
+        if kind == 0:
+            out.append(
+                f"  0\nLINE\n  5\n{handle + 0x100:X}\n  8\n{layer}\n"
+                f" 10\n{x:.4f}\n 20\n{y:.4f}\n 30\n0.0\n"
+                f" 11\n{x + 10:.4f}\n 21\n{y + 10:.4f}\n 31\n0.0\n"
+            )
+        elif kind == 1:
+            out.append(
+                f"  0\nCIRCLE\n  5\n{handle + 0x100:X}\n  8\n{layer}\n"
+                f" 10\n{x:.4f}\n 20\n{y:.4f}\n 30\n0.0\n 40\n2.5\n"
+            )
+        else:
+            out.append(
+                f"  0\nTEXT\n  5\n{handle + 0x100:X}\n  8\n{layer}\n"
+                f" 10\n{x:.4f}\n 20\n{y:.4f}\n 30\n0.0\n 40\n2.0\n  1\nEJE {handle}\n"
+            )
+    out.append("  0\nENDSEC\n  0\nEOF\n")
+    return "".join(out).encode('ascii')
+
+
+def to_binary_dxf(data: bytes) -> bytes:
+    """Re-encode an ASCII DXF payload as binary DXF (R13+ 2-byte group codes)."""
+    tokenizer = GroupCodeTokenizer()
+    pairs = list(tokenizer.feed(data)) + list(tokenizer.close())
+    formats = {_DOUBLE: '<d', _INT16: '<h', _INT32: '<i', _INT64: '<q', _BOOL: '<B'}
+    out = [BINARY_SENTINEL]
+    for code, value in pairs:
+        kind = _VALUE_KINDS[code] if code < len(_VALUE_KINDS) else None
+        out.append(struct.pack('<H', code))
+        if kind in formats:
+            number = float(value) if kind == _DOUBLE else int(value)
+            out.append(struct.pack(formats[kind], number))
+        elif kind == _CHUNK:
+            raw = bytes.fromhex(value.decode('ascii'))
+            out.append(bytes((len(raw),)) + raw)
+        else:
+            out.append(value + b'\x00')
+    return b''.join(out)
+
+
+def iter_large_dxf(
+    total_bytes: int,
+    block_entities: int = 10000,
+    fresh_layers: bool = True,
+    line_ending: bytes = b'\n',
+    long_line_bytes: int = 0
+):
+    """
+    Stream an ASCII DXF of about `total_bytes` in blocks of `block_entities`
+    entities, without ever holding the file. With `fresh_layers` every block
+    uses new layer names, so the distinct layer count grows with the size.
+    `long_line_bytes` adds a TEXT entity with a value that long to each block.
+    """
+    data = build_dxf(entities=block_entities)
+    start = data.index(b'ENTITIES\n') + len(b'ENTITIES\n')
+    end = data.rindex(b'  0\nENDSEC')
+    head, body, tail = data[:start], data[start:end], data[end:]
+    if long_line_bytes:
+        body += b'  0\nTEXT\n  8\nNOTAS\n  1\n' + b'A' * long_line_bytes + b'\n'
+
+    def encode(text: bytes) -> bytes:
+        return text.replace(b'\n', line_ending) if line_ending != b'\n' else text
+
+    yield encode(head)
+    written = len(head) + len(tail)
+    block = 0
+    while written < total_bytes:
+        chunk = body.replace(b'CAPA-', b'CAPA-%d-' % block) if fresh_layers else body
+        yield encode(chunk)
+        written += len(chunk)
+        block += 1
+    yield encode(tail)
+
+
+def iter_chunks(data: bytes, chunk_size: int):
+    """Slice a payload the way an HTTP stream would deliver it."""
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
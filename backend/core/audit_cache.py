@@ -0,0 +1,227 @@
+"""
+Audit Result Cache
+Content-addressed cache for audit results, keyed by object ETag and rule-set fingerprint.
+Two tiers: a bounded in-process LRU and an optional on-disk store with size-based eviction.
+"""
+
+import copy
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from botocore.exceptions import BotoCoreError, ClientError
+from loguru import logger
+
+from core.http_client import get_http_client
+from core.r2_reader import head_object, object_key
+
+# Bump whenever the audit engine or the result format change
+# (rule-set contents are part of the key through their fingerprint)
+RULESET_VERSION = "3"
+
+AUDIT_CACHE_MAX_ENTRIES = int(os.getenv("AUDIT_CACHE_MAX_ENTRIES", "256"))
+AUDIT_CACHE_DIR = os.getenv("AUDIT_CACHE_DIR")  # Disk tier disabled when unset
+AUDIT_CACHE_MAX_BYTES = int(os.getenv("AUDIT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+class AuditResultCache:
+    """
+    Two-tier result cache.
+
+    Memory tier: OrderedDict used as an LRU, bounded by entry count.
+    Disk tier: one JSON file per key, evicted oldest-first (by mtime) once
+    the directory grows past `max_bytes`. Hits refresh the mtime.
+    """
+
+    def __init__(self, max_entries: int = AUDIT_CACHE_MAX_ENTRIES, cache_dir: Optional[str] = AUDIT_CACHE_DIR, max_bytes: int = AUDIT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._disk_sizes: Optional[Dict[str, int]] = None
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self._memory.get(key)
+        if result is not None:
+            self._memory.move_to_end(key)
+            self.counters['memory_hits'] += 1
+            return copy.deepcopy(result)
+
+        result = self._disk_get(key)
+        if result is not None:
+            self.counters['disk_hits'] += 1
+            self._memory_put(key, result)
+            return copy.deepcopy(result)
+
+        self.counters['misses'] += 1
+        return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        result = copy.deepcopy(result)
+        self._memory_put(key, result)
+        self._disk_put(key, result)
+        self.counters['stores'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+        hits = lookups - self.counters['misses']
+        return {
+            **self.counters,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'disk_entries': len(self._disk_index()) if self.cache_dir else 0,
+            'disk_bytes': sum(self._disk_index().values()) if self.cache_dir else 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------------------
+
+    def _memory_put(self, key: str, result: Dict[str, Any]) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _disk_index(self) -> Dict[str, int]:
+        """Sizes of the files on disk, scanned once and then kept up to date."""
+        if self._disk_sizes is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_sizes = {}
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    self._disk_sizes[name[:-5]] = os.path.getsize(os.path.join(self.cache_dir, name))
+        return self._disk_sizes
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.cache_dir or key not in self._disk_index():
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            os.utime(path)
+            return result
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {e}")
+            self._disk_remove(key)
+            return None
+
+    def _disk_put(self, key: str, result: Dict[str, Any]) -> None:
+        if not self.cache_dir:
+            return
+        index = self._disk_index()
+        path = self._path(key)
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+            index[key] = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {key}: {e}")
+            return
+        self._disk_evict()
+
+    def _disk_evict(self) -> None:
+        index = self._disk_index()
+        total = sum(index.values())
+        if total <= self.max_bytes:
+            return
+        by_age = sorted(index, key=lambda k: os.path.getmtime(self._path(k)) if os.path.exists(self._path(k)) else 0)
+        for key in by_age:
+            if total <= self.max_bytes:
+                break
+            total -= index.get(key, 0)
+            self._disk_remove(key)
+            self.counters['evictions'] += 1
+
+    def _disk_remove(self, key: str) -> None:
+        self._disk_index().pop(key, None)
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+
+audit_cache = AuditResultCache()
+
+
+def make_cache_key(kind: str, content_id: str, ruleset_fingerprint: str = '') -> str:
+    """Cache key for one audit flavour of one object version under one rule set."""
+    raw = f"{kind}|{content_id}|{RULESET_VERSION}|{ruleset_fingerprint}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+async def resolve_content_id(file_url: str) -> Optional[str]:
+    """
+    Identify the object behind a URL by its ETag and size.
+    Uses a one-byte ranged GET because presigned GET URLs reject HEAD;
+    r2:// sources use HeadObject and are identified by content (bucket ETags
+    are MD5 digests). Other servers make ETags up from mtime, size or inode,
+    so a URL's id also holds its scheme, host and path (not the query, which
+    changes with every presigned URL), and weak ETags are not trusted.
+    Returns None when the object cannot be identified (no caching then).
+    """
+    file_key = object_key(file_url)
+    if file_key is not None:
+        try:
+            size, etag = await head_object(file_key)
+        except (BotoCoreError, ClientError, RuntimeError) as e:
+            logger.warning(f"Cache key probe failed: {e}")
+            return None
+        return f"etag:{etag}:{size}"
+    if not file_url.startswith(('http://', 'https://')):
+        return None
+    try:
+        # Streamed so a server that ignores Range does not send the whole body
+        async with get_http_client().stream('GET', file_url, headers={'Range': 'bytes=0-0'}, timeout=10.0) as response:
+            status = response.status_code
+            headers = response.headers
+    except httpx.HTTPError as e:
+        logger.warning(f"Cache key probe failed: {e}")
+        return None
+    etag = headers.get('etag')
+    if status not in (200, 206) or not etag:
+        return None
+    if etag.startswith('W/'):
+        return None
+    etag = etag.strip('"')
+    size = headers.get('content-range', '').rpartition('/')[2] or headers.get('content-length', '')
+    parts = urlsplit(file_url)
+    return f"url:{parts.scheme}://{parts.netloc.lower()}{parts.path}|etag:{etag}:{size}"
+
+
+async def cached_audit(
+    kind: str,
+    file_url: str,
+    audit: Callable[[], Awaitable[Dict[str, Any]]],
+    ruleset_fingerprint: str = ''
+) -> Dict[str, Any]:
+    """Return the cached result for this object, or run `audit` and cache it."""
+    content_id = await resolve_content_id(file_url)
+    if content_id is None:
+        return await audit()
+
+    key = make_cache_key(kind, content_id, ruleset_fingerprint)
+    result = audit_cache.get(key)
+    if result is not None:
+        logger.info(f"Audit cache hit ({kind}) for {content_id}")
+        return result
+
+    result = await audit()
+    if result.get('status') != 'error':
+        audit_cache.put(key, result)
+    return result
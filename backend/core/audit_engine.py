@@ -1,131 +1,188 @@
 import ezdxf
 import tempfile
+import asyncio
 import os
-import httpx
+import time
 from loguru import logger
-from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-async def process_cad_file_sync(file_url: str) -> Dict[str, Any]:
+from core.audit_rules import load_ruleset
+from core.dxf_formats import SNIFF_SIZE, sniff_format
+from core.http_client import get_http_client
+from core.metrics import AuditProfile, observe_audit
+from core.r2_reader import download_object, object_key
+from core.streaming_audit import AuditStats, audit_local_file
+from core.worker_pool import get_process_pool
+
+# ezdxf audits allowed to run at once (each holds a full document in memory)
+EZDXF_MAX_CONCURRENCY = int(os.getenv("EZDXF_MAX_CONCURRENCY", "2"))
+
+# ezdxf holds the whole document in memory (several times the file size):
+# larger downloads are audited with the streaming parser instead
+EZDXF_MAX_FILE_BYTES = int(os.getenv("EZDXF_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+
+# Bytes per read when streaming the download to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+_ezdxf_slots = asyncio.Semaphore(EZDXF_MAX_CONCURRENCY)
+
+
+def build_test_document():
+    """In-memory drawing used by the 'test' file URL."""
+    doc = ezdxf.new('R2010')
+    msp = doc.modelspace()
+    msp.add_line((0, 0), (10, 0), dxfattribs={'layer': 'Muros', 'color': 1})
+    msp.add_circle((10, 10), radius=5, dxfattribs={'layer': 'Columnas', 'color': 2})
+    msp.add_text("Test", dxfattribs={'layer': 'Texto', 'height': 2.0})
+    return doc
+
+
+def collect_document_stats(doc) -> AuditStats:
+    """Statistics of a loaded ezdxf document in the form the rule sets evaluate."""
+    stats = AuditStats()
+    stats.version = doc.dxfversion
+    for layer in doc.layers:
+        stats.layer_props[layer.dxf.name.encode('utf-8')] = {
+            'color': layer.dxf.color,
+            'linetype': layer.dxf.linetype,
+            'lineweight': layer.dxf.lineweight
+        }
+    for linetype in doc.linetypes:
+        stats.linetypes[linetype.dxf.name.encode('utf-8')] = linetype.dxf.get('description', '')
+    for entity in doc.modelspace():
+        layer = entity.dxf.get('layer', '0').encode('utf-8')
+        stats.layers[layer] = stats.layers.get(layer, 0) + 1
+        if entity.dxf.hasattr('color'):
+            key = (layer, entity.dxf.color)
+            stats.explicit_colors[key] = stats.explicit_colors.get(key, 0) + 1
+        name = entity.dxftype().encode('ascii')
+        stats.entity_types[name] = stats.entity_types.get(name, 0) + 1
+    stats.blocks = {block.name.encode('utf-8') for block in doc.blocks}
+    return stats
+
+
+def audit_dxf_document(path: str, rules_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load a DXF with ezdxf and apply the validation rules.
+    CPU-bound: runs inside a worker process. An empty path audits the test drawing.
+
+    Drawing-level rules see the same statistics as in the streaming audit;
+    per-entity value rules only run in the streaming pass.
+    """
+    rules = load_ruleset(rules_id)
+    profile = AuditProfile('ezdxf')
+    with profile.stage('parse'):
+        doc = ezdxf.readfile(path) if path else build_test_document()
+        stats = collect_document_stats(doc)
+    profile.bytes = os.path.getsize(path) if path else 0
+
+    layers = [
+        {"name": name.decode('utf-8'), "color": props["color"], "linetype": props["linetype"]}
+        for name, props in stats.layer_props.items()
+    ]
+
+    # Apply validation rules
+    with profile.stage('rules'):
+        details = rules.evaluate(stats, None)
+        score, status = rules.score(details)
+
+    return {
+        "status": status,
+        "summary": {
+            "total_layers": len(layers),
+            "entities": len(doc.modelspace()),
+            "version": stats.version,
+            "score": score,
+            "ruleset": rules.id,
+            "profile": profile.report()
+        },
+        "layers": layers,
+        "details": details
+    }
+
+
+async def download_to_temp_file(file_url: str) -> str:
+    """
+    Stream a remote file (URL or r2:// object) to a temporary file without
+    buffering it in memory.
+    Returns the temp path; the caller is responsible for deleting it.
+    """
+    with tempfile.NamedTemporaryFile(suffix='.dxf', delete=False) as f:
+        temp_path = f.name
+    file_key = object_key(file_url)
+    try:
+        if file_key is not None:
+            await download_object(file_key, temp_path)
+            return temp_path
+        async with get_http_client().stream('GET', file_url, timeout=30.0) as resp:
+            resp.raise_for_status()
+            with open(temp_path, 'wb') as f:
+                async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return temp_path
+
+
+def needs_streaming_audit(path: str) -> bool:
+    """Whether a downloaded file is too large for ezdxf, or compressed (ezdxf reads plain DXF only)."""
+    if os.path.getsize(path) > EZDXF_MAX_FILE_BYTES:
+        return True
+    with open(path, 'rb') as f:
+        return sniff_format(f.read(SNIFF_SIZE)) in ('gzip', 'zstd')
+
+
+async def process_cad_file_sync(file_url: str, rules_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Synchronous DXF processing - downloads and processes immediately.
     Returns audit results directly.
+
+    The download is streamed to disk and the ezdxf load plus rule
+    evaluation run in the worker pool, so the event loop stays free.
+    Files over EZDXF_MAX_FILE_BYTES and compressed uploads get the
+    streaming audit (in the same pool) instead.
     """
     logger.info(f"Starting sync processing for: {file_url}")
-    
+
+    temp_path = None
     try:
         # Special case for testing
+        download_start = time.perf_counter()
         if file_url == 'test' or file_url.startswith('test:'):
-            doc = ezdxf.new('R2010')
-            msp = doc.modelspace()
-            msp.add_line((0, 0), (10, 0), dxfattribs={'layer': 'Muros', 'color': 1})
-            msp.add_circle((10, 10), radius=5, dxfattribs={'layer': 'Columnas', 'color': 2})
-            msp.add_text("Test", dxfattribs={'layer': 'Texto', 'height': 2.0})
+            temp_path = ''
         else:
-            # Download real file
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.get(file_url)
-                resp.raise_for_status()
-                
-                # Save to temp file
-                with tempfile.NamedTemporaryFile(suffix='.dxf', delete=False) as f:
-                    f.write(resp.content)
-                    temp_path = f.name
-                
-                # Parse DXF
-                doc = ezdxf.readfile(temp_path)
-                
-                # Cleanup
-                os.unlink(temp_path)
-        
-        # Extract data
-        stats = {
-            "layers": [],
-            "entities_count": 0,
-            "version": doc.dxfversion
-        }
+            temp_path = await download_to_temp_file(file_url)
+        download_seconds = time.perf_counter() - download_start
 
-        for layer in doc.layers:
-            stats["layers"].append({
-                "name": layer.dxf.name,
-                "color": layer.dxf.color,
-                "linetype": layer.dxf.linetype
-            })
-
-        msp = doc.modelspace()
-        stats["entities_count"] = len(msp)
-
-        # Build audit report
-        audit_report = {
-            "summary": {
-                "total_layers": len(stats["layers"]),
-                "entities": stats["entities_count"],
-                "version": stats["version"],
-                "score": 100
-            },
-            "layers": stats["layers"],
-            "details": []
-        }
-
-        # Apply validation rules
-        for layer in stats["layers"]:
-            # Rule: Layer 'Muros' should be Red (1)
-            if layer["name"] == "Muros" and layer["color"] != 1:
-                audit_report["details"].append({
-                    "code": "WRONG_COLOR",
-                    "severity": "fail",
-                    "layer": layer["name"],
-                    "message": f"Layer 'Muros' debería ser Rojo (1), encontrado {layer['color']}"
-                })
-                audit_report["summary"]["score"] -= 20
-
-            # Rule: Layer 'Columnas' should be Yellow (2)
-            if layer["name"] == "Columnas" and layer["color"] != 2:
-                audit_report["details"].append({
-                    "code": "WRONG_COLOR",
-                    "severity": "warning",
-                    "layer": layer["name"],
-                    "message": f"Layer 'Columnas' debería ser Amarillo (2), encontrado {layer['color']}"
-                })
-                audit_report["summary"]["score"] -= 10
-
-        # Determine overall status
-        if audit_report["summary"]["score"] >= 80:
-            audit_report["status"] = "pass"
-        elif audit_report["summary"]["score"] >= 50:
-            audit_report["status"] = "warning"
+        loop = asyncio.get_running_loop()
+        if temp_path and await asyncio.to_thread(needs_streaming_audit, temp_path):
+            logger.info("File too large or compressed for ezdxf, using the streaming audit")
+            audit_report = await loop.run_in_executor(get_process_pool(), audit_local_file, temp_path, rules_id)
         else:
-            audit_report["status"] = "fail"
+            async with _ezdxf_slots:
+                audit_report = await loop.run_in_executor(get_process_pool(), audit_dxf_document, temp_path, rules_id)
+
+        # The worker timed parsing and rules; the download happened here
+        profile = audit_report['summary']['profile']
+        profile['stages']['download'] = round(download_seconds, 4)
+        profile['seconds'] = round(profile['seconds'] + download_seconds, 4)
+        observe_audit(audit_report)
 
         logger.success(f"Sync audit complete. Score: {audit_report['summary']['score']}")
         return audit_report
 
     except Exception as e:
         logger.error(f"Failed to process file: {str(e)}")
-        return {
+        error_report = {
             "status": "error",
             "summary": {"error": str(e), "score": 0},
             "details": [{"code": "PROCESSING_ERROR", "severity": "fail", "message": str(e)}]
         }
+        observe_audit(error_report)
+        return error_report
 
-
-async def process_cad_file(file_id: str, file_url: str):
-    """
-    Background async processing - for larger files.
-    Updates database with results.
-    """
-    logger.info(f"Starting background processing for Job: {file_id}")
-    
-    result = await process_cad_file_sync(file_url)
-    
-    logger.info(f"Background processing complete for {file_id}")
-    logger.info(f"Result: {result}")
-    
-    # TODO: Update Supabase with results
-    # supabase.table('audit_results').insert({
-    #     'file_id': file_id,
-    #     'status': result['status'],
-    #     'summary': result['summary'],
-    #     'details': result['details']
-    # }).execute()
-
+    finally:
+        # Cleanup
+        if temp_path:
+            os.unlink(temp_path)
@@ -0,0 +1,259 @@
+"""
+Audit Job Queue
+Bounded queue of background audits executed by a dedicated pool of worker processes.
+Job state lives in memory; progress and cancellation flags cross the process
+boundary through a multiprocessing manager.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from core.audit_cache import cached_audit
+from core.audit_rules import load_ruleset
+from core.entity_index import forget_entity_index
+from core.metrics import AUDIT_QUEUE_DEPTH, observe_audit
+from core.tracing import start_trace
+from core.r2_reader import object_key
+from core.revision_audit import revision_audit_large_dxf
+from core.streaming_audit import AuditCancelled, stream_audit_large_dxf
+
+# Audits running at the same time (one worker process each)
+AUDIT_JOB_WORKERS = int(os.getenv("AUDIT_JOB_WORKERS", "2"))
+
+# Jobs waiting for a worker before new submissions are rejected
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "100"))
+
+# Finished jobs kept in memory for status queries
+AUDIT_JOB_HISTORY = int(os.getenv("AUDIT_JOB_HISTORY", "1000"))
+
+# Job states follow the upload_status enum ('processed' carries the audit_status).
+# A queued job is 'uploaded': the file is stored and waits for its audit.
+JOB_QUEUED = 'uploaded'
+JOB_PROCESSING = 'processing'
+JOB_PROCESSED = 'processed'
+JOB_ERROR = 'error'
+
+
+class QueueFullError(Exception):
+    """Raised when the audit queue cannot take more jobs."""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def run_audit_job(
+    job_id: str,
+    file_url: str,
+    progress,
+    cancelled,
+    rules_id: Optional[str] = None,
+    build_index: bool = False,
+    revision: bool = False,
+    previous_file_key: Optional[str] = None
+) -> dict:
+    """
+    Run one streaming audit (executes inside a worker process).
+    `progress` and `cancelled` are manager dict proxies shared with the API process.
+    With `revision`, the audit is incremental against `previous_file_key`
+    (see core.revision_audit) and stores the fingerprint of this revision.
+    """
+    def report(bytes_read: int, total_bytes: Optional[int], lines: int) -> None:
+        if cancelled.get(job_id):
+            raise AuditCancelled(job_id)
+        progress[job_id] = {'bytes_processed': bytes_read, 'total_bytes': total_bytes, 'lines_processed': lines}
+
+    if revision:
+        return asyncio.run(revision_audit_large_dxf(file_url, previous_file_key, on_progress=report, rules_id=rules_id))
+    return asyncio.run(stream_audit_large_dxf(file_url, on_progress=report, rules_id=rules_id, build_index=build_index))
+
+
+class AuditJobManager:
+    """In-memory job store, bounded queue and worker loop."""
+
+    def __init__(self, workers: int = AUDIT_JOB_WORKERS, queue_size: int = AUDIT_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._progress = None
+        self._cancelled = None
+
+    async def start(self) -> None:
+        """Start the worker processes and the loops that feed them."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._manager = multiprocessing.Manager()
+        self._progress = self._manager.dict()
+        self._cancelled = self._manager.dict()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._tasks = [asyncio.create_task(self._worker_loop(i)) for i in range(self.workers)]
+        logger.info(f"Audit job queue started: {self.workers} workers, queue size {self.queue_size}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def submit(
+        self,
+        file_id: str,
+        file_url: str,
+        rules_id: Optional[str] = None,
+        build_index: bool = False,
+        revision: bool = False,
+        previous_file_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue an audit. Raises QueueFullError when the queue is at capacity.
+        `rules_id` must name a loadable rule set (checked by the caller).
+        `build_index` also stores the entity index of an R2 source;
+        `revision` audits it incrementally against `previous_file_key`.
+        """
+        if self._queue is None:
+            raise RuntimeError("Audit job queue is not running")
+        job_id = str(uuid.uuid4())
+        job = {
+            'job_id': job_id,
+            'file_id': file_id,
+            'file_url': file_url,
+            'rules_id': rules_id,
+            'build_index': build_index,
+            'revision': revision,
+            'previous_file_key': previous_file_key,
+            'status': JOB_QUEUED,
+            'audit_status': 'pending',
+            'cancelled': False,
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None,
+            'trace_id': None,
+            'result': None
+        }
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Audit queue is full ({self.queue_size} jobs)")
+        self.jobs[job_id] = job
+        self._trim_history()
+        return job
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job record with live progress for running jobs."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        view = {k: v for k, v in job.items() if k != 'file_url'}
+        if job['status'] == JOB_PROCESSING and self._progress is not None:
+            view['progress'] = self._progress.get(job_id, {'bytes_processed': 0, 'total_bytes': None, 'lines_processed': 0})
+        else:
+            view['progress'] = job.get('progress')
+        return view
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job. Finished jobs are left untouched."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job['status'] == JOB_QUEUED:
+            self._finish(job, JOB_ERROR, error='Cancelado por el usuario')
+            job['cancelled'] = True
+        elif job['status'] == JOB_PROCESSING:
+            job['cancelled'] = True
+            self._cancelled[job_id] = True
+        return self.get(job_id)
+
+    async def _worker_loop(self, worker_index: int) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            try:
+                if job is None or job['status'] != JOB_QUEUED:
+                    continue  # Cancelled while queued, or dropped from history
+                job['status'] = JOB_PROCESSING
+                job['started_at'] = _now()
+                logger.info(f"Worker {worker_index} processing job {job_id} (file {job['file_id']})")
+
+                async def run_in_pool():
+                    # The request that queued the job is long gone: the job gets a trace of its own
+                    with start_trace('audit.job', job_id=job_id) as trace:
+                        job['trace_id'] = trace.trace_id
+                        result = await loop.run_in_executor(
+                            self._pool, run_audit_job, job_id, job['file_url'], self._progress, self._cancelled,
+                            job['rules_id'], job['build_index'], job['revision'], job['previous_file_key']
+                        )
+                        # Measured in the worker process, recorded here
+                        observe_audit(result)
+                    return result
+
+                if job['revision']:
+                    # The delta depends on the previous revision, so it is not cached
+                    result = await run_in_pool()
+                elif job['build_index']:
+                    # Not cached either: the index must be stored under this job's file_key.
+                    # The worker process stored it, so the copy this process loaded is stale
+                    result = await run_in_pool()
+                    forget_entity_index(object_key(job['file_url']))
+                else:
+                    fingerprint = load_ruleset(job['rules_id']).fingerprint
+                    result = await cached_audit('stream', job['file_url'], run_in_pool, fingerprint)
+                if result.get('status') == 'error':
+                    self._finish(job, JOB_ERROR, error=result['summary'].get('error'), result=result)
+                else:
+                    self._finish(job, JOB_PROCESSED, result=result)
+            except AuditCancelled:
+                self._finish(job, JOB_ERROR, error='Cancelado por el usuario')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Audit job {job_id} failed: {e}")
+                self._finish(job, JOB_ERROR, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, job: Dict[str, Any], status: str, error: Optional[str] = None, result: Optional[dict] = None) -> None:
+        job['status'] = status
+        job['error'] = error
+        job['result'] = result
+        job['finished_at'] = _now()
+        if result and result.get('status') in ('pass', 'fail', 'warning'):
+            job['audit_status'] = result['status']
+        if self._progress is not None:
+            job['progress'] = self._progress.pop(job['job_id'], None)
+            self._cancelled.pop(job['job_id'], None)
+        logger.info(f"Audit job {job['job_id']} finished: {status}")
+
+    def _trim_history(self) -> None:
+        """Forget the oldest finished jobs once the history limit is reached."""
+        excess = len(self.jobs) - AUDIT_JOB_HISTORY
+        if excess <= 0:
+            return
+        for job_id in [j for j, job in self.jobs.items() if job['finished_at']][:excess]:
+            del self.jobs[job_id]
+
+
+audit_jobs = AuditJobManager()
+AUDIT_QUEUE_DEPTH.set_function(audit_jobs.queue_depth)
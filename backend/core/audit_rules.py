@@ -0,0 +1,439 @@
+"""
+Audit Rule Sets
+Declarative audit rules loaded from JSON files (backend/rules/<id>.json).
+A rule set compiles once into value checks dispatched by entity type and group
+code during the streaming pass, plus drawing-level checks that run on the
+collected statistics when the report is built.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import string
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+RULES_DIR = os.getenv("AUDIT_RULES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules"))
+DEFAULT_RULESET_ID = os.getenv("AUDIT_DEFAULT_RULESET", "default")
+
+RULESET_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+SEVERITIES = ('fail', 'warning', 'info')
+
+# 'info' issues are reported without lowering the score
+DEFAULT_SCORING = {'penalties': {'fail': 20, 'warning': 5, 'info': 0}, 'pass_score': 70, 'warning_score': 50}
+
+COLOR_NAMES = {1: 'Rojo', 2: 'Amarillo', 3: 'Verde', 4: 'Cian', 5: 'Azul', 6: 'Magenta', 7: 'Blanco'}
+
+# Default message templates; a rule's "message" overrides them (same placeholders)
+DEFAULT_MESSAGES = {
+    'layer_name': "{count} capa(s) no cumplen la nomenclatura '{pattern}': {layers}",
+    'forbidden_layer': "Entidades en capa(s) no permitida(s): {layers}",
+    'required_layer': "Faltan capas requeridas: {layers}",
+    'required_block': "Faltan bloques requeridos: {blocks}",
+    'layer_color': "Layer '{layer}' debería ser {expected_name} ({expected}), encontrado {found}",
+    'layer_linetype': "Layer '{layer}' debería usar el tipo de línea {expected}, encontrado {found}",
+    'entity_color': "{count} entidad(es) en la capa '{layer}' con color distinto de {expected_name} ({expected})",
+    'entity_limit': "{count} entidades {entity} superan el máximo permitido ({max})",
+    'max_extents': "Dimensiones muy grandes ({width:.0f} x {height:.0f}). Verificar unidades.",
+    'extents_outliers': "{outliers} coordenada(s) aislada(s) muy alejadas del dibujo. Revisar entidades fuera de zona.",
+    'extents_within': "Extensión del dibujo ({min_x:.0f}, {min_y:.0f}) - ({max_x:.0f}, {max_y:.0f}) fuera del área permitida",
+    'entity_value': "{count} valor(es) del código {group_code} en entidades {entity} fuera de lo permitido",
+}
+
+# Offending names listed in a message
+MESSAGE_NAME_LIMIT = 5
+
+_FORMATTER = string.Formatter()
+
+Handler = Callable[[bytes], None]
+
+
+class RuleSetError(ValueError):
+    """Unknown or invalid rule set."""
+
+
+# ----------------------------------------------------------------------
+# Drawing-level checks: (rule, facts) -> message values, or None if it passes
+# ----------------------------------------------------------------------
+
+class _DrawingFacts:
+    """Decoded view of the audit statistics shared by the drawing-level checks."""
+
+    def __init__(self, stats, bounding_box: Optional[dict]):
+        self.layers = {raw.decode('utf-8', 'replace'): count for raw, count in stats.layers.items()}
+        self.layer_props = {raw.decode('utf-8', 'replace'): props for raw, props in stats.layer_props.items()}
+        self.blocks = {raw.decode('utf-8', 'replace') for raw in stats.blocks}
+        self.entity_types = {raw.decode('ascii', 'replace'): count for raw, count in stats.entity_types.items()}
+        self.rule_hits = stats.rule_hits
+        self.bounding_box = bounding_box
+        self._stats = stats
+        self._resolved_colors = None
+
+    @property
+    def resolved_colors(self) -> Dict[str, Dict[int, int]]:
+        """Effective (ByLayer-resolved) entity colors per layer, computed on first use."""
+        if self._resolved_colors is None:
+            self._resolved_colors = {
+                raw.decode('utf-8', 'replace'): colors for raw, colors in self._stats.resolved_colors().items()
+            }
+        return self._resolved_colors
+
+
+def _names(names: List[str]) -> str:
+    shown = ', '.join(f"'{name}'" for name in names[:MESSAGE_NAME_LIMIT])
+    return shown + (f" (+{len(names) - MESSAGE_NAME_LIMIT})" if len(names) > MESSAGE_NAME_LIMIT else '')
+
+
+def _check_layer_name(rule, facts):
+    ignore = rule['ignore']
+    offenders = sorted(name for name in facts.layers if name not in ignore and not rule['_pattern'].fullmatch(name))
+    if offenders:
+        return {'count': len(offenders), 'pattern': rule['pattern'], 'layers': _names(offenders), '_layers': offenders}
+
+
+def _check_forbidden_layer(rule, facts):
+    used = [name for name in rule['layers'] if facts.layers.get(name)]
+    if used:
+        return {'layers': _names(used), '_layers': used}
+
+
+def _check_required_layer(rule, facts):
+    missing = [name for name in rule['layers'] if name not in facts.layers and name not in facts.layer_props]
+    if missing:
+        return {'layers': _names(missing)}
+
+
+def _check_required_block(rule, facts):
+    missing = [name for name in rule['blocks'] if name not in facts.blocks]
+    if missing:
+        return {'blocks': _names(missing)}
+
+
+def _check_layer_color(rule, facts):
+    props = facts.layer_props.get(rule['layer'])
+    # A negative color only means the layer is switched off
+    if props is not None and abs(props['color']) != rule['color']:
+        return {
+            'layer': rule['layer'],
+            'expected': rule['color'],
+            'expected_name': COLOR_NAMES.get(rule['color'], f"color {rule['color']}"),
+            'found': props['color'],
+            '_layers': [rule['layer']]
+        }
+
+
+def _check_layer_linetype(rule, facts):
+    props = facts.layer_props.get(rule['layer'])
+    if props is not None and props['linetype'].upper() != rule['linetype'].upper():
+        return {'layer': rule['layer'], 'expected': rule['linetype'], 'found': props['linetype'], '_layers': [rule['layer']]}
+
+
+def _check_entity_color(rule, facts):
+    colors = facts.resolved_colors.get(rule['layer'], {})
+    # ByBlock entities (color 0) take the color of the insert, not checked here
+    count = sum(n for color, n in colors.items() if color not in (0, rule['color']))
+    if count:
+        return {
+            'count': count,
+            'layer': rule['layer'],
+            'expected': rule['color'],
+            'expected_name': COLOR_NAMES.get(rule['color'], f"color {rule['color']}"),
+            '_layers': [rule['layer']]
+        }
+
+
+def _check_entity_limit(rule, facts):
+    count = facts.entity_types.get(rule['entity'], 0)
+    if count > rule['max']:
+        return {'count': count, 'entity': rule['entity'], 'max': rule['max']}
+
+
+def _check_max_extents(rule, facts):
+    box = facts.bounding_box
+    if box is None:
+        return None
+    width = box['robust_max'][0] - box['robust_min'][0]
+    height = box['robust_max'][1] - box['robust_min'][1]
+    if width > rule['width'] or height > rule['height']:
+        return {'width': width, 'height': height}
+
+
+def _check_extents_outliers(rule, facts):
+    box = facts.bounding_box
+    if box is not None and box['outliers'] > rule['max']:
+        return {'outliers': box['outliers']}
+
+
+def _check_extents_within(rule, facts):
+    box = facts.bounding_box
+    if box is None:
+        return None
+    (min_x, min_y), (max_x, max_y) = box['robust_min'][:2], box['robust_max'][:2]
+    if min_x < rule['min'][0] or min_y < rule['min'][1] or max_x > rule['max'][0] or max_y > rule['max'][1]:
+        return {'min_x': min_x, 'min_y': min_y, 'max_x': max_x, 'max_y': max_y}
+
+
+def _check_entity_value(rule, facts):
+    count = facts.rule_hits.get(rule['id'], 0)
+    if count:
+        return {'count': count, 'group_code': rule['group_code'], 'entity': rule['entity']}
+
+
+# type -> (check, required params, optional params with defaults)
+RULE_TYPES: Dict[str, Tuple[Callable, Tuple[str, ...], Dict[str, Any]]] = {
+    'layer_name': (_check_layer_name, ('pattern',), {'ignore': []}),
+    'forbidden_layer': (_check_forbidden_layer, ('layers',), {}),
+    'required_layer': (_check_required_layer, ('layers',), {}),
+    'required_block': (_check_required_block, ('blocks',), {}),
+    'layer_color': (_check_layer_color, ('layer', 'color'), {}),
+    'layer_linetype': (_check_layer_linetype, ('layer', 'linetype'), {}),
+    'entity_color': (_check_entity_color, ('layer', 'color'), {}),
+    'entity_limit': (_check_entity_limit, ('entity', 'max'), {}),
+    'max_extents': (_check_max_extents, ('width', 'height'), {}),
+    'extents_outliers': (_check_extents_outliers, (), {'max': 0}),
+    'extents_within': (_check_extents_within, ('min', 'max'), {}),
+    'entity_value': (_check_entity_value, ('entity', 'group_code'), {'min': None, 'max': None, 'allowed': None}),
+}
+
+# Rule types that cannot pass again once they fail: more entities only add
+# offenders (the layer table, read before ENTITIES, is already complete).
+# Their findings can be reported while the ENTITIES section is still being read.
+EARLY_RULE_TYPES = {
+    'layer_name', 'forbidden_layer', 'layer_color', 'layer_linetype', 'entity_color', 'entity_limit', 'entity_value'
+}
+
+
+# ----------------------------------------------------------------------
+# Streaming value checks
+# ----------------------------------------------------------------------
+
+def _value_handler(ranges: List[Tuple[str, float, float]], choices: List[Tuple[str, frozenset]], hits: Dict[str, int]) -> Handler:
+    """
+    One handler for every value rule on the same (entity type, group code).
+    Values inside the range / set shared by all rules skip the per-rule loop,
+    so the common case costs one comparison however many rules there are.
+    """
+    safe_lo = max((lo for _, lo, _ in ranges), default=-math.inf)
+    safe_hi = min((hi for _, _, hi in ranges), default=math.inf)
+    common = frozenset.intersection(*(allowed for _, allowed in choices)) if choices else frozenset()
+
+    def handle(value: bytes) -> None:
+        if ranges:
+            try:
+                number = float(value)
+            except ValueError:
+                number = math.nan
+            if not safe_lo <= number <= safe_hi:
+                for rule_id, lo, hi in ranges:
+                    if not lo <= number <= hi:
+                        hits[rule_id] = hits.get(rule_id, 0) + 1
+        if choices and value not in common:
+            for rule_id, allowed in choices:
+                if value not in allowed:
+                    hits[rule_id] = hits.get(rule_id, 0) + 1
+
+    return handle
+
+
+def _allowed_values(allowed: list) -> frozenset:
+    """
+    Allowed values as ASCII DXF spells them, plus the numeric ones as numbers:
+    binary DXF hands numbers over as int / float, which match those instead.
+    """
+    values = {str(v).encode('utf-8') for v in allowed}
+    values.update(v for v in allowed if isinstance(v, (int, float)) and not isinstance(v, bool))
+    return frozenset(values)
+
+
+def _chain(first: Handler, second: Handler) -> Handler:
+    def handle(value: bytes) -> None:
+        first(value)
+        second(value)
+    return handle
+
+
+class CompiledRuleSet:
+    """
+    A rule set ready to run.
+
+    `bind_entity_tables` merges the value checks into the auditor's ENTITIES
+    handler table, producing one table per entity type that has checks, so a
+    group code only costs a rule lookup when some rule targets it. Everything
+    else is evaluated once on the final statistics by `evaluate`.
+    """
+
+    def __init__(self, ruleset_id: str, name: str, rules: List[dict], scoring: dict, fingerprint: str):
+        self.id = ruleset_id
+        self.name = name
+        self.rules = rules
+        self.fingerprint = fingerprint
+        self.penalties = scoring['penalties']
+        self.pass_score = scoring['pass_score']
+        self.warning_score = scoring['warning_score']
+
+        # entity type ('*' = any) -> group code -> ([(id, lo, hi)], [(id, allowed)])
+        self._value_checks: Dict[str, Dict[int, Tuple[list, list]]] = {}
+        for rule in rules:
+            if rule['type'] != 'entity_value':
+                continue
+            ranges, choices = self._value_checks.setdefault(rule['entity'], {}).setdefault(rule['group_code'], ([], []))
+            if rule['min'] is not None or rule['max'] is not None:
+                lo = -math.inf if rule['min'] is None else float(rule['min'])
+                hi = math.inf if rule['max'] is None else float(rule['max'])
+                ranges.append((rule['id'], lo, hi))
+            if rule['allowed'] is not None:
+                choices.append((rule['id'], _allowed_values(rule['allowed'])))
+
+    def bind_entity_tables(self, base: Dict[int, Handler], hits: Dict[str, int]) -> Tuple[Dict[int, Handler], Dict[bytes, Dict[int, Handler]]]:
+        """
+        Handler tables for the ENTITIES section: the table used for entity
+        types without specific checks, and one table per checked entity type.
+        Violations are counted into `hits` by rule id.
+        """
+        default = self._extend(base, self._value_checks.get('*', {}), hits)
+        per_type = {
+            entity.encode('ascii'): self._extend(default, checks, hits)
+            for entity, checks in self._value_checks.items() if entity != '*'
+        }
+        return default, per_type
+
+    @staticmethod
+    def _extend(table: Dict[int, Handler], checks: Dict[int, Tuple[list, list]], hits: Dict[str, int]) -> Dict[int, Handler]:
+        if not checks:
+            return table
+        extended = dict(table)
+        for code, (ranges, choices) in checks.items():
+            handler = _value_handler(ranges, choices, hits)
+            extended[code] = _chain(table[code], handler) if code in table else handler
+        return extended
+
+    def evaluate(self, stats, bounding_box: Optional[dict], types: Optional[Set[str]] = None) -> List[dict]:
+        """
+        Issues raised by the rules, in rule-set order. `bounding_box` is None
+        without coordinates; `types` limits the rules evaluated to those types.
+        """
+        facts = _DrawingFacts(stats, bounding_box)
+        issues = []
+        for rule in self.rules:
+            if types is not None and rule['type'] not in types:
+                continue
+            values = RULE_TYPES[rule['type']][0](rule, facts)
+            if values is None:
+                continue
+            issue = {
+                'code': rule['code'],
+                'severity': rule['severity'],
+                'rule': rule['id'],
+                'message': rule['message'].format(**values)
+            }
+            layers = values.get('_layers')
+            if layers:
+                issue['layer'] = layers[0]
+            issues.append(issue)
+        return issues
+
+    def score(self, issues: List[dict]) -> Tuple[int, str]:
+        """Score (0-100) and overall status for a list of issues."""
+        penalties = {rule['id']: rule['penalty'] for rule in self.rules}
+        score = 100
+        for issue in issues:
+            score -= penalties.get(issue.get('rule'), self.penalties.get(issue['severity'], 0))
+        score = max(0, score)
+        status = 'pass' if score >= self.pass_score else ('warning' if score >= self.warning_score else 'fail')
+        return score, status
+
+
+def _placeholders(template: str) -> Set[str]:
+    """Fields a message template formats ('' for positional ones), attribute and index lookups included."""
+    return {field for _, field, _, _ in _FORMATTER.parse(template) if field is not None}
+
+
+def _check_message(rule_id: str, rule_type: str, message) -> None:
+    """A custom message may only use the placeholders of its rule type's default message."""
+    if not isinstance(message, str):
+        raise RuleSetError(f"Rule {rule_id!r}: message must be a string")
+    try:
+        used = _placeholders(message)
+    except ValueError as e:
+        raise RuleSetError(f"Rule {rule_id!r}: invalid message: {e}")
+    available = _placeholders(DEFAULT_MESSAGES[rule_type])
+    unknown = sorted(used - available)
+    if unknown:
+        raise RuleSetError(
+            f"Rule {rule_id!r}: unknown message placeholder(s) {', '.join('{' + name + '}' for name in unknown)}; "
+            f"{rule_type} messages can use {', '.join('{' + name + '}' for name in sorted(available))}"
+        )
+
+
+def _compile_rule(raw: dict, scoring: dict) -> dict:
+    rule_id = raw.get('id')
+    rule_type = raw.get('type')
+    if not rule_id or rule_type not in RULE_TYPES:
+        raise RuleSetError(f"Rule {rule_id!r}: unknown type {rule_type!r}")
+    _, required, optional = RULE_TYPES[rule_type]
+    missing = [param for param in required if param not in raw]
+    if missing:
+        raise RuleSetError(f"Rule {rule_id!r}: missing {', '.join(missing)}")
+    severity = raw.get('severity', 'warning')
+    if severity not in SEVERITIES:
+        raise RuleSetError(f"Rule {rule_id!r}: severity must be one of {SEVERITIES}")
+
+    rule = {**optional, **raw}
+    rule['code'] = raw.get('code', rule_id)
+    rule['severity'] = severity
+    rule['penalty'] = raw.get('penalty', scoring['penalties'].get(severity, 0))
+    rule['message'] = raw.get('message', DEFAULT_MESSAGES[rule_type])
+    if 'message' in raw:
+        _check_message(rule_id, rule_type, rule['message'])
+
+    if rule_type == 'layer_name':
+        try:
+            rule['_pattern'] = re.compile(rule['pattern'])
+        except re.error as e:
+            raise RuleSetError(f"Rule {rule_id!r}: invalid pattern: {e}")
+    elif rule_type == 'entity_value':
+        if not isinstance(rule['group_code'], int) or rule['group_code'] <= 0:
+            raise RuleSetError(f"Rule {rule_id!r}: group_code must be a positive integer")
+        if rule['min'] is None and rule['max'] is None and rule['allowed'] is None:
+            raise RuleSetError(f"Rule {rule_id!r}: needs min, max or allowed")
+    return rule
+
+
+def compile_ruleset(spec: dict, ruleset_id: Optional[str] = None) -> CompiledRuleSet:
+    """Validate a rule-set document and compile it."""
+    if not isinstance(spec, dict) or not isinstance(spec.get('rules'), list):
+        raise RuleSetError("Rule set must be an object with a 'rules' list")
+    scoring = {**DEFAULT_SCORING, **spec.get('scoring', {})}
+    scoring['penalties'] = {**DEFAULT_SCORING['penalties'], **scoring['penalties']}
+
+    rules = [_compile_rule(raw, scoring) for raw in spec['rules']]
+    ids = [rule['id'] for rule in rules]
+    if len(ids) != len(set(ids)):
+        raise RuleSetError("Rule ids must be unique")
+
+    fingerprint = hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    ruleset_id = ruleset_id or spec.get('id', 'inline')
+    return CompiledRuleSet(ruleset_id, spec.get('name', ruleset_id), rules, scoring, fingerprint)
+
+
+@lru_cache(maxsize=32)
+def load_ruleset(ruleset_id: Optional[str] = None) -> CompiledRuleSet:
+    """
+    Load and compile rules/<ruleset_id>.json (the default set when None).
+    Compiled sets are cached per process; worker processes load them by id.
+    """
+    ruleset_id = ruleset_id or DEFAULT_RULESET_ID
+    if not RULESET_ID_PATTERN.match(ruleset_id):
+        raise RuleSetError(f"Invalid rule set id: {ruleset_id!r}")
+    path = os.path.join(RULES_DIR, f"{ruleset_id}.json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+    except FileNotFoundError:
+        raise RuleSetError(f"Unknown rule set: {ruleset_id}")
+    except ValueError as e:
+        raise RuleSetError(f"Rule set {ruleset_id} is not valid JSON: {e}")
+    return compile_ruleset(spec, ruleset_id)
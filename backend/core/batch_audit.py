@@ -0,0 +1,219 @@
+"""
+Batch Audits
+Audits every sheet of a project in one request: files are scheduled under
+a global and a per-host concurrency cap, parsed in the audit worker pool,
+and reported one by one as they finish, followed by a project rollup
+(scores, most common issues, layer-standard compliance).
+"""
+
+import asyncio
+import os
+import statistics
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from core.audit_rules import CompiledRuleSet
+from core.http_client import get_http_client
+from core.r2_reader import object_key
+from core.streaming_audit import audit_error_result, stream_audit_large_dxf
+from core.worker_pool import get_process_pool, run_in_worker_loop
+
+# Audits running at once in the API process (batch and sync requests together)
+AUDIT_MAX_CONCURRENCY = int(os.getenv("AUDIT_MAX_CONCURRENCY", "8"))
+
+# Audits reading from one host at once (the R2 bucket counts as one host)
+AUDIT_PER_HOST_CONCURRENCY = int(os.getenv("AUDIT_PER_HOST_CONCURRENCY", "4"))
+
+# Files accepted per batch request
+AUDIT_BATCH_MAX_FILES = int(os.getenv("AUDIT_BATCH_MAX_FILES", "200"))
+
+# Issue codes listed in the rollup
+TOP_ISSUE_CODES = 10
+
+# Rule types that check the layer standard (names, required/forbidden layers, colors, linetypes)
+LAYER_RULE_TYPES = {'layer_name', 'forbidden_layer', 'required_layer', 'layer_color', 'layer_linetype', 'entity_color'}
+
+
+def source_host(source: str) -> str:
+    """Host a source is read from, for the per-host cap."""
+    if object_key(source) is not None:
+        return 'r2'
+    return urlsplit(source).netloc.lower() or 'local'
+
+
+class AuditLimiter:
+    """Global and per-host slots for audits run in the API process."""
+
+    def __init__(self, total: int = AUDIT_MAX_CONCURRENCY, per_host: int = AUDIT_PER_HOST_CONCURRENCY):
+        self.total = total
+        self.per_host = per_host
+        self._global = asyncio.Semaphore(total)
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._waiting: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def slot(self, source: str) -> AsyncIterator[None]:
+        """
+        Hold one slot for the host of `source` and one global slot. The host
+        slot is taken first, so audits waiting on a busy host do not keep
+        global slots from audits of other hosts.
+        """
+        host = source_host(source)
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host)
+        self._waiting[host] = self._waiting.get(host, 0) + 1
+        try:
+            async with semaphore, self._global:
+                yield
+        finally:
+            self._waiting[host] -= 1
+            if not self._waiting[host]:
+                # Nobody holds nor waits for it: drop it, hosts come and go
+                del self._waiting[host]
+                del self._hosts[host]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_concurrency': self.total,
+            'per_host_concurrency': self.per_host,
+            'hosts': dict(self._waiting)
+        }
+
+
+audit_limiter = AuditLimiter()
+
+
+async def _audit_source(source: str, rules_id: Optional[str]) -> Dict[str, Any]:
+    return await stream_audit_large_dxf(source, rules_id=rules_id, client=get_http_client())
+
+
+def audit_source(source: str, rules_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Streaming audit of one batch file (runs inside a worker process). The
+    worker's pooled HTTP client is reused by every file it audits.
+    """
+    return run_in_worker_loop(_audit_source(source, rules_id))
+
+
+async def audit_in_pool(source: str, rules_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Audit one file in the shared worker pool, which downloads and parses it,
+    so the event loop only waits for the result. Each worker process keeps
+    its own pooled HTTP client: a download is not handed back and forth
+    between processes.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), audit_source, source, rules_id)
+
+
+class ProjectRollup:
+    """Project-level figures built from per-file results, keeping only what it needs of each."""
+
+    def __init__(self, rules: CompiledRuleSet):
+        self.layer_rules = {rule['id'] for rule in rules.rules if rule['type'] in LAYER_RULE_TYPES}
+        self.files = 0
+        self.scores: List[int] = []
+        self.statuses: Counter = Counter()
+        self.issue_sheets: Counter = Counter()
+        self.issue_severity: Dict[str, str] = {}
+        self.layer_rule_sheets: Counter = Counter()
+        self.layer_compliant = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        self.files += 1
+        status = result.get('status', 'error')
+        self.statuses[status] += 1
+        if status == 'error':
+            return
+        self.scores.append(result['summary'].get('score', 0))
+        codes = set()
+        failed_layer_rules = set()
+        for issue in result.get('details', []):
+            if issue.get('severity') == 'pass':
+                continue
+            codes.add(issue['code'])
+            self.issue_severity.setdefault(issue['code'], issue.get('severity', 'warning'))
+            if issue.get('rule') in self.layer_rules:
+                failed_layer_rules.add(issue['rule'])
+        # Sheets with the issue, not occurrences: one bad sheet does not outweigh the project
+        self.issue_sheets.update(codes)
+        self.layer_rule_sheets.update(failed_layer_rules)
+        if not failed_layer_rules:
+            self.layer_compliant += 1
+
+    def report(self) -> Dict[str, Any]:
+        audited = len(self.scores)
+        bands = Counter(min(score // 10, 9) for score in self.scores)
+        return {
+            'files': self.files,
+            'audited': audited,
+            'errors': self.statuses.get('error', 0),
+            'status': dict(self.statuses),
+            'score': {
+                'mean': round(statistics.fmean(self.scores), 1) if audited else None,
+                'median': statistics.median(self.scores) if audited else None,
+                'min': min(self.scores) if audited else None,
+                'max': max(self.scores) if audited else None,
+                'distribution': {f"{band * 10}-{band * 10 + 9 if band < 9 else 100}": bands[band] for band in range(10) if bands[band]}
+            },
+            'top_issues': [
+                {'code': code, 'severity': self.issue_severity[code], 'sheets': sheets}
+                for code, sheets in self.issue_sheets.most_common(TOP_ISSUE_CODES)
+            ],
+            'layer_standard': {
+                'rules': len(self.layer_rules),
+                'compliant_sheets': self.layer_compliant,
+                'compliance': round(self.layer_compliant / audited, 4) if audited else None,
+                'failing_sheets_by_rule': dict(self.layer_rule_sheets.most_common())
+            }
+        }
+
+
+async def run_batch(
+    sources: List[Dict[str, Any]],
+    audit: Callable[[str], Awaitable[Dict[str, Any]]],
+    rules: CompiledRuleSet
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Audit `sources` ({'index', 'file_id', 'source'} each) with `audit(source)`
+    under the limiter. Yields one 'result' record per file in completion
+    order, then the 'rollup' record. Closing the generator early (client
+    gone) cancels the audits still waiting; those already in a worker
+    process run to the end there.
+    """
+    async def run_one(item: Dict[str, Any]) -> Dict[str, Any]:
+        async with audit_limiter.slot(item['source']):
+            start = time.perf_counter()
+            try:
+                result = await audit(item['source'])
+            except Exception as e:
+                logger.error(f"Batch audit of {item['source'][:100]} failed: {e}")
+                result = audit_error_result('PROCESSING_ERROR', str(e))
+        return {
+            'type': 'result',
+            'index': item['index'],
+            'file_id': item.get('file_id'),
+            'seconds': round(time.perf_counter() - start, 3),
+            'result': result
+        }
+
+    rollup = ProjectRollup(rules)
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(run_one(item)) for item in sources]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            record = await finished
+            rollup.add(record['result'])
+            yield record
+    finally:
+        for task in tasks:
+            task.cancel()
+    seconds = round(time.perf_counter() - start, 3)
+    logger.info(f"Batch audit of {len(sources)} files finished in {seconds} s")
+    yield {'type': 'rollup', 'seconds': seconds, **rollup.report()}
@@ -0,0 +1,120 @@
+"""
+Chat Response Cache
+Answers to repeated questions about the same audit, keyed by the normalized
+question and the file context hash, with a TTL and LRU eviction. Identical
+questions arriving while the first one is still waiting on Gemini share its
+upstream call instead of making their own.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1024"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "3600"))  # Seconds
+
+_SPACES = re.compile(r"\s+")
+_EDGE_PUNCTUATION = "¿?¡!.,;: "
+
+
+def normalize_message(message: str) -> str:
+    """Case, accents, spacing and surrounding punctuation do not change the question."""
+    text = unicodedata.normalize('NFKD', message.casefold())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _SPACES.sub(' ', text).strip(_EDGE_PUNCTUATION)
+
+
+def chat_cache_key(message: str, context_key: Optional[str], model: str) -> str:
+    raw = f"{model}|{context_key or ''}|{normalize_message(message)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ChatResponseCache:
+    """
+    OrderedDict LRU of (expiry, answer) plus the upstream calls in flight.
+    Only successful answers are stored; a failed call fails every request
+    that was waiting on it, and the next one tries again.
+    """
+
+    def __init__(self, max_entries: int = CHAT_CACHE_MAX_ENTRIES, ttl: float = CHAT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'expired': 0, 'evictions': 0}
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, answer = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self.counters['expired'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return answer
+
+    def put(self, key: str, answer: str) -> None:
+        if self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def lookup(self, key: str) -> Optional[str]:
+        """get() counted as a cache hit or miss."""
+        answer = self.get(key)
+        self.counters['hits' if answer is not None else 'misses'] += 1
+        return answer
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[str]]) -> Tuple[str, str]:
+        """
+        Answer for `key` and where it came from: 'cache', 'coalesced' (an
+        identical call was already in flight) or 'model' (this request's call).
+        """
+        answer = self.get(key)
+        if answer is not None:
+            self.counters['hits'] += 1
+            return answer, 'cache'
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters['coalesced'] += 1
+            source = 'coalesced'
+        else:
+            self.counters['misses'] += 1
+            task = asyncio.ensure_future(self._call(key, call))
+            # Retrieve the error even when every waiter has gone away
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._inflight[key] = task
+            source = 'model'
+        # Shielded: a client that disconnects does not cancel the call the others wait on
+        return await asyncio.shield(task), source
+
+    async def _call(self, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        try:
+            answer = await call()
+        finally:
+            del self._inflight[key]
+        self.put(key, answer)
+        return answer
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters['hits'] + self.counters['coalesced'] + self.counters['misses']
+        return {
+            **self.counters,
+            'hit_rate': round((lookups - self.counters['misses']) / lookups, 4) if lookups else 0.0,
+            'entries': len(self._entries),
+            'in_flight': len(self._inflight)
+        }
+
+
+chat_cache = ChatResponseCache()
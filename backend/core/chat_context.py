@@ -0,0 +1,216 @@
+"""
+Chat File Context
+Renders the audit of the current DXF file for the Gemini system prompt under
+a token budget: large audits are summarized (top layers by entity count,
+issues grouped by code, entity breakdown) instead of listed in full. The
+rendered text is cached per audit, so every turn about one file reuses it.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from loguru import logger
+
+# Tokens the file context may take in the system prompt
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+
+# Layers listed at most (the ones with more entities first)
+CHAT_CONTEXT_MAX_LAYERS = int(os.getenv("CHAT_CONTEXT_MAX_LAYERS", "40"))
+
+# Rendered contexts kept, one per audit result
+CHAT_CONTEXT_CACHE_SIZE = int(os.getenv("CHAT_CONTEXT_CACHE_SIZE", "256"))
+
+# Gemini tokenizes Spanish text at roughly 4 characters per token; counting
+# exactly would take a count_tokens API call per context
+CHARS_PER_TOKEN = 4
+
+# Entity types and issue groups listed at most
+MAX_ENTITY_TYPES = 15
+MAX_ISSUE_GROUPS = 20
+
+SEVERITY_ORDER = {'fail': 0, 'warning': 1, 'info': 2, 'pass': 3}
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ChatContext:
+    """File context rendered for the prompt, with its estimated size."""
+
+    def __init__(self, text: str, key: str, layers_listed: int, layers_total: int):
+        self.text = text
+        self.key = key
+        self.tokens = estimate_tokens(text)
+        self.layers_listed = layers_listed
+        self.layers_total = layers_total
+
+    @property
+    def summarized(self) -> bool:
+        return self.layers_listed < self.layers_total
+
+
+def get_color_name(color_index: int) -> str:
+    """Convert AutoCAD color index to name."""
+    colors = {
+        0: "ByBlock",
+        1: "Rojo",
+        2: "Amarillo",
+        3: "Verde",
+        4: "Cian",
+        5: "Azul",
+        6: "Magenta",
+        7: "Blanco/Negro",
+        256: "ByLayer"
+    }
+    return colors.get(color_index, f"Color {color_index}")
+
+
+def format_layers(layers: List[dict], limit: int) -> str:
+    """The `limit` layers with more entities; the rest are counted in one line."""
+    if not layers:
+        return "No hay datos de capas disponibles."
+    ranked = sorted(layers, key=lambda layer: layer.get('entity_count') or 0, reverse=True)
+    lines = []
+    for layer in ranked[:limit]:
+        color = layer.get('color', 0)
+        line = f"  - {layer.get('name', 'Sin nombre')}: Color {color} ({get_color_name(color)}), Tipo: {layer.get('linetype', 'Continuous')}"
+        if layer.get('entity_count') is not None:
+            line += f", Entidades: {layer['entity_count']:,}"
+        lines.append(line)
+    rest = ranked[limit:]
+    if rest:
+        line = f"  ... y {len(rest):,} capas más"
+        if any(layer.get('entity_count') is not None for layer in rest):
+            line += f" ({sum(layer.get('entity_count') or 0 for layer in rest):,} entidades)"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def group_issues(details: List[dict]) -> List[Tuple[str, str, int, dict]]:
+    """(severity, code, count, first issue) per issue code, most severe and most frequent first."""
+    groups: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+    for issue in details:
+        key = (issue.get('severity', 'warning'), issue.get('code', 'UNKNOWN'))
+        if key in groups:
+            groups[key][0] += 1
+        else:
+            groups[key] = [1, issue]
+    ranked = sorted(groups.items(), key=lambda item: (SEVERITY_ORDER.get(item[0][0], 1), -item[1][0]))
+    return [(severity, code, count, first) for (severity, code), (count, first) in ranked]
+
+
+def format_issues(details: List[dict], limit: int = MAX_ISSUE_GROUPS) -> str:
+    """Audit issues, one line per issue code."""
+    if not details:
+        return "No se encontraron problemas."
+    groups = group_issues(details)
+    lines = []
+    for severity, code, count, issue in groups[:limit]:
+        severity_icon = {'fail': "🔴", 'info': "🔵"}.get(severity, "🟡")
+        line = f"  {severity_icon} {code}: {issue.get('message', 'Sin descripción')}"
+        if count > 1:
+            line += f" (x{count})"
+        lines.append(line)
+    if len(groups) > limit:
+        lines.append(f"  ... y {len(groups) - limit} tipos de problema más")
+    return "\n".join(lines)
+
+
+def format_entity_breakdown(breakdown: Dict[str, int]) -> str:
+    ranked = sorted(breakdown.items(), key=lambda item: item[1], reverse=True)
+    text = ", ".join(f"{kind}: {count:,}" for kind, count in ranked[:MAX_ENTITY_TYPES])
+    if len(ranked) > MAX_ENTITY_TYPES:
+        text += f", otros: {sum(count for _, count in ranked[MAX_ENTITY_TYPES:]):,}"
+    return text
+
+
+def _render(file_context: Dict[str, Any], layer_limit: int, issue_limit: int, breakdown: bool) -> str:
+    text = f"""
+DATOS DEL ARCHIVO DXF ACTUAL:
+- Versión: {file_context.get('version', 'No disponible')}
+- Total de capas: {file_context.get('total_layers', 0)}
+- Total de entidades: {file_context.get('entities', 0)}
+- Score de auditoría: {file_context.get('score', 'No auditado')}/100
+"""
+    if breakdown and file_context.get('entity_breakdown'):
+        text += f"- Entidades por tipo: {format_entity_breakdown(file_context['entity_breakdown'])}\n"
+    return text + f"""
+CAPAS DETECTADAS:
+{format_layers(file_context.get('layers') or [], layer_limit)}
+
+PROBLEMAS ENCONTRADOS:
+{format_issues(file_context.get('details') or [], issue_limit)}
+"""
+
+
+def render_context(file_context: Dict[str, Any], budget: int = CHAT_CONTEXT_TOKENS) -> Tuple[str, int]:
+    """
+    Context text within `budget` tokens, and the number of layers listed.
+    Layers are cut first (halving the list), then issue groups, then the
+    entity breakdown; the header always stays.
+    """
+    layers = file_context.get('layers') or []
+    layer_limit = min(len(layers), CHAT_CONTEXT_MAX_LAYERS)
+    issue_limit = MAX_ISSUE_GROUPS
+    breakdown = True
+    while True:
+        text = _render(file_context, layer_limit, issue_limit, breakdown)
+        if estimate_tokens(text) <= budget:
+            return text, layer_limit
+        if layer_limit > 0:
+            layer_limit //= 2
+        elif issue_limit > 1:
+            issue_limit //= 2
+        elif breakdown:
+            breakdown = False
+        else:
+            return text, layer_limit
+
+
+def context_key(file_context: Dict[str, Any], budget: int) -> str:
+    """Hash of the audit data the context is rendered from."""
+    payload = json.dumps(file_context, sort_keys=True, default=str)
+    return hashlib.sha256(f"{budget}:{payload}".encode()).hexdigest()
+
+
+class ChatContextCache:
+    """Rendered contexts by audit hash, least recently used dropped first."""
+
+    def __init__(self, max_entries: int = CHAT_CONTEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ChatContext]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_context: Dict[str, Any], budget: int = CHAT_CONTEXT_TOKENS) -> Tuple[ChatContext, bool]:
+        """Context for an audit and whether it came from the cache."""
+        key = context_key(file_context, budget)
+        context = self._entries.get(key)
+        if context is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return context, True
+
+        self.misses += 1
+        start = time.perf_counter()
+        text, layers_listed = render_context(file_context, budget)
+        context = ChatContext(text, key, layers_listed, len(file_context.get('layers') or []))
+        self._entries[key] = context
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        logger.debug(
+            f"Chat context rendered: ~{context.tokens} tokens, {layers_listed}/{context.layers_total} layers "
+            f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return context, False
+
+    def stats(self) -> Dict[str, Any]:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+chat_contexts = ChatContextCache()
@@ -0,0 +1,137 @@
+"""
+Chat Sessions
+Server-side conversations for the AI chat: the file context is sent once
+and the history stays here, so a turn carries only the new question. The
+prompt stays bounded: the last turns are kept verbatim and older ones are
+folded into a short running summary.
+"""
+
+import asyncio
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Sessions kept in memory (least recently used dropped first)
+CHAT_SESSION_LIMIT = int(os.getenv("CHAT_SESSION_LIMIT", "5000"))
+
+# Sessions unused for this long are dropped
+CHAT_SESSION_IDLE_SECONDS = float(os.getenv("CHAT_SESSION_IDLE_SECONDS", "1800"))
+
+# Question/answer pairs sent verbatim with each turn
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+
+# Characters of the summary of older turns, and of each answer within it
+CHAT_SUMMARY_CHARS = int(os.getenv("CHAT_SUMMARY_CHARS", "1500"))
+SUMMARY_ANSWER_CHARS = 160
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s|\n")
+
+
+def _first_sentence(text: str, limit: int) -> str:
+    sentence = _SENTENCE_END.split(text.strip(), maxsplit=1)[0].strip()
+    return sentence if len(sentence) <= limit else sentence[:limit - 1].rstrip() + '…'
+
+
+class ChatSession:
+    """One conversation: its file context, recent turns and the summary of older ones."""
+
+    def __init__(self, session_id: str, file_context: Optional[Dict[str, Any]]):
+        self.session_id = session_id
+        self.file_context = file_context
+        self.turns: List[Dict[str, str]] = []
+        self.summary = ''
+        self.total_turns = 0
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.last_used = time.monotonic()
+        # Turns of one session run one at a time, so each sees the previous answer
+        self.lock = asyncio.Lock()
+
+    def add_turn(self, question: str, answer: str) -> None:
+        self.turns.append({'question': question, 'answer': answer})
+        self.total_turns += 1
+        while len(self.turns) > CHAT_HISTORY_TURNS:
+            self._fold(self.turns.pop(0))
+
+    def _fold(self, turn: Dict[str, str]) -> None:
+        """
+        Move a turn into the summary: the question and the first sentence of
+        the answer. Extractive, so it costs no model call; the oldest lines go
+        once the summary is full.
+        """
+        line = f"- P: {_first_sentence(turn['question'], SUMMARY_ANSWER_CHARS)} R: {_first_sentence(turn['answer'], SUMMARY_ANSWER_CHARS)}"
+        lines = (self.summary.split('\n') if self.summary else []) + [line]
+        while len(lines) > 1 and sum(len(text) + 1 for text in lines) > CHAT_SUMMARY_CHARS:
+            lines.pop(0)
+        self.summary = '\n'.join(lines)
+
+    def history(self) -> List[Dict[str, Any]]:
+        """Conversation in the Gemini content format, summary first."""
+        contents = []
+        if self.summary:
+            contents.append({'role': 'user', 'parts': [f"Resumen de la conversación anterior:\n{self.summary}"]})
+            contents.append({'role': 'model', 'parts': ["Entendido, continúo con ese contexto."]})
+        for turn in self.turns:
+            contents.append({'role': 'user', 'parts': [turn['question']]})
+            contents.append({'role': 'model', 'parts': [turn['answer']]})
+        return contents
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'created_at': self.created_at,
+            'turns': self.total_turns,
+            'turns_kept': len(self.turns),
+            'summary_chars': len(self.summary),
+            'has_file_context': self.file_context is not None
+        }
+
+
+class ChatSessionStore:
+    """
+    Bounded in-memory store of chat sessions, keyed by session_id. Kept in
+    last-use order, so idle sessions are always at the front.
+    """
+
+    def __init__(self, limit: int = CHAT_SESSION_LIMIT, idle_seconds: float = CHAT_SESSION_IDLE_SECONDS):
+        self.limit = limit
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+    def create(self, file_context: Optional[Dict[str, Any]] = None) -> ChatSession:
+        self._expire()
+        session = ChatSession(str(uuid.uuid4()), file_context)
+        self._sessions[session.session_id] = session
+        while len(self._sessions) > self.limit:
+            self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """Live session (marked as used), or None when unknown or expired."""
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def remove(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.idle_seconds
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_used > deadline or oldest.lock.locked():
+                break
+            self._sessions.popitem(last=False)
+
+
+chat_sessions = ChatSessionStore()
@@ -0,0 +1,38 @@
+"""
+Chat Topic Filter
+Keyword pre-classifier for chat questions: clearly off-topic ones (recipes,
+football, jokes...) get the assistant's refusal without a model call.
+Conservative by design: any CAD/BIM/construction term, or no off-topic term
+at all, leaves the decision to the model.
+"""
+
+import re
+
+from core.chat_cache import normalize_message
+
+# Word stems, matched at the start of a word of the normalized (accentless, lower case) message
+DOMAIN_STEMS = (
+    'dxf', 'dwg', 'ifc', 'cad', 'bim', 'autocad', 'revit', 'plano', 'planos', 'capa', 'layer', 'entidad',
+    'bloque', 'polilinea', 'linea', 'cota', 'acotac', 'escala', 'archivo', 'auditor', 'score', 'error',
+    'problema', 'norma', 'e.0', 'e0', 'aci', 'reglamento', 'rne', 'construc', 'edific', 'obra', 'estructur',
+    'arquitect', 'ingenier', 'viga', 'columna', 'losa', 'muro', 'zapata', 'cimenta', 'concreto', 'hormigon',
+    'acero', 'refuerzo', 'ladrillo', 'albanil', 'metrado', 'presupuest', 'partida', 'material', 'sismo',
+    'sismic', 'carga', 'diseno', 'dibujo', 'vano', 'puerta', 'ventana', 'escalera', 'techo', 'piso', 'planta',
+    'elevacion', 'corte', 'detalle', 'instalac', 'electric', 'sanitari', 'tuberia', 'color', 'tipo de linea'
+)
+
+OFF_TOPIC_STEMS = (
+    'receta', 'cocin', 'futbol', 'partido de', 'mundial', 'goles', 'chiste', 'poema', 'poesia', 'cancion',
+    'letra de', 'pelicula', 'serie de', 'netflix', 'horoscopo', 'signo zodiacal', 'bitcoin', 'cripto',
+    'elecciones', 'presidente', 'politic', 'novia', 'novio', 'videojuego', 'clima de', 'pronostico del tiempo',
+    'capital de', 'cuentame un', 'escribe un cuento', 'musica'
+)
+
+_DOMAIN = re.compile(r"\b(?:" + '|'.join(re.escape(stem) for stem in DOMAIN_STEMS) + r")")
+_OFF_TOPIC = re.compile(r"\b(?:" + '|'.join(re.escape(stem) for stem in OFF_TOPIC_STEMS) + r")")
+
+
+def is_off_topic(message: str) -> bool:
+    """True only for questions with an off-topic term and no domain term."""
+    text = normalize_message(message)
+    return bool(_OFF_TOPIC.search(text)) and not _DOMAIN.search(text)
@@ -0,0 +1,206 @@
+"""
+Coordinate Statistics
+Vectorized extents, percentiles and outlier detection for streamed DXF coordinates.
+
+Raw coordinate values are appended to a per-chunk buffer by the parser and
+reduced in bulk with NumPy once the chunk has been tokenized. Alongside the
+exact min/max, each axis keeps a fixed-size sample used for percentiles.
+The sample holds the distinct values with the smallest hash, each with the
+number of times it occurred, so it is deterministic and two partial results
+can be merged exactly, whatever order the chunks were read in. A value's
+hash never changes, so a value in the sample was counted every time it
+occurred. Percentiles are weighted by those counts: a drawing made of a few
+coordinates repeated many times still has a core.
+"""
+
+from array import array
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Distinct values kept per axis for percentile estimation
+SAMPLE_SIZE = 8192
+
+# Percentiles that bound the "core" of the drawing
+ROBUST_PERCENTILES = (1.0, 99.0)
+
+# Values further than this many core spans outside the core are outliers
+OUTLIER_FENCE = 1.0
+
+
+def _hash_values(values: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer over the float64 bit patterns."""
+    # Adding 0.0 folds -0.0 into 0.0 so both hash alike
+    z = (values + 0.0).view(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _to_floats(raw: list) -> np.ndarray:
+    """Convert raw group-code values, skipping any that are not numbers."""
+    try:
+        buffer = array('d', map(float, raw))
+    except ValueError:
+        buffer = array('d')
+        for value in raw:
+            try:
+                buffer.append(float(value))
+            except ValueError:
+                pass
+    return np.frombuffer(buffer, dtype=np.float64)
+
+
+class AxisStats:
+    """Running statistics for one coordinate axis."""
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE):
+        self.pending: list = []
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.sample_size = sample_size
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._values = np.empty(0, dtype=np.float64)
+        self._counts = np.empty(0, dtype=np.int64)  # Occurrences of each sampled value
+
+    def flush(self) -> None:
+        """Reduce the values buffered for the current chunk."""
+        if not self.pending:
+            return
+        values = _to_floats(self.pending)
+        self.pending.clear()
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return
+
+        self.count += values.size
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        keys = _hash_values(values)
+        if self._keys.size >= self.sample_size:
+            # Only values that could enter the sample (or are its last one) need to be merged
+            mask = keys <= self._keys[-1]
+            keys, values = keys[mask], values[mask]
+        self._absorb(keys, values, np.ones(keys.size, dtype=np.int64))
+
+    def merge(self, other: 'AxisStats') -> None:
+        """Fold the statistics of another partial result into this one."""
+        self.flush()
+        other.flush()
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._absorb(other._keys, other._values, other._counts)
+
+    def _absorb(self, keys: np.ndarray, values: np.ndarray, counts: np.ndarray) -> None:
+        if not keys.size:
+            return
+        keys = np.concatenate((self._keys, keys))
+        values = np.concatenate((self._values, values))
+        counts = np.concatenate((self._counts, counts))
+        keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        totals = np.bincount(inverse, weights=counts, minlength=keys.size)
+        self._keys = keys[:self.sample_size]
+        self._values = values[first[:self.sample_size]]
+        self._counts = totals[:self.sample_size].astype(np.int64)
+
+    @property
+    def sample_full(self) -> bool:
+        return self._keys.size >= self.sample_size
+
+    def sample(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The sampled hash keys, values and occurrence counts, sorted by key."""
+        self.flush()
+        return self._keys, self._values, self._counts
+
+    def trim(self, max_key: int) -> bool:
+        """
+        Drop sampled values whose key is max_key or above, to store a partial
+        result compactly. Returns True when anything was dropped.
+        """
+        keys, values, counts = self.sample()
+        keep = keys < np.uint64(max_key)
+        if keep.all():
+            return False
+        self._keys, self._values, self._counts = keys[keep], values[keep], counts[keep]
+        return True
+
+    @classmethod
+    def restore(
+        cls, count: int, low: float, high: float, values: np.ndarray, counts: np.ndarray, sample_size: int = SAMPLE_SIZE
+    ) -> 'AxisStats':
+        """Rebuild partial statistics from their count, extent and sampled values with their counts."""
+        axis = cls(sample_size)
+        axis.count = count
+        axis.min = low
+        axis.max = high
+        axis._absorb(_hash_values(values), values, counts.astype(np.int64))
+        return axis
+
+    def extent(self) -> Optional[Tuple[float, float]]:
+        if not self.count:
+            return None
+        return self.min, self.max
+
+    def robust_extent(self) -> Optional[Tuple[float, float, int]]:
+        """
+        Extent that ignores isolated far-away values.
+
+        Returns (min, max, outliers) where outliers is the number of values
+        that fall outside the fence around the core range (estimated from
+        the sample once it is full).
+        """
+        if not self.count:
+            return None
+        self.flush()
+        values, counts = self._values, self._counts
+        total = int(counts.sum())
+        # Percentiles of the values as they occur, not of the distinct ones
+        order = np.argsort(values, kind='stable')
+        cumulative = np.cumsum(counts[order])
+        positions = np.searchsorted(cumulative, np.array(ROBUST_PERCENTILES) / 100 * total, side='left')
+        low, high = values[order][np.minimum(positions, values.size - 1)]
+        span = max(high - low, 1e-9)
+        fence_low = low - OUTLIER_FENCE * span
+        fence_high = high + OUTLIER_FENCE * span
+
+        within = (values >= fence_low) & (values <= fence_high)
+        inside = values[within]
+        robust_min = self.min if self.min >= fence_low else float(inside.min())
+        robust_max = self.max if self.max <= fence_high else float(inside.max())
+        outliers = int(round(int(counts[~within].sum()) * self.count / total))
+        return robust_min, robust_max, outliers
+
+
+class CoordinateStats:
+    """X/Y/Z statistics collected from group codes 10, 20 and 30."""
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE):
+        self.x = AxisStats(sample_size)
+        self.y = AxisStats(sample_size)
+        self.z = AxisStats(sample_size)
+
+    def flush(self) -> None:
+        self.x.flush()
+        self.y.flush()
+        self.z.flush()
+
+    def merge(self, other: 'CoordinateStats') -> None:
+        self.x.merge(other.x)
+        self.y.merge(other.y)
+        self.z.merge(other.z)
+
+    def bounding_box(self) -> dict:
+        """Exact and robust extents in the audit report format."""
+        axes = (self.x, self.y, self.z)
+        exact = [axis.extent() or (0, 0) for axis in axes]
+        robust = [axis.robust_extent() or (0, 0, 0) for axis in axes]
+        return {
+            'min': [e[0] for e in exact],
+            'max': [e[1] for e in exact],
+            'robust_min': [r[0] for r in robust],
+            'robust_max': [r[1] for r in robust],
+            'outliers': sum(r[2] for r in robust)
+        }
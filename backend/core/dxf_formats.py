@@ -0,0 +1,133 @@
+"""
+DXF Upload Formats
+Sniffs how an upload is stored from its first bytes and decompresses gzip and
+zstd uploads on the fly, so the auditors always receive plain DXF bytes
+(ASCII or binary; the tokenizer tells those apart).
+"""
+
+import zlib
+from typing import Iterator, Optional
+
+import zstandard
+
+from core.dxf_tokenizer import BINARY_SENTINEL
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Bytes needed to tell every format apart
+SNIFF_SIZE = len(BINARY_SENTINEL)
+
+# Compressed bytes decompressed per step: a 1 MB read of a 10x compressed
+# DXF must not turn into one 10 MB block
+DECODE_STEP_SIZE = 64 * 1024
+
+
+def sniff_format(head: bytes) -> str:
+    """'gzip', 'zstd', 'binary' or 'ascii', from the first SNIFF_SIZE bytes."""
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    if head.startswith(BINARY_SENTINEL):
+        return 'binary'
+    return 'ascii'
+
+
+class _Gzip:
+    """gzip stream decoder; concatenated members decode as one stream."""
+
+    def __init__(self):
+        self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decode(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            out = self._inflate.decompress(data, DECODE_STEP_SIZE * 16)
+            data = self._inflate.unconsumed_tail
+            if out:
+                yield out
+            if self._inflate.eof:
+                data = self._inflate.unused_data + data
+                if not data:
+                    return
+                self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def close(self) -> Iterator[bytes]:
+        out = self._inflate.flush()
+        if out:
+            yield out
+        if not self._inflate.eof:
+            raise ValueError("Truncated gzip stream")
+
+
+class _Zstd:
+    """zstd stream decoder; concatenated frames decode as one stream."""
+
+    def __init__(self):
+        self._context = zstandard.ZstdDecompressor()
+        self._frame = self._context.decompressobj()
+        self._in_frame = False
+
+    def decode(self, data: bytes) -> Iterator[bytes]:
+        for start in range(0, len(data), DECODE_STEP_SIZE):
+            step = data[start:start + DECODE_STEP_SIZE]
+            while step:
+                out = self._frame.decompress(step)
+                if out:
+                    yield out
+                step = b''
+                self._in_frame = not self._frame.eof
+                if self._frame.eof:
+                    step = self._frame.unused_data
+                    self._frame = self._context.decompressobj()
+
+    def close(self) -> Iterator[bytes]:
+        if self._in_frame:
+            raise ValueError("Truncated zstd stream")
+        return iter(())
+
+
+class StreamDecoder:
+    """
+    Incremental upload decoder: feed raw chunks, get DXF byte blocks.
+
+    The format is sniffed from the first bytes; plain DXF (ASCII or binary)
+    is passed through untouched. `compression` is 'gzip', 'zstd' or None
+    once the first bytes have been seen.
+    """
+
+    def __init__(self):
+        self.compression: Optional[str] = None
+        self._started = False
+        self._head = b''
+        self._codec = None
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        """Decoded DXF bytes for the next raw chunk."""
+        if not self._started:
+            self._head += chunk
+            if len(self._head) < SNIFF_SIZE:
+                return iter(())
+            chunk, self._head = self._head, b''
+            self._start(chunk)
+        if self._codec is None:
+            return iter((chunk,))
+        return self._codec.decode(chunk)
+
+    def close(self) -> Iterator[bytes]:
+        """Whatever is left once the raw stream ends."""
+        if not self._started:
+            head, self._head = self._head, b''
+            self._start(head)
+            if head:
+                yield from self.feed(head)
+        if self._codec is not None:
+            yield from self._codec.close()
+
+    def _start(self, head: bytes) -> None:
+        self._started = True
+        found = sniff_format(head)
+        if found == 'gzip':
+            self.compression, self._codec = found, _Gzip()
+        elif found == 'zstd':
+            self.compression, self._codec = found, _Zstd()
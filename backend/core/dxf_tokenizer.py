@@ -0,0 +1,333 @@
+"""
+DXF Group-Code Tokenizer
+Splits raw ASCII or binary DXF bytes into (group_code, value) pairs.
+Works chunk by chunk so a multi-GB file never has to be decoded or held in memory.
+"""
+
+import os
+import struct
+from itertools import chain
+from operator import length_hint
+from typing import Iterator, Tuple, Union
+
+# Values are raw bytes, except the numbers of binary DXF (int / float)
+GroupCodePair = Tuple[int, Union[bytes, int, float]]
+
+# Longest line kept whole (DXF strings stay far below it); the rest of a
+# longer line is dropped so a file without line breaks cannot grow the carry-over
+MAX_LINE_BYTES = int(os.getenv("AUDIT_MAX_LINE_BYTES", str(64 * 1024)))
+
+# First bytes of every binary DXF file
+BINARY_SENTINEL = b'AutoCAD Binary DXF\r\n\x1a\x00'
+
+# Written by some editors at the start of ASCII DXF files
+UTF8_BOM = b'\xef\xbb\xbf'
+
+# Value encodings of binary DXF, by group code (the rest are 0-terminated strings)
+_STRING, _DOUBLE, _INT16, _INT32, _INT64, _BOOL, _CHUNK = range(7)
+_VALUE_KINDS = [_STRING] * 1072
+for _kind, _ranges in (
+    (_DOUBLE, ((10, 60), (110, 150), (210, 240), (460, 470), (1010, 1060))),
+    (_INT16, ((60, 80), (170, 180), (270, 290), (370, 390), (400, 410), (1060, 1071))),
+    (_INT32, ((90, 100), (420, 430), (440, 460), (1071, 1072))),
+    (_INT64, ((160, 170),)),
+    (_BOOL, ((290, 300),)),
+    (_CHUNK, ((310, 320), (1004, 1005))),
+):
+    for _code in chain.from_iterable(range(*r) for r in _ranges):
+        _VALUE_KINDS[_code] = _kind
+
+_unpack_double = struct.Struct('<d').unpack_from
+_unpack_int16 = struct.Struct('<h').unpack_from
+_unpack_int32 = struct.Struct('<i').unpack_from
+_unpack_int64 = struct.Struct('<q').unpack_from
+
+
+def _has_long_line(data: bytes, separator: bytes) -> bool:
+    """Whether `data` holds more than MAX_LINE_BYTES bytes without a separator (a few searches per MB)."""
+    pos, end = 0, len(data)
+    while end - pos > MAX_LINE_BYTES:
+        found = data.rfind(separator, pos, pos + MAX_LINE_BYTES + 1)
+        if found == -1:
+            return True
+        pos = found + 1
+    return False
+
+
+def _lines_consumed(batch: tuple, codes: Iterator[int]) -> int:
+    """
+    Line reached in a batch: its pairs pull their code from `codes` first, so
+    the codes left there are the pairs not read yet.
+    """
+    start, size, ends = batch
+    read = size - length_hint(codes)
+    if not read:
+        return start
+    return start + (ends[read - 1] if ends is not None else 2 * read)
+
+
+class GroupCodeTokenizer:
+    """
+    Incremental tokenizer for ASCII DXF streams.
+
+    Feed it raw byte chunks in order; each call returns an iterator over the
+    complete (group_code, value) pairs found so far. Only the trailing partial
+    line (and a group code still waiting for its value) is carried over to the
+    next chunk, so the carry-over never grows with the file size.
+
+    Lines longer than MAX_LINE_BYTES keep their first MAX_LINE_BYTES bytes
+    and are counted in `truncated_lines`, however the stream is chunked;
+    code / value pairing is unaffected.
+    A file whose first MAX_LINE_BYTES hold no '\n' but do hold '\r' is read
+    with classic Mac line endings. A leading UTF-8 BOM is dropped, and lines
+    found where a group code belongs that are not one (blank lines, stray
+    text) are skipped and counted in `skipped_lines`.
+    """
+
+    def __init__(self):
+        self._carry = b''
+        self._pending_code = None
+        self._separator = b'\n'
+        self._skipping = False  # Inside the dropped tail of an over-long line
+        self._codes = iter(())  # Group codes of the latest batch, consumed by its pairs
+        self._batch = (0, 0, None)  # Its first line, pair count and line offset after each pair
+        self.total_lines = 0
+        self.truncated_lines = 0
+        self.skipped_lines = 0
+
+    def feed(self, chunk: bytes) -> Iterator[GroupCodePair]:
+        """Tokenize the next chunk of the stream."""
+        lines = chunk.split(self._separator)
+        if self._skipping:
+            if len(lines) == 1:
+                return iter(())
+            lines[0] = b''
+            self._skipping = False
+        if self._carry:
+            lines[0] = self._carry + lines[0]
+        if len(lines) == 1 and len(lines[0]) > MAX_LINE_BYTES and not self.total_lines and b'\r' in lines[0]:
+            self._separator = b'\r'
+            lines = lines[0].split(b'\r')
+        self._carry = lines.pop()
+        if len(self._carry) > MAX_LINE_BYTES:
+            self._carry = self._carry[:MAX_LINE_BYTES]
+            self._skipping = True
+            self.truncated_lines += 1
+        if lines and (len(lines[0]) > MAX_LINE_BYTES or _has_long_line(chunk, self._separator)):
+            long_lines = sum(1 for line in lines if len(line) > MAX_LINE_BYTES)
+            self.truncated_lines += long_lines
+            lines = [line[:MAX_LINE_BYTES] for line in lines] if long_lines else lines
+        return self._pair(lines)
+
+    def close(self) -> Iterator[GroupCodePair]:
+        """Flush the final line when the file does not end with a newline."""
+        lines = [self._carry] if self._carry.strip() else []
+        self._carry = b''
+        return self._pair(lines)
+
+    def lines_consumed(self) -> int:
+        """Lines handed out up to the last pair read from the latest batch."""
+        return _lines_consumed(self._batch, self._codes)
+
+    def _pair(self, lines: list) -> Iterator[GroupCodePair]:
+        start = self.total_lines - (self._pending_code is not None)
+        if not self.total_lines and lines and lines[0].startswith(UTF8_BOM):
+            lines[0] = lines[0][len(UTF8_BOM):]
+        self.total_lines += len(lines)
+        if self._pending_code is not None:
+            lines.insert(0, self._pending_code)
+        pending = lines.pop() if len(lines) % 2 else None
+
+        # int() tolerates the padding and '\r' around group codes, so the
+        # codes are converted at C speed without a per-line Python loop.
+        try:
+            codes = list(map(int, lines[0::2]))
+        except ValueError:
+            if pending is not None:
+                lines.append(pending)
+            return self._pair_skipping(lines, start)
+        self._pending_code = pending
+        self._codes = iter(codes)
+        self._batch = (start, len(codes), None)
+        return zip(self._codes, map(bytes.strip, lines[1::2]))
+
+    def _pair_skipping(self, lines: list, start: int) -> Iterator[GroupCodePair]:
+        """Slow path for a batch with lines that are not group codes where one is expected."""
+        codes, values, ends = [], [], []
+        code = code_line = None
+        for offset, line in enumerate(lines, 1):
+            if code is None:
+                try:
+                    code = int(line)
+                except ValueError:
+                    self.skipped_lines += 1
+                    continue
+                code_line = line
+            else:
+                codes.append(code)
+                values.append(line.strip())
+                ends.append(offset)
+                code = None
+        self._pending_code = code_line if code is not None else None
+        self._codes = iter(codes)
+        self._batch = (start, len(codes), ends)
+        return zip(self._codes, values)
+
+
+class BinaryGroupCodeTokenizer:
+    """
+    Incremental tokenizer for binary DXF streams (starting with BINARY_SENTINEL).
+
+    Strings come out as raw bytes like in ASCII DXF and binary chunks as the
+    hex text ASCII DXF uses, but numbers are handed out as Python ints and
+    floats: handlers convert values with int() / float(), which accept both,
+    and skipping the text round trip is what makes binary DXF cheap to read.
+    `total_lines` counts the lines the ASCII equivalent would have: two per
+    pair.
+    """
+
+    def __init__(self):
+        self._carry = b''
+        self._started = False
+        self._wide_codes = True
+        self._codes = iter(())
+        self._batch = (0, 0, None)
+        self.total_lines = 0
+        self.truncated_lines = 0
+        self.skipped_lines = 0
+
+    def feed(self, chunk: bytes) -> Iterator[GroupCodePair]:
+        """Tokenize the next chunk of the stream."""
+        data = self._carry + chunk if self._carry else chunk
+        if not self._started:
+            # The first pair is (0, SECTION): a second 0 byte means 2-byte group codes (R13+)
+            if len(data) < len(BINARY_SENTINEL) + 2:
+                self._carry = data
+                return iter(())
+            if not data.startswith(BINARY_SENTINEL):
+                raise ValueError("Not a binary DXF stream")
+            self._wide_codes = data[len(BINARY_SENTINEL) + 1] == 0
+            self._started = True
+            data = data[len(BINARY_SENTINEL):]
+        return self._pair(data)
+
+    def close(self) -> Iterator[GroupCodePair]:
+        """Fail on a truncated final pair; otherwise nothing is left."""
+        if self._carry.strip(b'\x00'):
+            raise ValueError("Binary DXF stream ends inside a group")
+        self._carry = b''
+        return iter(())
+
+    def lines_consumed(self) -> int:
+        """Lines handed out up to the last pair read from the latest batch."""
+        return _lines_consumed(self._batch, self._codes)
+
+    def _pair(self, data: bytes) -> Iterator[GroupCodePair]:
+        kinds = _VALUE_KINDS
+        wide = self._wide_codes
+        codes, values = [], []
+        add_code, add_value = codes.append, values.append
+        pos = tag = 0
+        end = len(data)
+        # A pair cut by the end of the chunk raises; it is carried over whole
+        try:
+            while pos < end:
+                tag = pos
+                if wide:
+                    code = data[pos] | data[pos + 1] << 8
+                    pos += 2
+                else:
+                    # R12 and older: 1-byte codes, 255 escapes a 2-byte one
+                    code = data[pos]
+                    pos += 1
+                    if code == 255:
+                        code = data[pos] | data[pos + 1] << 8
+                        pos += 2
+                kind = kinds[code] if code < 1072 else _STRING
+                if kind == _STRING:
+                    stop = data.index(0, pos)
+                    value = data[pos:stop]
+                    pos = stop + 1
+                elif kind == _DOUBLE:
+                    value = _unpack_double(data, pos)[0]
+                    pos += 8
+                elif kind == _INT16:
+                    value = _unpack_int16(data, pos)[0]
+                    pos += 2
+                elif kind == _INT32:
+                    value = _unpack_int32(data, pos)[0]
+                    pos += 4
+                elif kind == _INT64:
+                    value = _unpack_int64(data, pos)[0]
+                    pos += 8
+                elif kind == _BOOL:
+                    value = data[pos]
+                    pos += 1
+                else:
+                    size = data[pos]
+                    if pos + 1 + size > end:
+                        raise IndexError
+                    value = data[pos + 1:pos + 1 + size].hex().upper().encode('ascii')
+                    pos += 1 + size
+                add_code(code)
+                add_value(value)
+        except (IndexError, ValueError, struct.error):
+            pos = tag
+        self._carry = data[pos:]
+        if len(self._carry) > MAX_LINE_BYTES:
+            # Values cannot be cut without losing the position of the next pair
+            raise ValueError(f"Binary DXF value longer than {MAX_LINE_BYTES} bytes")
+        self._codes = iter(codes)
+        self._batch = (self.total_lines, len(codes), None)
+        self.total_lines += 2 * len(codes)
+        return zip(self._codes, values)
+
+
+class DxfTokenizer:
+    """
+    Tokenizer for a DXF stream of either format: the first bytes decide
+    between the ASCII and the binary tokenizer, which then does the work.
+    """
+
+    def __init__(self):
+        self._head = b''
+        self._tokenizer = None
+
+    @property
+    def binary(self) -> bool:
+        return isinstance(self._tokenizer, BinaryGroupCodeTokenizer)
+
+    @property
+    def total_lines(self) -> int:
+        return self._tokenizer.total_lines if self._tokenizer is not None else 0
+
+    @property
+    def truncated_lines(self) -> int:
+        return self._tokenizer.truncated_lines if self._tokenizer is not None else 0
+
+    @property
+    def skipped_lines(self) -> int:
+        return self._tokenizer.skipped_lines if self._tokenizer is not None else 0
+
+    def feed(self, chunk: bytes) -> Iterator[GroupCodePair]:
+        """Tokenize the next chunk of the stream."""
+        if self._tokenizer is None:
+            self._head += chunk
+            if len(self._head) < len(BINARY_SENTINEL):
+                return iter(())
+            chunk, self._head = self._head, b''
+            self._tokenizer = BinaryGroupCodeTokenizer() if chunk.startswith(BINARY_SENTINEL) else GroupCodeTokenizer()
+        return self._tokenizer.feed(chunk)
+
+    def close(self) -> Iterator[GroupCodePair]:
+        """Flush whatever is left once the stream ends."""
+        if self._tokenizer is None:
+            # Shorter than the sentinel: can only be (a fragment of) ASCII DXF
+            self._tokenizer = GroupCodeTokenizer()
+            head, self._head = self._head, b''
+            return chain(self._tokenizer.feed(head), self._tokenizer.close())
+        return self._tokenizer.close()
+
+    def lines_consumed(self) -> int:
+        """Lines handed out up to the last pair read from the latest batch."""
+        return self._tokenizer.lines_consumed()
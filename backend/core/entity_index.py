@@ -0,0 +1,410 @@
+"""
+Entity Index
+Compact columnar index of every entity (type, layer, handle, 2D extents) built
+during a streaming audit and stored next to the drawing in R2, so follow-up
+queries (entities of a layer inside a window, full layer listings) are answered
+from a few NumPy arrays instead of re-parsing the file.
+
+Extents come from the entity's own points: the insertion point for blocks and
+texts, the vertices for lines and polylines, center and radius for circles,
+arcs and ellipses. Sub-entities (VERTEX, ATTRIB) extend their parent's row.
+"""
+
+import asyncio
+import io
+import math
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+from core.r2_reader import read_object, write_object
+
+Handler = Callable[[bytes], None]
+
+# Index format stored in the .npz (bumped when the columns change)
+INDEX_FORMAT = 1
+
+# Suffix of the index object stored next to the drawing
+INDEX_SUFFIX = '.index.npz'
+
+# Loaded indexes kept in memory by the API process
+ENTITY_INDEX_CACHE_SIZE = int(os.getenv("ENTITY_INDEX_CACHE_SIZE", "8"))
+
+# Entities that continue their parent entity instead of starting a row
+SUB_ENTITIES = frozenset((b'ENDSEC', b'SEQEND', b'ATTRIB', b'VERTEX'))
+
+# Absolute points besides the first one (10/20), by entity type
+EXTRA_POINT_CODES = {
+    b'LINE': (11,),
+    b'SOLID': (11, 12, 13),
+    b'TRACE': (11, 12, 13),
+    b'3DFACE': (11, 12, 13),
+    b'SPLINE': (11,),
+    b'DIMENSION': (11, 12, 13, 14, 15, 16),
+}
+
+# Entity types whose group 40 is a radius around the first point
+RADIUS_ENTITIES = (b'CIRCLE', b'ARC')
+
+
+def _chain(first: Handler, second: Handler) -> Handler:
+    def handle(value: bytes) -> None:
+        first(value)
+        second(value)
+    return handle
+
+
+def _parse_floats(raw: list) -> np.ndarray:
+    """Convert raw values one-to-one, NaN where a value is not a number."""
+    try:
+        return np.array(raw, dtype=np.float64) if raw else np.empty(0)
+    except ValueError:
+        values = np.empty(len(raw))
+        for i, value in enumerate(raw):
+            try:
+                values[i] = float(value)
+            except ValueError:
+                values[i] = math.nan
+        return values
+
+
+def _segment_bounds(values: np.ndarray, starts: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Min and max of values[starts[i]:starts[i + 1]], NaN for empty segments."""
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.diff(np.append(starts, len(values)))
+    lows = np.full(len(starts), np.nan)
+    highs = np.full(len(starts), np.nan)
+    filled = counts > 0
+    if filled.any():
+        # Dropping empty segments leaves the other boundaries unchanged
+        offsets = starts[filled]
+        lows[filled] = np.fmin.reduceat(values, offsets)
+        highs[filled] = np.fmax.reduceat(values, offsets)
+    return lows, highs
+
+
+class EntityIndexBuilder:
+    """
+    Collects index rows while the auditor parses ENTITIES.
+
+    Per-entity fields are appended to plain lists and coordinates are
+    buffered raw, like CoordinateStats does; `flush` turns the finished rows
+    of each chunk into arrays in one vectorized pass. The last row of a chunk
+    may continue in the next one, so it is carried over.
+    """
+
+    def __init__(self):
+        self.type_ids: Dict[bytes, int] = {}
+        self.layer_ids: Dict[bytes, int] = {b'0': 0}  # Entities without group 8 are on layer 0
+        self.xs: list = []
+        self.ys: list = []
+        self._in_row = False
+        self._ellipse_dx = 0.0
+        self._row_types: list = []
+        self._row_layers: list = []
+        self._row_handles: list = []
+        self._row_radius: list = []
+        self._x_starts: list = []
+        self._y_starts: list = []
+        self._columns: Dict[str, list] = {'types': [], 'layers': [], 'handles': [], 'bounds': []}
+
+    # ------------------------------------------------------------------
+    # Handlers
+    # ------------------------------------------------------------------
+
+    def extend_entity_handlers(self, handlers: Dict[int, Handler]) -> Dict[int, Handler]:
+        """The auditor's ENTITIES table with the index fields added."""
+        extended = dict(handlers)
+        extended[0] = _chain(self.start, handlers[0])
+        extended[5] = _chain(handlers[5], self.on_handle) if 5 in handlers else self.on_handle
+        extended[8] = _chain(handlers[8], self.on_layer)
+        extended[10] = _chain(handlers[10], self.xs.append)
+        extended[20] = _chain(handlers[20], self.ys.append)
+        return extended
+
+    def bind_entity_tables(self, default: Dict[int, Handler], per_type: Dict[bytes, Dict[int, Handler]]) -> None:
+        """Add the type-specific point codes to the per-type tables (in place)."""
+        def extend(entity: bytes, extra: Dict[int, Handler]) -> None:
+            table = dict(per_type.get(entity, default))
+            for code, handler in extra.items():
+                table[code] = _chain(table[code], handler) if code in table else handler
+            per_type[entity] = table
+
+        for entity, codes in EXTRA_POINT_CODES.items():
+            extra = {}
+            for code in codes:
+                extra[code] = self.xs.append
+                extra[code + 10] = self.ys.append
+            extend(entity, extra)
+        for entity in RADIUS_ENTITIES:
+            extend(entity, {40: self.on_radius})
+        extend(b'ELLIPSE', {11: self.on_ellipse_dx, 21: self.on_ellipse_dy})
+
+    def start(self, name: bytes) -> None:
+        if name in SUB_ENTITIES:
+            self._in_row = False
+            return
+        self._in_row = True
+        type_ids = self.type_ids
+        type_id = type_ids.get(name)
+        if type_id is None:
+            type_id = type_ids[name] = len(type_ids)
+        self._row_types.append(type_id)
+        self._row_layers.append(0)
+        self._row_handles.append(0)
+        self._row_radius.append(0.0)
+        self._x_starts.append(len(self.xs))
+        self._y_starts.append(len(self.ys))
+
+    def on_handle(self, value: bytes) -> None:
+        if self._in_row:
+            try:
+                self._row_handles[-1] = int(value, 16)
+            except ValueError:
+                pass
+
+    def on_layer(self, value: bytes) -> None:
+        if self._in_row:
+            layer_ids = self.layer_ids
+            layer_id = layer_ids.get(value)
+            if layer_id is None:
+                layer_id = layer_ids[value] = len(layer_ids)
+            self._row_layers[-1] = layer_id
+
+    def on_radius(self, value: bytes) -> None:
+        if self._in_row:
+            try:
+                self._row_radius[-1] = abs(float(value))
+            except ValueError:
+                pass
+
+    def on_ellipse_dx(self, value: bytes) -> None:
+        try:
+            self._ellipse_dx = float(value)
+        except ValueError:
+            self._ellipse_dx = 0.0
+
+    def on_ellipse_dy(self, value: bytes) -> None:
+        # The major axis endpoint is relative to the center: the ellipse fits
+        # in the circle of that radius
+        if self._in_row:
+            try:
+                self._row_radius[-1] = math.hypot(self._ellipse_dx, float(value))
+            except ValueError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Columns
+    # ------------------------------------------------------------------
+
+    def flush(self, final: bool = False) -> None:
+        """Reduce the finished rows of the current chunk to arrays."""
+        rows = len(self._row_types) if final else len(self._row_types) - 1
+        if rows <= 0:
+            return
+        x_end = len(self.xs) if final else self._x_starts[rows]
+        y_end = len(self.ys) if final else self._y_starts[rows]
+
+        min_x, max_x = _segment_bounds(_parse_floats(self.xs[:x_end]), self._x_starts[:rows])
+        min_y, max_y = _segment_bounds(_parse_floats(self.ys[:y_end]), self._y_starts[:rows])
+        radius = np.array(self._row_radius[:rows])
+        bounds = np.column_stack((min_x - radius, min_y - radius, max_x + radius, max_y + radius))
+
+        columns = self._columns
+        columns['types'].append(np.array(self._row_types[:rows], dtype=np.uint16))
+        columns['layers'].append(np.array(self._row_layers[:rows], dtype=np.uint32))
+        columns['handles'].append(np.array(self._row_handles[:rows], dtype=np.uint64))
+        columns['bounds'].append(bounds)
+
+        # xs / ys are bound into the handler tables, so trim them in place
+        del self.xs[:x_end]
+        del self.ys[:y_end]
+        self._x_starts = [start - x_end for start in self._x_starts[rows:]]
+        self._y_starts = [start - y_end for start in self._y_starts[rows:]]
+        del self._row_types[:rows]
+        del self._row_layers[:rows]
+        del self._row_handles[:rows]
+        del self._row_radius[:rows]
+
+    def build(self) -> 'EntityIndex':
+        """Finish the last rows and return the index."""
+        self.flush(final=True)
+        columns = self._columns
+
+        def concat(name: str, empty: np.ndarray) -> np.ndarray:
+            return np.concatenate(columns[name]) if columns[name] else empty
+
+        return EntityIndex(
+            type_names=[name.decode('utf-8', 'replace') for name in self.type_ids],
+            layer_names=[name.decode('utf-8', 'replace') for name in self.layer_ids],
+            types=concat('types', np.empty(0, dtype=np.uint16)),
+            layers=concat('layers', np.empty(0, dtype=np.uint32)),
+            handles=concat('handles', np.empty(0, dtype=np.uint64)),
+            bounds=concat('bounds', np.empty((0, 4))),
+        )
+
+
+class EntityIndex:
+    """
+    Read side of the index: one row per entity.
+
+    `bounds` holds (min_x, min_y, max_x, max_y), NaN for entities without
+    coordinates. Type and layer columns are ids into the name lists.
+    """
+
+    def __init__(self, type_names: List[str], layer_names: List[str], types: np.ndarray, layers: np.ndarray, handles: np.ndarray, bounds: np.ndarray):
+        self.type_names = type_names
+        self.layer_names = layer_names
+        self.types = types
+        self.layers = layers
+        self.handles = handles
+        self.bounds = bounds
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            format=np.array(INDEX_FORMAT),
+            type_names=np.array(self.type_names, dtype=str),
+            layer_names=np.array(self.layer_names, dtype=str),
+            types=self.types,
+            layers=self.layers,
+            handles=self.handles,
+            bounds=self.bounds,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'EntityIndex':
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            if int(arrays['format']) != INDEX_FORMAT:
+                raise ValueError(f"Unsupported entity index format {int(arrays['format'])}")
+            return cls(
+                type_names=arrays['type_names'].tolist(),
+                layer_names=arrays['layer_names'].tolist(),
+                types=arrays['types'],
+                layers=arrays['layers'],
+                handles=arrays['handles'],
+                bounds=arrays['bounds'],
+            )
+
+    def _ids(self, names: Sequence[str], known: List[str]) -> np.ndarray:
+        lookup = {name: i for i, name in enumerate(known)}
+        return np.array([lookup[name] for name in names if name in lookup], dtype=np.int64)
+
+    def layer_page(self, offset: int = 0, limit: int = 100) -> dict:
+        """Layers with their entity counts per type, in first-seen order."""
+        type_count = max(len(self.type_names), 1)
+        # One pass for every (layer, type) pair
+        pairs = np.bincount(
+            self.layers.astype(np.int64) * type_count + self.types,
+            minlength=len(self.layer_names) * type_count
+        ).reshape(len(self.layer_names), type_count)
+        counts = pairs.sum(axis=1)
+        used = np.flatnonzero(counts)
+        page = used[offset:offset + limit]
+        items = []
+        for layer_id in page:
+            types = pairs[layer_id]
+            items.append({
+                'name': self.layer_names[layer_id],
+                'entity_count': int(counts[layer_id]),
+                'entity_types': {self.type_names[t]: int(types[t]) for t in np.flatnonzero(types)}
+            })
+        return {'total': int(len(used)), 'offset': offset, 'limit': limit, 'items': items}
+
+    def select(
+        self,
+        layers: Optional[Sequence[str]] = None,
+        entity_types: Optional[Sequence[str]] = None,
+        window: Optional[Tuple[float, float, float, float]] = None
+    ) -> np.ndarray:
+        """
+        Rows matching every given filter: on one of `layers`, of one of
+        `entity_types`, with extents overlapping `window` (min_x, min_y,
+        max_x, max_y). Rows are in drawing order.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if layers:
+            mask &= np.isin(self.layers, self._ids(layers, self.layer_names))
+        if entity_types:
+            mask &= np.isin(self.types, self._ids(entity_types, self.type_names))
+        if window is not None:
+            min_x, min_y, max_x, max_y = window
+            bounds = self.bounds
+            # Comparisons with NaN are false: entities without points never match
+            mask &= (bounds[:, 0] <= max_x) & (bounds[:, 2] >= min_x) & (bounds[:, 1] <= max_y) & (bounds[:, 3] >= min_y)
+        return np.flatnonzero(mask)
+
+    def describe(self, row: int) -> dict:
+        """One row as returned by the API."""
+        bbox = self.bounds[row]
+        return {
+            'handle': format(int(self.handles[row]), 'X'),
+            'type': self.type_names[self.types[row]],
+            'layer': self.layer_names[self.layers[row]],
+            'bbox': None if np.isnan(bbox).any() else [float(v) for v in bbox]
+        }
+
+    def query(
+        self,
+        layers: Optional[Sequence[str]] = None,
+        entity_types: Optional[Sequence[str]] = None,
+        window: Optional[Tuple[float, float, float, float]] = None,
+        offset: int = 0,
+        limit: int = 100
+    ) -> dict:
+        """One page of the rows matching the filters (see `select`)."""
+        rows = self.select(layers, entity_types, window)
+        items = [self.describe(row) for row in rows[offset:offset + limit]]
+        return {'total': int(len(rows)), 'offset': offset, 'limit': limit, 'items': items}
+
+
+# ----------------------------------------------------------------------
+# Storage
+# ----------------------------------------------------------------------
+
+_loaded: "OrderedDict[str, EntityIndex]" = OrderedDict()
+
+
+def index_key(file_key: str) -> str:
+    """R2 key of the index stored next to a drawing."""
+    return f"{file_key}{INDEX_SUFFIX}"
+
+
+async def save_entity_index(file_key: str, index: EntityIndex) -> int:
+    """Upload the index next to the drawing. Returns its size in bytes."""
+    data = await asyncio.to_thread(index.to_bytes)
+    await write_object(index_key(file_key), data, 'application/octet-stream')
+    forget_entity_index(file_key)
+    return len(data)
+
+
+def forget_entity_index(file_key: str) -> None:
+    """Drop the copy kept in memory, after the stored index was replaced or deleted."""
+    _loaded.pop(file_key, None)
+
+
+async def load_entity_index(file_key: str) -> Optional[EntityIndex]:
+    """The stored index of a drawing (kept in memory once loaded), None if there is none."""
+    index = _loaded.get(file_key)
+    if index is not None:
+        _loaded.move_to_end(file_key)
+        return index
+    try:
+        data = await read_object(index_key(file_key))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+    index = await asyncio.to_thread(EntityIndex.from_bytes, data)
+    _loaded[file_key] = index
+    while len(_loaded) > ENTITY_INDEX_CACHE_SIZE:
+        _loaded.popitem(last=False)
+    return index
@@ -0,0 +1,72 @@
+"""
+Fake Gemini Backend
+Stand-in for google.generativeai models (GEMINI_BACKEND=fake): same chat
+calls, canned answers after a configurable delay, no network nor API key.
+For local development, benchmarks and checks of the chat plumbing (cache,
+request coalescing, streaming) without spending tokens.
+"""
+
+import asyncio
+import os
+from types import SimpleNamespace
+from typing import List, Optional
+
+# Delay before the answer (or its first chunk), and between streamed chunks
+GEMINI_FAKE_LATENCY_MS = float(os.getenv("GEMINI_FAKE_LATENCY_MS", "300"))
+GEMINI_FAKE_CHUNK_MS = float(os.getenv("GEMINI_FAKE_CHUNK_MS", "20"))
+
+CHARS_PER_TOKEN = 4
+
+
+def _usage(prompt: str, answer: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_token_count=len(prompt) // CHARS_PER_TOKEN,
+        candidates_token_count=len(answer) // CHARS_PER_TOKEN
+    )
+
+
+class FakeResponse:
+    """Non-streamed answer, or a stream of chunks iterated with `async for`."""
+
+    def __init__(self, chunks: List[str], usage: SimpleNamespace, stream: bool):
+        self._chunks = chunks
+        self._stream = stream
+        self.text = ''.join(chunks)
+        self.parts = [self.text]
+        self.usage_metadata = usage
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for i, text in enumerate(self._chunks):
+            if i and self._stream:
+                await asyncio.sleep(GEMINI_FAKE_CHUNK_MS / 1000)
+            yield SimpleNamespace(text=text, parts=[text])
+
+
+class FakeChatSession:
+    def __init__(self, model: "FakeGenerativeModel", history: list):
+        self.model = model
+        self.history = list(history)
+
+    async def send_message_async(self, content: str, stream: bool = False) -> FakeResponse:
+        self.model.calls += 1
+        await asyncio.sleep(GEMINI_FAKE_LATENCY_MS / 1000)
+        answer = f"Respuesta de prueba a: {content}"
+        words = answer.split(' ')
+        chunks = [word + ' ' for word in words[:-1]] + words[-1:]
+        prompt = (self.model.system_instruction or '') + content
+        return FakeResponse(chunks, _usage(prompt, answer), stream)
+
+
+class FakeGenerativeModel:
+    """Counts the calls made through it (`calls`), to check caching and coalescing."""
+
+    def __init__(self, model_name: str, system_instruction: Optional[str] = None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.calls = 0
+
+    def start_chat(self, history: Optional[list] = None) -> FakeChatSession:
+        return FakeChatSession(self, history or [])
@@ -4,15 +4,33 @@ Restricted to CAD/BIM/Construction topics only.
 """
 
 import os
+import time
+from collections import OrderedDict
 import google.generativeai as genai
 from loguru import logger
-from typing import Dict, Any, Optional
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
+
+from core.chat_context import ChatContext, chat_contexts, estimate_tokens
+from core.chat_sessions import ChatSession
+from core.chat_cache import chat_cache, chat_cache_key
+from core.chat_topics import is_off_topic
+from core.gemini_fake import FakeGenerativeModel
+from core.metrics import CHAT_REPLIES, observe_gemini, observe_gemini_prompt
+from core.tracing import add_span
 
 # Configure Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
+# 'google' (the Gemini API) or 'fake' (canned answers, no API key needed; see core.gemini_fake)
+GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "google")
+
+
+class GeminiNotConfigured(Exception):
+    """Raised by the streaming chat when no API key is configured."""
+
+
 # System prompt that restricts Gemini to CAD/BIM topics
 SYSTEM_PROMPT = """Eres un asistente experto en ingeniería CAD/BIM llamado "SIGEBIM Assistant".
 Tu especialidad es analizar archivos DXF, planos de construcción, y normas de edificación.
@@ -42,6 +60,134 @@ REGLAS ESTRICTAS:
 # Model configuration
 MODEL_NAME = "gemini-1.5-flash"
 
+# Models kept for reuse, one per system instruction (the instruction embeds the file context)
+MODEL_CACHE_SIZE = int(os.getenv("GEMINI_MODEL_CACHE_SIZE", "32"))
+
+NOT_CONFIGURED_MESSAGE = "❌ Error: API de Gemini no configurada. Contacta al administrador."
+
+# Refusal the system prompt asks for, also given locally to clearly off-topic questions
+OFF_TOPIC_REPLY = (
+    "🔒 Solo puedo ayudarte con temas de planos, construcción y archivos CAD.\n"
+    "¿Tienes alguna pregunta sobre tu proyecto o archivo DXF?"
+)
+
+_models: "OrderedDict[str, genai.GenerativeModel]" = OrderedDict()
+
+
+def build_system_instruction(context: Optional[ChatContext] = None) -> str:
+    """System prompt, followed by the audit data of the current file when there is one."""
+    if context is None:
+        return SYSTEM_PROMPT
+    return "\n".join([SYSTEM_PROMPT, context.text])
+
+
+def is_configured() -> bool:
+    return GEMINI_BACKEND == 'fake' or bool(GEMINI_API_KEY)
+
+
+def get_model(system_instruction: str):
+    """
+    Model for a system instruction, reused across requests (with its async
+    client and connection). The least recently used one is dropped first.
+    """
+    model = _models.get(system_instruction)
+    if model is not None:
+        _models.move_to_end(system_instruction)
+        return model
+    model_class = FakeGenerativeModel if GEMINI_BACKEND == 'fake' else genai.GenerativeModel
+    model = model_class(model_name=MODEL_NAME, system_instruction=system_instruction)
+    _models[system_instruction] = model
+    if len(_models) > MODEL_CACHE_SIZE:
+        _models.popitem(last=False)
+    return model
+
+
+def _resolve_context(file_context: Optional[Dict[str, Any]]) -> Tuple[Optional[ChatContext], Dict[str, Any]]:
+    """Rendered file context (None without a file) and its span attributes."""
+    if not file_context:
+        return None, {}
+    context, cached = chat_contexts.get(file_context)
+    return context, {
+        'context_tokens': context.tokens,
+        'context_cached': cached,
+        'layers_listed': context.layers_listed,
+        'layers_total': context.layers_total
+    }
+
+
+def _start_chat(context: Optional[ChatContext], conversation_history: Optional[list], attributes: Dict[str, Any]):
+    """Chat session on the model for this file; the prompt size goes into `attributes`."""
+    instruction = build_system_instruction(context)
+    attributes['system_tokens'] = estimate_tokens(instruction)
+    if context is None:
+        observe_gemini_prompt(attributes['system_tokens'], 'none')
+    else:
+        observe_gemini_prompt(attributes['system_tokens'], 'cached' if attributes['context_cached'] else 'rendered')
+    model = get_model(instruction)
+    return model.start_chat(history=conversation_history or [])
+
+
+def _record_call(started: float, first_token: Optional[float], response, attributes: Dict[str, Any]) -> None:
+    """Metrics and span attributes of a finished Gemini call (response None on failure)."""
+    seconds = time.perf_counter() - started
+    if response is None:
+        observe_gemini(seconds, 'error')
+        add_span('gemini.chat', seconds, start=started, status='error', **attributes)
+        return
+    tokens = observe_gemini(seconds, 'ok', response.usage_metadata, first_token)
+    attributes.update({f"{kind}_tokens": count for kind, count in tokens.items()})
+    if first_token is not None:
+        attributes['first_token_ms'] = round(first_token * 1000, 3)
+    add_span('gemini.chat', seconds, start=started, **attributes)
+
+
+async def _ask_gemini(
+    user_message: str,
+    context: Optional[ChatContext],
+    conversation_history: Optional[list],
+    attributes: Dict[str, Any]
+) -> str:
+    """One upstream call; raises on failure."""
+    started = time.perf_counter()
+    response = None
+    attributes = {'model': MODEL_NAME, 'stream': False, **attributes}
+    try:
+        chat = _start_chat(context, conversation_history, attributes)
+        # Async API: a slow completion does not hold the event loop
+        response = await chat.send_message_async(user_message)
+        text = response.text
+        logger.info(f"Gemini response received. Length: {len(text)}")
+        return text
+    except Exception:
+        response = None
+        raise
+    finally:
+        _record_call(started, None, response, attributes)
+
+
+async def _answer(
+    user_message: str,
+    file_context: Optional[Dict[str, Any]],
+    conversation_history: Optional[list]
+) -> str:
+    """Answer to one question (see chat_with_gemini); raises when Gemini fails."""
+    if is_off_topic(user_message):
+        CHAT_REPLIES.labels('off_topic').inc()
+        return OFF_TOPIC_REPLY
+
+    context, attributes = _resolve_context(file_context)
+    if conversation_history:
+        # The answer depends on the whole conversation, not only on the question
+        answer = await _ask_gemini(user_message, context, conversation_history, attributes)
+        source = 'model'
+    else:
+        key = chat_cache_key(user_message, context.key if context else None, MODEL_NAME)
+        answer, source = await chat_cache.get_or_call(
+            key, lambda: _ask_gemini(user_message, context, None, attributes)
+        )
+    CHAT_REPLIES.labels(source).inc()
+    return answer
+
 
 async def chat_with_gemini(
     user_message: str,
@@ -50,6 +196,8 @@ async def chat_with_gemini(
 ) -> str:
     """
     Send a message to Gemini with optional file context.
+    Clearly off-topic questions are refused without a model call; first
+    questions about a file (no history) go through the response cache.
     
     Args:
         user_message: The user's question
@@ -59,83 +207,98 @@ async def chat_with_gemini(
     Returns:
         Gemini's response text
     """
-    if not GEMINI_API_KEY:
-        return "❌ Error: API de Gemini no configurada. Contacta al administrador."
+    if not is_configured():
+        return NOT_CONFIGURED_MESSAGE
     
     try:
-        # Build context message
-        context_parts = [SYSTEM_PROMPT]
-        
-        if file_context:
-            context_parts.append(f"""
-DATOS DEL ARCHIVO DXF ACTUAL:
-- Versión: {file_context.get('version', 'No disponible')}
-- Total de capas: {file_context.get('total_layers', 0)}
-- Total de entidades: {file_context.get('entities', 0)}
-- Score de auditoría: {file_context.get('score', 'No auditado')}/100
-
-CAPAS DETECTADAS:
-{format_layers(file_context.get('layers', []))}
-
-PROBLEMAS ENCONTRADOS:
-{format_issues(file_context.get('details', []))}
-""")
-        
-        # Initialize model
-        model = genai.GenerativeModel(
-            model_name=MODEL_NAME,
-            system_instruction="\n".join(context_parts)
-        )
-        
-        # Create chat session
-        chat = model.start_chat(history=conversation_history or [])
-        
-        # Send message
-        response = chat.send_message(user_message)
-        
-        logger.info(f"Gemini response received. Length: {len(response.text)}")
-        return response.text
+        return await _answer(user_message, file_context, conversation_history)
         
     except Exception as e:
         logger.error(f"Gemini API error: {str(e)}")
         return f"❌ Error al procesar tu pregunta: {str(e)}"
 
 
-def format_layers(layers: list) -> str:
-    """Format layer data for context."""
-    if not layers:
-        return "No hay datos de capas disponibles."
-    
-    lines = []
-    for layer in layers:
-        color_name = get_color_name(layer.get('color', 0))
-        lines.append(f"  - {layer.get('name', 'Sin nombre')}: Color {layer.get('color', 0)} ({color_name}), Tipo: {layer.get('linetype', 'Continuous')}")
-    return "\n".join(lines)
+async def chat_in_session(session: ChatSession, user_message: str) -> str:
+    """
+    One turn of a server-side conversation (core.chat_sessions), with the
+    session's file context and history. Failed turns are not kept.
+    """
+    if not is_configured():
+        return NOT_CONFIGURED_MESSAGE
 
+    async with session.lock:
+        try:
+            answer = await _answer(user_message, session.file_context, session.history())
+        except Exception as e:
+            logger.error(f"Gemini API error: {str(e)}")
+            return f"❌ Error al procesar tu pregunta: {str(e)}"
+        session.add_turn(user_message, answer)
+        return answer
 
-def format_issues(details: list) -> str:
-    """Format audit issues for context."""
-    if not details:
-        return "No se encontraron problemas."
-    
-    lines = []
-    for issue in details:
-        severity_icon = "🔴" if issue.get('severity') == 'fail' else "🟡"
-        lines.append(f"  {severity_icon} {issue.get('code', 'UNKNOWN')}: {issue.get('message', 'Sin descripción')}")
-    return "\n".join(lines)
-
-
-def get_color_name(color_index: int) -> str:
-    """Convert AutoCAD color index to name."""
-    colors = {
-        0: "ByBlock",
-        1: "Rojo",
-        2: "Amarillo",
-        3: "Verde",
-        4: "Cian",
-        5: "Azul",
-        6: "Magenta",
-        7: "Blanco/Negro",
-        256: "ByLayer"
-    }
-    return colors.get(color_index, f"Color {color_index}")
+
+async def stream_chat_with_gemini(
+    user_message: str,
+    file_context: Optional[Dict[str, Any]] = None,
+    conversation_history: Optional[list] = None
+) -> AsyncIterator[str]:
+    """
+    Same as chat_with_gemini, but yields the answer in pieces as Gemini
+    produces them. Errors are raised (after any text already yielded);
+    a missing API key raises GeminiNotConfigured. Cached answers and the
+    off-topic refusal come in one piece; streams are not coalesced, but a
+    complete one is stored for later questions.
+    """
+    if not is_configured():
+        raise GeminiNotConfigured(NOT_CONFIGURED_MESSAGE)
+
+    if is_off_topic(user_message):
+        CHAT_REPLIES.labels('off_topic').inc()
+        yield OFF_TOPIC_REPLY
+        return
+
+    context, attributes = _resolve_context(file_context)
+    key = None
+    if not conversation_history:
+        key = chat_cache_key(user_message, context.key if context else None, MODEL_NAME)
+        answer = chat_cache.lookup(key)
+        if answer is not None:
+            CHAT_REPLIES.labels('cache').inc()
+            yield answer
+            return
+
+    started = time.perf_counter()
+    first_token = None
+    response = None
+    pieces = []
+    attributes = {'model': MODEL_NAME, 'stream': True, **attributes}
+    try:
+        chat = _start_chat(context, conversation_history, attributes)
+        # Returns once the first chunk has arrived
+        stream = await chat.send_message_async(user_message, stream=True)
+        first_token = time.perf_counter() - started
+        async for chunk in stream:
+            # Chunks without text (safety metadata, the final usage counts) are skipped
+            text = chunk.text if chunk.parts else ''
+            if text:
+                pieces.append(text)
+                yield text
+        response = stream
+        logger.info(f"Gemini stream finished. Length: {sum(map(len, pieces))}, first token after {first_token * 1000:.0f} ms")
+    except Exception as e:
+        logger.error(f"Gemini API error: {str(e)}")
+        raise
+    finally:
+        _record_call(started, first_token, response, attributes)
+    CHAT_REPLIES.labels('model').inc()
+    if key is not None:
+        chat_cache.put(key, ''.join(pieces))
+
+
+async def stream_chat_in_session(session: ChatSession, user_message: str) -> AsyncIterator[str]:
+    """stream_chat_with_gemini for one turn of a session; the turn is kept once the stream completes."""
+    async with session.lock:
+        pieces = []
+        async for text in stream_chat_with_gemini(user_message, session.file_context, session.history()):
+            pieces.append(text)
+            yield text
+        session.add_turn(user_message, ''.join(pieces))
@@ -0,0 +1,52 @@
+"""
+Shared HTTP Client
+One pooled httpx.AsyncClient per process for its downloads (audit sources,
+cache key probes), so requests reuse connections instead of opening a
+client each. The API process shares it across requests; a worker of the
+audit pool shares its own across the batch files it audits, as it runs
+them on one loop (worker_pool.run_in_worker_loop).
+"""
+
+import asyncio
+import os
+from typing import Optional
+
+import httpx
+from loguru import logger
+
+# Connections open at once across all hosts, and idle ones kept for reuse
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "16"))
+
+# Downloads of large drawings may stay open for minutes; connecting may not
+HTTP_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    The shared client, created on first use. Its connections belong to the
+    event loop that created it, so a new loop (a test client, say) gets a
+    new client.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+        )
+        _client_loop = loop
+        logger.info(f"Shared HTTP client started ({HTTP_MAX_CONNECTIONS} connections)")
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared client (called on application shutdown)."""
+    global _client, _client_loop
+    if _client is not None and _client_loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client = None
+    _client_loop = None
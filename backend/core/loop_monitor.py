@@ -0,0 +1,58 @@
+"""
+Event Loop Lag Monitor
+Measures how late the event loop wakes up from a short sleep. Any blocking
+call on the loop (CPU-bound parsing, sync I/O) shows up directly as lag.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+# Seconds between probes
+LAG_PROBE_INTERVAL = 0.1
+
+# Recent samples kept for percentiles
+LAG_WINDOW = 600
+
+
+class LoopLagMonitor:
+    """Background task that samples event loop lag."""
+
+    def __init__(self, interval: float = LAG_PROBE_INTERVAL, window: int = LAG_WINDOW):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def snapshot(self) -> dict:
+        """Lag statistics in milliseconds."""
+        if not self.samples:
+            return {'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0, 'samples': 0}
+        ordered = sorted(self.samples)
+        return {
+            'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2),
+            'p99_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+            'max_ms': round(self.max_lag * 1000, 2),
+            'samples': len(ordered)
+        }
+
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,114 @@
+"""
+Memory Statistics
+Per-audit memory instrumentation: resident set size sampled while an audit
+runs and, with AUDIT_TRACEMALLOC=1, the Python allocation peak and the largest
+live allocation sites at the end. Process-wide counters aggregate the audits.
+"""
+
+import os
+import tracemalloc
+from typing import Any, Dict, Optional
+
+# tracemalloc slows allocation-heavy code down noticeably, so it is opt-in
+AUDIT_TRACEMALLOC = os.getenv("AUDIT_TRACEMALLOC", "0") == "1"
+
+# Allocation sites listed per audit when tracing
+TRACEMALLOC_TOP = 5
+
+_MB = 1024 * 1024
+
+
+def current_rss(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size of this process (or `pid`) in bytes, None where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _mb(value: Optional[int]) -> Optional[float]:
+    return round(value / _MB, 1) if value is not None else None
+
+
+class MemoryMonitor:
+    """
+    Memory use of one audit. Call `sample()` once per chunk and `finish()`
+    at the end. RSS is process-wide: audits running at the same time in the
+    same process share it (background jobs run one per worker process).
+    """
+
+    def __init__(self, trace: bool = AUDIT_TRACEMALLOC):
+        self.start_rss = current_rss()
+        self.peak_rss = self.start_rss
+        # Only the monitor that started tracing stops it
+        self._trace = trace and not tracemalloc.is_tracing()
+        if self._trace:
+            tracemalloc.start()
+
+    def sample(self) -> None:
+        rss = current_rss()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def finish(self) -> Dict[str, Any]:
+        """Summary for the audit result: MB figures and, when traced, the top allocation sites."""
+        self.sample()
+        report = {
+            'start_rss_mb': _mb(self.start_rss),
+            'peak_rss_mb': _mb(self.peak_rss),
+            'peak_increase_mb': _mb(self.peak_rss - self.start_rss) if self.start_rss is not None else None,
+        }
+        if self._trace:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self._trace = False
+            report['traced_peak_mb'] = _mb(peak)
+            report['traced_live_mb'] = _mb(current)
+            report['top_allocations'] = [
+                {
+                    'where': f"{'/'.join(stat.traceback[0].filename.rsplit('/', 2)[-2:])}:{stat.traceback[0].lineno}",
+                    'size_mb': _mb(stat.size),
+                    'blocks': stat.count
+                }
+                for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]
+            ]
+        return report
+
+
+class AuditMemoryMetrics:
+    """Aggregated memory figures of the audits run (or collected) by this process."""
+
+    def __init__(self):
+        self.audits = 0
+        self.max_peak_rss_mb = 0.0
+        self.max_peak_increase_mb = 0.0
+        self.total_peak_increase_mb = 0.0
+        self.last: Optional[Dict[str, Any]] = None
+
+    def record(self, result: Optional[dict]) -> None:
+        """Add the `summary.memory` block of an audit result, if it has one."""
+        memory = (result or {}).get('summary', {}).get('memory')
+        if not memory:
+            return
+        self.audits += 1
+        self.max_peak_rss_mb = max(self.max_peak_rss_mb, memory.get('peak_rss_mb') or 0.0)
+        increase = memory.get('peak_increase_mb') or 0.0
+        self.max_peak_increase_mb = max(self.max_peak_increase_mb, increase)
+        self.total_peak_increase_mb += increase
+        self.last = memory
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'audits': self.audits,
+            'current_rss_mb': _mb(current_rss()),
+            'max_peak_rss_mb': self.max_peak_rss_mb,
+            'max_peak_increase_mb': self.max_peak_increase_mb,
+            'mean_peak_increase_mb': round(self.total_peak_increase_mb / self.audits, 1) if self.audits else 0.0,
+            'tracemalloc': AUDIT_TRACEMALLOC,
+            'last': self.last,
+        }
+
+
+audit_memory = AuditMemoryMetrics()
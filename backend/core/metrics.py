@@ -0,0 +1,209 @@
+"""
+Service Metrics
+Prometheus metrics for the API: request latency, audit stages (download,
+parse, rules...), audited bytes and throughput, job queue depth, R2 call
+latency by operation and Gemini latency and token counts.
+
+Audits that run in worker processes measure themselves (AuditProfile) and
+carry the figures back in `summary.profile`; observe_audit() records them
+in the API process, which serves /metrics.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from core.memory_stats import audit_memory
+from core.tracing import add_span, start_trace
+
+# Audit stages take from milliseconds (small drawings) to tens of minutes
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+THROUGHPUT_BUCKETS = tuple(2 ** i * 1024 * 1024 for i in range(-2, 11))  # 256 KB/s .. 1 GB/s
+MEMORY_BUCKETS = tuple(2 ** i * 1024 * 1024 for i in range(0, 14))  # 1 MB .. 8 GB
+
+# Paths not traced nor timed (scrapes and probes)
+UNTRACED_PATHS = ('/metrics', '/health')
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'sigebim_http_request_seconds', 'API request latency, until the response body is sent',
+    ['method', 'route', 'status']
+)
+AUDITS = Counter('sigebim_audits_total', 'Audits run (cache misses)', ['engine', 'status'])
+AUDIT_STAGE_SECONDS = Histogram(
+    'sigebim_audit_stage_seconds', 'Time spent per audit stage', ['engine', 'stage'], buckets=STAGE_BUCKETS
+)
+AUDIT_BYTES = Counter('sigebim_audit_bytes_total', 'Bytes read by audits (as stored)', ['engine'])
+AUDIT_THROUGHPUT = Histogram(
+    'sigebim_audit_throughput_bytes_per_second', 'Bytes per second of each audit, end to end',
+    ['engine'], buckets=THROUGHPUT_BUCKETS
+)
+AUDIT_PEAK_RSS_INCREASE = Histogram(
+    'sigebim_audit_peak_rss_increase_bytes', 'Peak RSS increase of each audit', ['engine'], buckets=MEMORY_BUCKETS
+)
+AUDIT_QUEUE_DEPTH = Gauge('sigebim_audit_queue_depth', 'Background audits waiting for a worker')
+R2_REQUEST_SECONDS = Histogram(
+    'sigebim_r2_request_seconds', 'R2 API call latency, until the response headers (retries included)',
+    ['operation', 'outcome']
+)
+GEMINI_REQUEST_SECONDS = Histogram(
+    'sigebim_gemini_request_seconds', 'Gemini request latency', ['outcome'], buckets=STAGE_BUCKETS
+)
+GEMINI_FIRST_TOKEN_SECONDS = Histogram(
+    'sigebim_gemini_first_token_seconds', 'Time to the first streamed Gemini chunk', buckets=STAGE_BUCKETS
+)
+GEMINI_SYSTEM_TOKENS = Histogram(
+    'sigebim_gemini_system_prompt_tokens', 'Estimated tokens of the system prompt (file context included)',
+    ['context'], buckets=tuple(2 ** i for i in range(7, 17))
+)
+CHAT_REPLIES = Counter(
+    'sigebim_chat_replies_total', 'Chat answers by source: model, cache, coalesced or off_topic', ['source']
+)
+GEMINI_TOKENS = Counter('sigebim_gemini_tokens_total', 'Gemini tokens used', ['kind'])
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class AuditProfile:
+    """
+    Where one audit spends its time. Stage times add up when a stage runs
+    more than once (once per chunk, for instance); `report()` goes into the
+    audit summary as `profile`.
+    """
+
+    def __init__(self, engine: str):
+        self.engine = engine
+        self.bytes = 0
+        self.stages: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'engine': self.engine,
+            'bytes': self.bytes,
+            'seconds': round(time.perf_counter() - self._start, 4),
+            'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()}
+        }
+
+
+def observe_audit(result: Optional[dict]) -> None:
+    """
+    Record a finished audit (run here or in a worker process): status,
+    stage times, bytes, throughput and memory, plus one span per stage
+    under the current request (placed to end with the audit: stages that
+    alternate, like download and parse, have no single start).
+    """
+    audit_memory.record(result)
+    summary = (result or {}).get('summary', {})
+    profile = summary.get('profile')
+    if not profile:
+        AUDITS.labels('unknown', (result or {}).get('status', 'error')).inc()
+        return
+    engine = profile['engine']
+    AUDITS.labels(engine, result.get('status', 'unknown')).inc()
+    for stage, seconds in profile['stages'].items():
+        AUDIT_STAGE_SECONDS.labels(engine, stage).observe(seconds)
+        add_span(f"audit.{stage}", seconds, engine=engine)
+    if profile['bytes']:
+        AUDIT_BYTES.labels(engine).inc(profile['bytes'])
+        if profile['seconds'] > 0:
+            AUDIT_THROUGHPUT.labels(engine).observe(profile['bytes'] / profile['seconds'])
+    increase = (summary.get('memory') or {}).get('peak_increase_mb')
+    if increase is not None:
+        AUDIT_PEAK_RSS_INCREASE.labels(engine).observe(max(0.0, increase) * 1024 * 1024)
+
+
+def observe_gemini(seconds: float, outcome: str, usage=None, first_token: Optional[float] = None) -> Dict[str, int]:
+    """
+    Record one Gemini request (`first_token`: seconds to the first chunk of
+    a streamed answer); returns the token counts found in its usage metadata.
+    """
+    GEMINI_REQUEST_SECONDS.labels(outcome).observe(seconds)
+    if first_token is not None:
+        GEMINI_FIRST_TOKEN_SECONDS.observe(first_token)
+    tokens = {}
+    if usage is not None:
+        tokens = {'prompt': usage.prompt_token_count or 0, 'response': usage.candidates_token_count or 0}
+        for kind, count in tokens.items():
+            GEMINI_TOKENS.labels(kind).inc(count)
+    return tokens
+
+
+def observe_gemini_prompt(tokens: int, context: str) -> None:
+    """Record the system prompt size of one chat request; `context`: 'none', 'cached' or 'rendered'."""
+    GEMINI_SYSTEM_TOKENS.labels(context).observe(tokens)
+
+
+def instrument_r2_client(client) -> None:
+    """Time every API call of a boto3 client by operation, as metrics and spans."""
+    def before_call(context, **kwargs):
+        context['metrics_start'] = time.perf_counter()
+
+    def finish(model, context, outcome: str) -> None:
+        start = context.pop('metrics_start', None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        R2_REQUEST_SECONDS.labels(model.name, outcome).observe(duration)
+        add_span(f"r2.{model.name}", duration, start=start, status='ok' if outcome == 'ok' else 'error')
+
+    def after_call(http_response, model, context, **kwargs):
+        finish(model, context, 'ok' if http_response.status_code < 400 else 'error')
+
+    def after_call_error(model, context, **kwargs):
+        finish(model, context, 'error')
+
+    events = client.meta.events
+    events.register('before-call.s3', before_call)
+    events.register('after-call.s3', after_call)
+    events.register('after-call-error.s3', after_call_error)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: one trace per API request (its id is returned in the
+    X-Trace-Id header) and request latency by route template and status.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in UNTRACED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+        with start_trace(f"{scope['method']} {scope['path']}") as trace:
+            async def send_with_trace_id(message):
+                nonlocal status
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+                    message['headers'] = list(message.get('headers', [])) + [(b'x-trace-id', trace.trace_id.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                route = scope.get('route')
+                if route is not None:
+                    trace.name = f"{scope['method']} {route.path}"
+                HTTP_REQUEST_SECONDS.labels(
+                    scope['method'], getattr(route, 'path', 'unmatched'), str(status)
+                ).observe(time.perf_counter() - start)
@@ -0,0 +1,263 @@
+"""
+Parallel DXF Audit
+Splits a remote DXF into byte ranges aligned on entity boundaries, fetches
+them concurrently (HTTP Range requests, or ranged GetObject calls for R2
+objects) and parses each range in the audit worker pool. Per-range statistics are merged in file order, so the
+result matches the sequential streaming audit.
+"""
+
+import asyncio
+import os
+import re
+import time
+from typing import List, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+from core.streaming_audit import (
+    AUDIT_CHUNK_SIZE,
+    AuditStats,
+    DxfStreamAuditor,
+    audit_error_result,
+    build_audit_report,
+    stream_audit_large_dxf,
+)
+from core.audit_rules import load_ruleset
+from core.dxf_formats import SNIFF_SIZE, sniff_format
+from core.http_client import get_http_client
+from core.metrics import AuditProfile
+from core.r2_reader import head_object, object_key, read_object_range
+from core.worker_pool import get_process_pool
+
+# Target size of each byte range handed to a worker
+PARALLEL_RANGE_SIZE = int(os.getenv("PARALLEL_RANGE_SIZE", str(32 * 1024 * 1024)))
+
+# Ranges downloaded (and held in memory) at the same time
+PARALLEL_MAX_FETCHES = int(os.getenv("PARALLEL_MAX_FETCHES", "8"))
+
+# Bytes read around a split point to find the next entity boundary
+BOUNDARY_PROBE_SIZE = 64 * 1024
+
+# A split point without a boundary this far after it makes the audit sequential
+BOUNDARY_SEARCH_LIMIT = PARALLEL_RANGE_SIZE
+
+# A group code 0 line followed by a value containing a letter. Group codes
+# are always numeric, so the letter proves the "0" line is a code, not a value.
+ENTITY_BOUNDARY = re.compile(rb'\n[ \t]*0\r?\n[^\n]*[A-Za-z_][^\n]*\n')
+
+
+def audit_byte_range(data: bytes, mid_entities: bool, rules_id: Optional[str] = None) -> dict:
+    """
+    Parse one byte range (runs inside a worker process).
+
+    Everything seen before the first section marker is returned as
+    `leading`, because its section is only known once the previous
+    range has been parsed. `seconds` is the parse time.
+    """
+    started = time.perf_counter()
+    auditor = DxfStreamAuditor(mid_entities=mid_entities, rules=load_ruleset(rules_id))
+    for start in range(0, len(data), AUDIT_CHUNK_SIZE):
+        auditor.feed(data[start:start + AUDIT_CHUNK_SIZE])
+        if auditor.done:
+            break
+    auditor.close()
+    seconds = time.perf_counter() - started
+
+    if mid_entities and auditor.leading is None:
+        # No section marker at all: the whole range inherits its section
+        return {
+            'lines': auditor.total_lines, 'leading': auditor.stats, 'stats': None,
+            'ends_in_section': None, 'done': False, 'seconds': seconds
+        }
+    return {
+        'lines': auditor.total_lines,
+        'leading': auditor.leading,
+        'leading_lines': auditor.leading_lines,
+        'stats': auditor.stats,
+        'ends_in_section': auditor.section,
+        'done': auditor.done,
+        'seconds': seconds
+    }
+
+
+def merge_range_results(parts: List[dict]) -> Tuple[AuditStats, int]:
+    """
+    Merge per-range results in file order, stopping where the ENTITIES
+    section ends, exactly as the sequential audit does.
+    """
+    merged = AuditStats()
+    total_lines = 0
+    section = None
+    for part in parts:
+        leading = part['leading']
+        if leading is not None and section == b'ENTITIES':
+            merged.merge(leading)
+            if part['stats'] is not None:
+                # The section marker that closed `leading` was the end of ENTITIES
+                total_lines += part['leading_lines']
+                break
+        elif leading is not None and section in (b'TABLES', b'BLOCKS'):
+            # Parsed as entities, but only the table and block definitions count there
+            merged.merge_definitions(leading)
+        total_lines += part['lines']
+        if part['stats'] is not None:
+            merged.merge(part['stats'])
+            if part['done']:
+                break
+            section = part['ends_in_section']
+    return merged, total_lines
+
+
+class _HttpRangeReader:
+    """Byte ranges of a URL through HTTP Range requests."""
+
+    def __init__(self, client: httpx.AsyncClient, file_url: str):
+        self.client = client
+        self.file_url = file_url
+
+    async def size(self) -> Optional[int]:
+        """
+        Get the object size, or None if the server ignores Range requests.
+        Uses a one-byte ranged GET because presigned GET URLs reject HEAD.
+        """
+        # Streamed so a server that ignores Range does not send the whole body
+        async with self.client.stream('GET', self.file_url, headers={'Range': 'bytes=0-0'}) as response:
+            if response.status_code != 206:
+                return None
+            total = response.headers.get('content-range', '').rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+
+    async def read(self, start: int, end: int) -> bytes:
+        response = await self.client.get(self.file_url, headers={'Range': f'bytes={start}-{end - 1}'})
+        if response.status_code != 206:
+            raise RuntimeError(f'Range request failed: HTTP {response.status_code}')
+        return response.content
+
+
+class _ObjectRangeReader:
+    """Byte ranges of an R2 object through the shared S3 client."""
+
+    def __init__(self, file_key: str):
+        self.file_key = file_key
+
+    async def size(self) -> Optional[int]:
+        size, _ = await head_object(self.file_key)
+        return size
+
+    async def read(self, start: int, end: int) -> bytes:
+        return await read_object_range(self.file_key, start, end)
+
+
+async def _find_boundary(reader, offset: int, size: int, semaphore: asyncio.Semaphore) -> Optional[int]:
+    """
+    Offset of the first entity boundary at or after `offset`, None when
+    there is none within BOUNDARY_SEARCH_LIMIT bytes.
+    """
+    overlap = 256
+    limit = min(offset + BOUNDARY_SEARCH_LIMIT, size)
+    while offset < limit:
+        end = min(offset + BOUNDARY_PROBE_SIZE, limit)
+        async with semaphore:
+            data = await reader.read(offset, end)
+        match = ENTITY_BOUNDARY.search(data)
+        if match:
+            return offset + match.start() + 1
+        if end >= limit:
+            break
+        offset = end - overlap
+    return None
+
+
+async def _plan_ranges(reader, size: int, semaphore: asyncio.Semaphore) -> Optional[List[Tuple[int, int]]]:
+    """Ranges split on entity boundaries, or None when a split point has none near it."""
+    split_points = range(PARALLEL_RANGE_SIZE, size, PARALLEL_RANGE_SIZE)
+    boundaries = await asyncio.gather(*(_find_boundary(reader, point, size, semaphore) for point in split_points))
+    if None in boundaries:
+        # Merging around it could leave one range with most of the file in memory
+        logger.info(f"No entity boundary within {BOUNDARY_SEARCH_LIMIT:,} bytes of a split point")
+        return None
+    edges = sorted({0, size, *boundaries})
+    return list(zip(edges[:-1], edges[1:]))
+
+
+async def _fetch_and_audit(
+    reader, start: int, end: int, semaphore: asyncio.Semaphore, rules_id: Optional[str], profile: AuditProfile
+) -> dict:
+    async with semaphore:
+        fetch_start = time.perf_counter()
+        data = await reader.read(start, end)
+        profile.add('download', time.perf_counter() - fetch_start)
+        profile.bytes += len(data)
+        loop = asyncio.get_running_loop()
+        part = await loop.run_in_executor(get_process_pool(), audit_byte_range, data, start > 0, rules_id)
+        profile.add('parse', part['seconds'])
+        return part
+
+
+async def _audit_ranges(reader, rules_id: Optional[str], profile: AuditProfile) -> Optional[List[dict]]:
+    """Per-range results, or None when ranged reads are not worth it (or not possible)."""
+    size = await reader.size()
+    if size is None or size < 2 * PARALLEL_RANGE_SIZE:
+        return None
+    # Compressed and binary files have no line boundaries to split on
+    head = await reader.read(0, BOUNDARY_PROBE_SIZE)
+    found = sniff_format(head[:SNIFF_SIZE])
+    if found != 'ascii':
+        logger.info(f"{found} upload cannot be split into ranges")
+        return None
+    # Neither have CR-only files (the tokenizer detects them the same way) nor files without line breaks
+    if b'\n' not in head:
+        logger.info("No '\\n' line endings, file cannot be split into ranges")
+        return None
+    # Boundary probes and range downloads share the cap on concurrent reads
+    semaphore = asyncio.Semaphore(PARALLEL_MAX_FETCHES)
+    ranges = await _plan_ranges(reader, size, semaphore)
+    if ranges is None:
+        return None
+    logger.info(f"Auditing {size:,} bytes in {len(ranges)} ranges")
+    return await asyncio.gather(*(
+        _fetch_and_audit(reader, start, end, semaphore, rules_id, profile)
+        for start, end in ranges
+    ))
+
+
+async def parallel_audit_large_dxf(file_url: str, rules_id: Optional[str] = None) -> dict:
+    """
+    Audit a large DXF by parsing byte ranges in parallel.
+
+    Accepts a URL or an r2://<file_key> source. Falls back to the sequential
+    streaming audit when the server does not support Range requests, the
+    file fits in a single range, it is not plain ASCII DXF with '\n' line
+    endings or a split point has no entity boundary near it.
+
+    The profile's download and parse times add up over the ranges handled
+    at the same time, so they can exceed the wall time (`seconds`).
+    """
+    logger.info(f"Starting parallel audit for: {file_url[:100]}...")
+    profile = AuditProfile('parallel')
+
+    try:
+        file_key = object_key(file_url)
+        if file_key is not None:
+            parts = await _audit_ranges(_ObjectRangeReader(file_key), rules_id, profile)
+        else:
+            # The shared pool; concurrent reads are capped at PARALLEL_MAX_FETCHES
+            parts = await _audit_ranges(_HttpRangeReader(get_http_client(), file_url), rules_id, profile)
+
+        if parts is None:
+            logger.info("Ranged audit not possible, using sequential audit")
+            return await stream_audit_large_dxf(file_url, rules_id=rules_id, client=get_http_client())
+
+        with profile.stage('merge'):
+            stats, total_lines = merge_range_results(parts)
+        with profile.stage('rules'):
+            result = build_audit_report(stats, total_lines, load_ruleset(rules_id))
+        result['summary']['profile'] = profile.report()
+
+        logger.info(f"Parallel audit complete: {result['summary']['entities']:,} entities, {result['summary']['total_layers']} layers, {total_lines:,} lines")
+        return result
+
+    except Exception as e:
+        logger.error(f"Parallel audit error: {str(e)}")
+        return audit_error_result('PROCESSING_ERROR', str(e))
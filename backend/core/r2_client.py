@@ -0,0 +1,63 @@
+"""
+Shared R2 Client
+One lazily created, thread-safe boto3 S3 client (R2 is S3-compatible) with a
+tuned connection pool, shared by the storage and multipart services. Every
+call it makes is timed by operation (see core.metrics).
+"""
+
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from loguru import logger
+
+from core.metrics import instrument_r2_client
+
+# R2 Configuration
+R2_ENDPOINT = os.getenv("R2_ENDPOINT")
+R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
+R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
+R2_BUCKET = os.getenv("R2_BUCKET", "sigebim-files")
+
+# Keep-alive connections held open to R2 (shared by every thread)
+R2_MAX_POOL_CONNECTIONS = int(os.getenv("R2_MAX_POOL_CONNECTIONS", "50"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _build_client():
+    client = boto3.client(
+        's3',
+        endpoint_url=R2_ENDPOINT,
+        aws_access_key_id=R2_ACCESS_KEY_ID,
+        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+        config=Config(
+            signature_version='s3v4',
+            s3={'addressing_style': 'path'},
+            max_pool_connections=R2_MAX_POOL_CONNECTIONS,
+            retries={'max_attempts': 3, 'mode': 'standard'},
+            tcp_keepalive=True
+        ),
+        region_name='auto'  # R2 uses 'auto'
+    )
+    instrument_r2_client(client)
+    return client
+
+
+def get_r2_client():
+    """
+    Get the shared R2 client, creating it on first use.
+    boto3 clients are thread-safe, so calls can be run from worker threads.
+    """
+    global _client
+    if not all([R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY]):
+        logger.warning("R2 credentials not configured")
+        return None
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
@@ -3,38 +3,15 @@ R2 Multipart Upload Service
 Handles large file uploads (1GB+) using S3-compatible multipart upload API.
 """
 
-import os
-import boto3
-from botocore.config import Config
+import asyncio
 from botocore.exceptions import ClientError
 from loguru import logger
-from typing import Optional, List
+from typing import Optional, List, Dict
 import uuid
 
-# R2 Configuration
-R2_ENDPOINT = os.getenv("R2_ENDPOINT")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
-R2_BUCKET = os.getenv("R2_BUCKET", "sigebim-files")
-
-
-def get_r2_client():
-    """Get configured R2 client."""
-    if not all([R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY]):
-        logger.warning("R2 credentials not configured")
-        return None
-    
-    return boto3.client(
-        's3',
-        endpoint_url=R2_ENDPOINT,
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        config=Config(
-            signature_version='s3v4',
-            s3={'addressing_style': 'path'}
-        ),
-        region_name='auto'
-    )
+from core.r2_client import R2_BUCKET, get_r2_client
+from core.r2_presign import get_part_url_signer
+from core.upload_sessions import MAX_PARTS
 
 
 async def initiate_multipart_upload(filename: str, content_type: str = 'application/octet-stream') -> Optional[dict]:
@@ -49,7 +26,8 @@ async def initiate_multipart_upload(filename: str, content_type: str = 'applicat
     file_key = f"{uuid.uuid4()}/{filename}"
     
     try:
-        response = client.create_multipart_upload(
+        response = await asyncio.to_thread(
+            client.create_multipart_upload,
             Bucket=R2_BUCKET,
             Key=file_key,
             ContentType=content_type
@@ -65,32 +43,68 @@ async def initiate_multipart_upload(filename: str, content_type: str = 'applicat
         return None
 
 
-async def generate_part_upload_url(file_key: str, upload_id: str, part_number: int, expires_in: int = 3600) -> Optional[str]:
+def generate_part_upload_urls(file_key: str, upload_id: str, first_part: int, count: int, expires_in: int = 3600) -> Optional[List[dict]]:
+    """
+    Presigned URLs for a page of parts, signed locally in bulk.
+    Returns [{'part_number': int, 'upload_url': str}, ...] or None if R2 is not configured.
+    """
+    signer = get_part_url_signer()
+    if not signer:
+        return None
+
+    last_part = min(first_part + count - 1, MAX_PARTS)
+    return signer.sign_part_urls(file_key, upload_id, first_part, max(0, last_part - first_part + 1), expires_in)
+
+
+async def list_uploaded_parts(file_key: str, upload_id: str) -> Optional[List[dict]]:
     """
-    Generate presigned URL for uploading a specific part.
-    Part numbers start at 1.
+    Parts R2 has actually received for an upload, ordered by part number.
+    Returns [{'PartNumber': int, 'ETag': str, 'Size': int}, ...] or None on failure.
     """
     client = get_r2_client()
     if not client:
         return None
-    
+
+    def fetch_all():
+        parts = []
+        paginator = client.get_paginator('list_parts')
+        for page in paginator.paginate(Bucket=R2_BUCKET, Key=file_key, UploadId=upload_id):
+            for part in page.get('Parts', []):
+                parts.append({'PartNumber': part['PartNumber'], 'ETag': part['ETag'].strip('"'), 'Size': part['Size']})
+        return parts
+
     try:
-        url = client.generate_presigned_url(
-            'upload_part',
-            Params={
-                'Bucket': R2_BUCKET,
-                'Key': file_key,
-                'UploadId': upload_id,
-                'PartNumber': part_number
-            },
-            ExpiresIn=expires_in
-        )
-        return url
+        return await asyncio.to_thread(fetch_all)
     except ClientError as e:
-        logger.error(f"Failed to generate part upload URL: {e}")
+        logger.error(f"Failed to list uploaded parts: {e}")
         return None
 
 
+def find_part_mismatch(uploaded: List[dict], claimed: Optional[List[dict]], total_parts: Optional[int]) -> Optional[str]:
+    """
+    Compare the parts R2 holds with what the client claims and expects.
+    Without a known total (no session, e.g. after a restart), the stored
+    parts must run 1..N without gaps, or R2 would assemble a truncated file.
+    Returns a description of the first problem, or None when the upload is complete.
+    """
+    by_number: Dict[int, str] = {p['PartNumber']: p['ETag'] for p in uploaded}
+    if not by_number:
+        return "No parts have been uploaded"
+
+    for part in claimed or []:
+        etag = by_number.get(part.get('PartNumber'))
+        if etag is None:
+            return f"Part {part.get('PartNumber')} was not received by storage"
+        if str(part.get('ETag', '')).strip('"') != etag:
+            return f"Part {part['PartNumber']} ETag does not match the stored part"
+
+    expected = total_parts or max(by_number)
+    missing = [n for n in range(1, expected + 1) if n not in by_number]
+    if missing:
+        return f"{len(missing)} part(s) missing, first missing part: {missing[0]}"
+    return None
+
+
 async def complete_multipart_upload(file_key: str, upload_id: str, parts: List[dict]) -> bool:
     """
     Complete the multipart upload after all parts are uploaded.
@@ -103,7 +117,8 @@ async def complete_multipart_upload(file_key: str, upload_id: str, parts: List[d
         return False
     
     try:
-        response = client.complete_multipart_upload(
+        await asyncio.to_thread(
+            client.complete_multipart_upload,
             Bucket=R2_BUCKET,
             Key=file_key,
             UploadId=upload_id,
@@ -125,7 +140,8 @@ async def abort_multipart_upload(file_key: str, upload_id: str) -> bool:
         return False
     
     try:
-        client.abort_multipart_upload(
+        await asyncio.to_thread(
+            client.abort_multipart_upload,
             Bucket=R2_BUCKET,
             Key=file_key,
             UploadId=upload_id
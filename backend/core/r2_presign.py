@@ -0,0 +1,101 @@
+"""
+Local SigV4 Presigner
+Signs multipart part-upload URLs without going through boto3 for every part.
+The signing key is derived once per day and reused, so a page of part URLs
+costs one HMAC per URL.
+"""
+
+import hashlib
+import hmac
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from core.r2_client import R2_ACCESS_KEY_ID, R2_BUCKET, R2_ENDPOINT, R2_SECRET_ACCESS_KEY
+
+R2_REGION = 'auto'
+SERVICE = 's3'
+ALGORITHM = 'AWS4-HMAC-SHA256'
+
+# Maximum part URLs returned per page
+PART_URL_PAGE_SIZE = 100
+
+
+def _uri_encode(value: str, safe: str = '') -> str:
+    return quote(value, safe='-_.~' + safe)
+
+
+class PartUrlSigner:
+    """Query-string SigV4 presigner for UploadPart requests (path-style URLs)."""
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, bucket: str, region: str = R2_REGION):
+        parts = urlsplit(endpoint)
+        self.scheme = parts.scheme
+        self.host = parts.netloc
+        self.base_path = parts.path.rstrip('/')
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.bucket = bucket
+        self.region = region
+        self._key_cache: Tuple[str, bytes] = ('', b'')
+        self._lock = threading.Lock()
+
+    def _signing_key(self, date_stamp: str) -> bytes:
+        """Derive (or reuse) the signing key for a given day."""
+        cached_date, cached_key = self._key_cache
+        if cached_date == date_stamp:
+            return cached_key
+        with self._lock:
+            key = ('AWS4' + self.secret_key).encode('utf-8')
+            for part in (date_stamp, self.region, SERVICE, 'aws4_request'):
+                key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+            self._key_cache = (date_stamp, key)
+        return key
+
+    def sign_part_urls(self, file_key: str, upload_id: str, first_part: int, count: int, expires_in: int = 3600, now: Optional[datetime] = None) -> List[Dict]:
+        """Presigned PUT URLs for parts first_part .. first_part + count - 1."""
+        now = now or datetime.now(timezone.utc)
+        amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+        date_stamp = amz_date[:8]
+        scope = f"{date_stamp}/{self.region}/{SERVICE}/aws4_request"
+        signing_key = self._signing_key(date_stamp)
+
+        path = f"{self.base_path}/{self.bucket}/{_uri_encode(file_key, safe='/')}"
+        # Everything but partNumber is shared by the whole page; keys sort
+        # as X-Amz-* < partNumber < uploadId, so the query splits around it.
+        query_prefix = (
+            f"X-Amz-Algorithm={ALGORITHM}"
+            f"&X-Amz-Credential={_uri_encode(f'{self.access_key}/{scope}')}"
+            f"&X-Amz-Date={amz_date}"
+            f"&X-Amz-Expires={expires_in}"
+            f"&X-Amz-SignedHeaders=host"
+        )
+        query_suffix = f"uploadId={_uri_encode(upload_id)}"
+        request_tail = f"\nhost:{self.host}\n\nhost\nUNSIGNED-PAYLOAD"
+        string_to_sign_prefix = f"{ALGORITHM}\n{amz_date}\n{scope}\n"
+
+        urls = []
+        for part_number in range(first_part, first_part + count):
+            query = f"{query_prefix}&partNumber={part_number}&{query_suffix}"
+            canonical_request = f"PUT\n{path}\n{query}{request_tail}"
+            string_to_sign = string_to_sign_prefix + hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+            signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+            urls.append({
+                'part_number': part_number,
+                'upload_url': f"{self.scheme}://{self.host}{path}?{query}&X-Amz-Signature={signature}"
+            })
+        return urls
+
+
+_signer: Optional[PartUrlSigner] = None
+
+
+def get_part_url_signer() -> Optional[PartUrlSigner]:
+    """Shared signer, or None when R2 is not configured."""
+    global _signer
+    if not all([R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY]):
+        return None
+    if _signer is None:
+        _signer = PartUrlSigner(R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET)
+    return _signer
@@ -0,0 +1,98 @@
+"""
+R2 Object Reader
+Reads audit input straight from the bucket with the shared S3 client, instead of
+downloading it again through a presigned URL. Objects are addressed as
+r2://<file_key> so they travel through the same audit paths as URLs.
+Small derived objects (entity indexes) are read and written whole.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Tuple
+
+from core.r2_client import R2_BUCKET, get_r2_client
+
+OBJECT_URL_PREFIX = 'r2://'
+
+
+def object_url(file_key: str) -> str:
+    """Audit source string for an object in the bucket."""
+    return f"{OBJECT_URL_PREFIX}{file_key}"
+
+
+def object_key(file_url: str) -> Optional[str]:
+    """The file_key behind an r2:// source, or None for plain URLs."""
+    if file_url.startswith(OBJECT_URL_PREFIX):
+        return file_url[len(OBJECT_URL_PREFIX):]
+    return None
+
+
+def _client():
+    client = get_r2_client()
+    if client is None:
+        raise RuntimeError("R2 storage is not configured")
+    return client
+
+
+async def head_object(file_key: str) -> Tuple[int, str]:
+    """Size and ETag of an object."""
+    response = await asyncio.to_thread(_client().head_object, Bucket=R2_BUCKET, Key=file_key)
+    return response['ContentLength'], response['ETag'].strip('"')
+
+
+async def read_object_range(file_key: str, start: int, end: int) -> bytes:
+    """Bytes start .. end - 1 of an object (one ranged GetObject)."""
+    def read() -> bytes:
+        response = _client().get_object(Bucket=R2_BUCKET, Key=file_key, Range=f'bytes={start}-{end - 1}')
+        with response['Body'] as body:
+            return body.read()
+    return await asyncio.to_thread(read)
+
+
+async def read_object(file_key: str) -> bytes:
+    """Whole object in memory (small objects only)."""
+    def read() -> bytes:
+        response = _client().get_object(Bucket=R2_BUCKET, Key=file_key)
+        with response['Body'] as body:
+            return body.read()
+    return await asyncio.to_thread(read)
+
+
+async def write_object(file_key: str, data: bytes, content_type: str) -> None:
+    """Store bytes as an object, replacing any previous version."""
+    await asyncio.to_thread(_client().put_object, Bucket=R2_BUCKET, Key=file_key, Body=data, ContentType=content_type)
+
+
+class ObjectStream:
+    """GetObject body read chunk by chunk in worker threads."""
+
+    def __init__(self, body, size: int):
+        self._body = body
+        self.size = size
+
+    async def iter_chunks(self, chunk_size: int) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await asyncio.to_thread(self._body.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+@asynccontextmanager
+async def open_object_stream(file_key: str, start: int = 0) -> AsyncIterator[ObjectStream]:
+    """
+    Stream an object from `start` to the end. Leaving the block early closes
+    the body, so the rest of the object is never transferred.
+    """
+    extra = {'Range': f'bytes={start}-'} if start else {}
+    response = await asyncio.to_thread(_client().get_object, Bucket=R2_BUCKET, Key=file_key, **extra)
+    body = response['Body']
+    try:
+        yield ObjectStream(body, response['ContentLength'])
+    finally:
+        body.close()
+
+
+async def download_object(file_key: str, path: str) -> None:
+    """Copy an object to a local file (managed transfer on the pooled client)."""
+    await asyncio.to_thread(_client().download_file, R2_BUCKET, file_key, path)
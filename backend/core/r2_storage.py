@@ -3,38 +3,13 @@ Cloudflare R2 Storage Service
 S3-compatible object storage with zero egress fees.
 """
 
-import os
-import boto3
-from botocore.config import Config
+import asyncio
 from botocore.exceptions import ClientError
 from loguru import logger
 from typing import Optional, BinaryIO
 import uuid
 
-# R2 Configuration
-R2_ENDPOINT = os.getenv("R2_ENDPOINT")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
-R2_BUCKET = os.getenv("R2_BUCKET", "sigebim-files")
-
-# Initialize S3 client (R2 is S3-compatible)
-def get_r2_client():
-    """Get configured R2 client."""
-    if not all([R2_ENDPOINT, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY]):
-        logger.warning("R2 credentials not configured")
-        return None
-    
-    return boto3.client(
-        's3',
-        endpoint_url=R2_ENDPOINT,
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        config=Config(
-            signature_version='s3v4',
-            s3={'addressing_style': 'path'}
-        ),
-        region_name='auto'  # R2 uses 'auto'
-    )
+from core.r2_client import R2_BUCKET, get_r2_client
 
 
 async def generate_upload_url(filename: str, content_type: str = 'application/octet-stream', expires_in: int = 3600) -> Optional[dict]:
@@ -104,7 +79,7 @@ async def delete_file(file_key: str) -> bool:
         return False
     
     try:
-        client.delete_object(Bucket=R2_BUCKET, Key=file_key)
+        await asyncio.to_thread(client.delete_object, Bucket=R2_BUCKET, Key=file_key)
         logger.info(f"Deleted file: {file_key}")
         return True
     except ClientError as e:
@@ -126,7 +101,8 @@ async def upload_file_from_bytes(file_bytes: bytes, filename: str, content_type:
     file_key = f"{uuid.uuid4()}/{filename}"
     
     try:
-        client.put_object(
+        await asyncio.to_thread(
+            client.put_object,
             Bucket=R2_BUCKET,
             Key=file_key,
             Body=file_bytes,
@@ -0,0 +1,584 @@
+"""
+Revision Audit
+Incremental audit of a new revision of a drawing against the stored fingerprint
+of the previous revision, with a delta report (sections, entities, issues).
+
+The ENTITIES section is cut at byte level into content-defined blocks: a block
+starts at every entity whose handle ends in 000, so an edit only changes the
+blocks around it and the cuts elsewhere stay where they were. Each block is
+hashed; blocks already seen in the previous revision reuse their stored
+partial statistics, and only changed blocks are tokenized and run through the
+per-entity rules. Drawing-level rules then run once on the merged statistics,
+as in a full audit, so the report matches a full audit of the same file.
+
+The fingerprint (<file_key>.fingerprint.npz, next to the drawing in R2) holds
+per-section hashes, per-block statistics and per-handle entity hashes. The
+coordinate sample of each block is trimmed to the values that can still enter
+the drawing's sample; when a revision removes so many of them that the merged
+sample would be inexact, the revision is audited in full instead.
+"""
+
+import hashlib
+import io
+import json
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from botocore.exceptions import ClientError
+from loguru import logger
+
+from core.audit_rules import CompiledRuleSet, load_ruleset
+from core.coordinate_stats import AxisStats
+from core.dxf_formats import StreamDecoder
+from core.dxf_tokenizer import BINARY_SENTINEL
+from core.memory_stats import MemoryMonitor
+from core.metrics import AuditProfile
+from core.r2_reader import object_key, open_object_stream, read_object, write_object
+from core.streaming_audit import (
+    AUDIT_CHUNK_SIZE, AuditCancelled, AuditStats, DxfStreamAuditor, ProgressCallback,
+    audit_error_result, build_audit_report
+)
+
+# Fingerprint format stored in the .npz (bumped when the layout changes)
+FINGERPRINT_FORMAT = 2
+
+# Suffix of the fingerprint object stored next to the drawing
+FINGERPRINT_SUFFIX = '.fingerprint.npz'
+
+# Blocks without a handle cut grow at most to about this size
+MAX_BLOCK_BYTES = 2 * 1024 * 1024
+
+# Stored block samples keep keys below MARGIN times the drawing's sample cutoff
+SAMPLE_MARGIN = 2
+
+# Handles listed per category in the delta report
+DELTA_LIST_LIMIT = 100
+
+KEY_MAX = 2 ** 64 - 1
+
+# Byte-level markers; each starts at the newline ending the previous line
+SECTION_START = re.compile(rb'\n {0,5}0\r?\nSECTION\r?\n {0,5}2\r?\n([A-Za-z_]{1,32})\r?\n')
+ENTITIES_START = re.compile(rb'\n {0,5}0\r?\nSECTION\r?\n {0,5}2\r?\nENTITIES\r?\n')
+ENTITIES_END = re.compile(rb'\n {0,5}0\r?\nENDSEC\r?\n')
+# Entity type names always contain a letter, group code lines never do
+ENTITY_START = re.compile(rb'\n {0,5}0\r?\n[0-9]{0,3}[A-Z_][A-Z0-9_]{0,31}\r?\n(?: {0,5}5\r?\n([0-9A-Fa-f]{1,16})\r?\n)?')
+BLOCK_START = re.compile(rb'\n {0,5}0\r?\n[0-9]{0,3}[A-Z_][A-Z0-9_]{0,31}\r?\n {0,5}5\r?\n[0-9A-Fa-f]{0,13}000\r?\n')
+
+# Bytes kept between chunks so a marker split across them is still found
+MARKER_OVERLAP = 128
+
+
+def fingerprint_key(file_key: str) -> str:
+    """R2 key of the fingerprint stored next to a drawing."""
+    return f"{file_key}{FINGERPRINT_SUFFIX}"
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _entity_hashes(block: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Handles and 32-bit content hashes of the entities in a block that have a handle."""
+    data = b'\n' + block
+    starts = [(m.start(), m.group(1)) for m in ENTITY_START.finditer(data)]
+    handles, hashes = [], []
+    for i, (start, handle) in enumerate(starts):
+        if handle is None:
+            continue
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(data)
+        handles.append(int(handle, 16))
+        hashes.append(int.from_bytes(hashlib.blake2b(data[start:end], digest_size=4).digest(), 'little'))
+    return np.array(handles, dtype=np.uint64), np.array(hashes, dtype=np.uint32)
+
+
+class _SectionHasher:
+    """Content hash of every section before ENTITIES, fed in arbitrary pieces."""
+
+    def __init__(self):
+        self.digests: Dict[str, str] = {}
+        self._name: Optional[str] = None
+        self._hash = None
+        self._tail = b'\n'
+
+    def update(self, data: bytes, final: bool = False) -> None:
+        buffer = self._tail + data
+        position = 0
+        for match in SECTION_START.finditer(buffer):
+            self._add(buffer[position:match.start()])
+            self._finish()
+            self._name = match.group(1).decode('ascii')
+            self._hash = hashlib.blake2b(digest_size=16)
+            self._add(buffer[match.start():match.end()])
+            position = match.end()
+        keep = len(buffer) if final else max(position, len(buffer) - MARKER_OVERLAP)
+        self._add(buffer[position:keep])
+        self._tail = buffer[keep:]
+        if final:
+            self._finish()
+
+    def _add(self, data: bytes) -> None:
+        if self._hash is not None and data:
+            self._hash.update(data)
+
+    def _finish(self) -> None:
+        if self._hash is not None:
+            self.digests[self._name] = self._hash.hexdigest()
+        self._name = None
+        self._hash = None
+
+
+class _Block:
+    """One block of the ENTITIES section and what it contributes to the audit."""
+
+    __slots__ = ('digest', 'lines', 'stats', 'cutoffs', 'handles', 'hashes')
+
+    def __init__(self, digest: bytes, lines: int, stats: AuditStats, cutoffs: List[int], handles: np.ndarray, hashes: np.ndarray):
+        self.digest = digest
+        self.lines = lines
+        self.stats = stats
+        self.cutoffs = cutoffs  # Per axis: sample keys at or above this were dropped
+        self.handles = handles
+        self.hashes = hashes
+
+    def trim(self, max_keys: List[int]) -> None:
+        coords = self.stats.coords
+        for i, axis in enumerate((coords.x, coords.y, coords.z)):
+            if max_keys[i] < self.cutoffs[i] and axis.trim(max_keys[i]):
+                self.cutoffs[i] = max_keys[i]
+
+
+def _encode_stats(stats: AuditStats) -> dict:
+    # latin-1 maps every byte to one character, so names round-trip exactly
+    return {
+        'entity_types': {name.decode('latin-1'): n for name, n in stats.entity_types.items()},
+        'layers': {name.decode('latin-1'): n for name, n in stats.layers.items()},
+        'explicit_colors': [[layer.decode('latin-1'), color, n] for (layer, color), n in stats.explicit_colors.items()],
+        'rule_hits': stats.rule_hits,
+        'overflow': stats.overflow,
+    }
+
+
+def _decode_stats(record: dict, axes: List[AxisStats]) -> AuditStats:
+    stats = AuditStats()
+    stats.entity_types = {name.encode('latin-1'): n for name, n in record['entity_types'].items()}
+    stats.layers = {name.encode('latin-1'): n for name, n in record['layers'].items()}
+    stats.explicit_colors = {(layer.encode('latin-1'), color): n for layer, color, n in record['explicit_colors']}
+    stats.rule_hits = dict(record['rule_hits'])
+    stats.overflow = dict(record.get('overflow', {}))
+    stats.coords.x, stats.coords.y, stats.coords.z = axes
+    return stats
+
+
+class RevisionFingerprint:
+    """Stored description of one revision, used to audit the next one incrementally."""
+
+    def __init__(self, ruleset: str, sections: Dict[str, str], issues: List[dict], blocks: List[_Block]):
+        self.ruleset = ruleset  # Fingerprint of the rule set the block statistics were collected with
+        self.sections = sections
+        self.issues = issues
+        self.blocks = blocks
+
+    def handles(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Handles and content hashes of every entity with a handle."""
+        if not self.blocks:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint32)
+        return np.concatenate([b.handles for b in self.blocks]), np.concatenate([b.hashes for b in self.blocks])
+
+    def to_bytes(self) -> bytes:
+        meta = {
+            'format': FINGERPRINT_FORMAT,
+            'ruleset': self.ruleset,
+            'sections': self.sections,
+            'issues': self.issues,
+            'blocks': [dict(_encode_stats(b.stats), digest=b.digest.hex(), lines=b.lines) for b in self.blocks],
+        }
+        arrays = {'meta': np.array(json.dumps(meta))}
+        summary = np.zeros((len(self.blocks), 3, 3))
+        for axis_index, name in enumerate('xyz'):
+            # Sample keys are hashes of the values, so only the values and their counts are stored
+            values, counts, offsets = [], [], [0]
+            for block_index, block in enumerate(self.blocks):
+                axis = getattr(block.stats.coords, name)
+                summary[block_index, axis_index] = (axis.count, axis.min, axis.max)
+                _, block_values, block_counts = axis.sample()
+                values.append(block_values)
+                counts.append(block_counts)
+                offsets.append(offsets[-1] + len(block_values))
+            arrays[f'values_{name}'] = np.concatenate(values) if values else np.empty(0)
+            arrays[f'counts_{name}'] = np.concatenate(counts) if counts else np.empty(0, dtype=np.int64)
+            arrays[f'offsets_{name}'] = np.array(offsets, dtype=np.int64)
+        arrays['coords'] = summary
+        arrays['cutoffs'] = np.array([b.cutoffs for b in self.blocks], dtype=np.uint64).reshape(-1, 3)
+        handles, hashes = self.handles()
+        arrays['handles'] = handles
+        arrays['hashes'] = hashes
+        arrays['handle_offsets'] = np.cumsum([0] + [len(b.handles) for b in self.blocks]).astype(np.int64)
+
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'RevisionFingerprint':
+        with np.load(io.BytesIO(data), allow_pickle=False) as stored:
+            meta = json.loads(str(stored['meta']))
+            if meta['format'] != FINGERPRINT_FORMAT:
+                raise ValueError(f"Unsupported fingerprint format {meta['format']}")
+            arrays = {name: stored[name] for name in stored.files if name != 'meta'}
+
+        blocks = []
+        handle_offsets = arrays['handle_offsets']
+        for i, record in enumerate(meta['blocks']):
+            axes = []
+            for axis_index, name in enumerate('xyz'):
+                start, end = arrays[f'offsets_{name}'][i:i + 2]
+                count, low, high = arrays['coords'][i, axis_index]
+                axes.append(AxisStats.restore(
+                    int(count), float(low), float(high), arrays[f'values_{name}'][start:end], arrays[f'counts_{name}'][start:end]
+                ))
+            start, end = handle_offsets[i:i + 2]
+            blocks.append(_Block(
+                bytes.fromhex(record['digest']), record['lines'], _decode_stats(record, axes),
+                [int(c) for c in arrays['cutoffs'][i]],
+                arrays['handles'][start:end], arrays['hashes'][start:end]
+            ))
+        return cls(meta['ruleset'], meta['sections'], meta['issues'], blocks)
+
+
+class RevisionAuditor:
+    """
+    Incremental auditor for one revision.
+
+    Bytes up to the ENTITIES section (HEADER, TABLES, BLOCKS) are always
+    parsed, they carry the definitions and are small next to ENTITIES. The
+    ENTITIES section is cut into blocks; blocks found in `previous` are
+    reused, the others are parsed on their own as in a parallel audit.
+    """
+
+    def __init__(self, rules: CompiledRuleSet, previous: Optional[RevisionFingerprint] = None):
+        self.rules = rules
+        self.done = False
+        self.blocks: List[_Block] = []
+        self.reused_blocks = 0
+        self.parsed_bytes = 0
+        self.lines = 0
+        self._known = {}
+        if previous is not None and previous.ruleset == rules.fingerprint:
+            self._known = {block.digest: block for block in previous.blocks}
+        self._head = DxfStreamAuditor(rules=rules)
+        self._sections = _SectionHasher()
+        self._entities = AuditStats()
+        self._in_entities = False
+        # A leading newline lets the markers match at the very start of the file
+        self._buffer = b'\n'
+        self._lead = 1
+        self._start = 0
+        self._scan = 0
+
+    def feed(self, chunk: bytes) -> None:
+        if self.done:
+            return
+        self._buffer = self._buffer[self._start:] + chunk
+        self._scan = max(0, self._scan - self._start)
+        self._start = 0
+        if not self._in_entities:
+            self._split_head()
+        if self._in_entities:
+            self._split_entities()
+
+    def close(self) -> None:
+        """End of input without an ENTITIES section end: nothing more to cut."""
+        if self.done:
+            return
+        rest = self._buffer[self._start + self._lead:]
+        if self._in_entities:
+            if rest:
+                self._add_block(rest)
+        else:
+            self._head_piece(rest, final=True)
+        self._head.close()
+        self.done = True
+
+    @property
+    def total_lines(self) -> int:
+        return self.lines
+
+    def _head_piece(self, data: bytes, final: bool = False) -> None:
+        self._sections.update(data, final)
+        self._head.feed(data)
+        self.lines += data.count(b'\n')
+
+    def _split_head(self) -> None:
+        buffer = self._buffer
+        begin = self._start + self._lead
+        match = ENTITIES_START.search(buffer, max(self._start - 1, 0))
+        if match is None:
+            keep = max(begin, len(buffer) - MARKER_OVERLAP)
+            if keep > begin:
+                self._head_piece(buffer[begin:keep])
+                self._start = keep
+                self._lead = 0
+            return
+        # The section hash of ENTITIES comes from its blocks
+        self._sections.update(buffer[begin:match.start() + 1], final=True)
+        head = buffer[begin:match.end()]
+        self._lead = 0
+        self._head.feed(head)
+        self.lines += head.count(b'\n')
+        self._start = self._scan = match.end()
+        self._in_entities = True
+
+    def _split_entities(self) -> None:
+        buffer = self._buffer
+        end = ENTITIES_END.search(buffer, max(self._scan - 1, 0))
+        limit = end.start() + 1 if end else len(buffer)
+        while True:
+            cut = None
+            boundary = BLOCK_START.search(buffer, max(self._start, self._scan), limit)
+            if boundary is not None:
+                cut = boundary.start() + 1
+            elif limit - self._start > MAX_BLOCK_BYTES:
+                entity = ENTITY_START.search(buffer, self._start + MAX_BLOCK_BYTES, limit)
+                if entity is not None:
+                    cut = entity.start() + 1
+            if cut is None:
+                break
+            if cut > self._start:
+                self._add_block(buffer[self._start:cut])
+            self._start = cut
+
+        if end is None:
+            self._scan = max(self._start, len(buffer) - MARKER_OVERLAP)
+            return
+        if limit > self._start:
+            self._add_block(buffer[self._start:limit])
+        # The ENDSEC closes the section in the head auditor, which is then done
+        self._head.feed(buffer[limit:end.end()])
+        self.lines += 2
+        self._start = end.end()
+        self.done = True
+
+    def _add_block(self, data: bytes) -> None:
+        digest = _digest(data)
+        known = self._known.get(digest)
+        if known is not None:
+            self.reused_blocks += 1
+            block = _Block(digest, known.lines, known.stats, list(known.cutoffs), known.handles, known.hashes)
+            self._entities.merge(block.stats)
+        else:
+            auditor = DxfStreamAuditor(mid_entities=True, rules=self.rules)
+            auditor.feed(data)
+            auditor.close()
+            handles, hashes = _entity_hashes(data)
+            block = _Block(digest, data.count(b'\n'), auditor.stats, [KEY_MAX] * 3, handles, hashes)
+            self.parsed_bytes += len(data)
+            self._entities.merge(block.stats)
+            # Once merged, the block only needs the values that may enter a later sample
+            block.trim(self._sample_limits())
+        self.lines += block.lines
+        self.blocks.append(block)
+
+    def _sample_limits(self) -> List[int]:
+        """Per axis: keys at or above this can never enter the drawing's sample."""
+        coords = self._entities.coords
+        limits = []
+        for axis in (coords.x, coords.y, coords.z):
+            keys, _, _ = axis.sample()
+            limits.append(min(KEY_MAX, int(keys[-1]) * SAMPLE_MARGIN) if axis.sample_full else KEY_MAX)
+        return limits
+
+    def sample_exact(self) -> bool:
+        """
+        Whether the merged coordinate sample equals that of a full audit: every
+        reused block must still hold all its values below the final cutoff.
+        """
+        coords = self._entities.coords
+        for i, axis in enumerate((coords.x, coords.y, coords.z)):
+            dropped = min((block.cutoffs[i] for block in self.blocks), default=KEY_MAX)
+            if dropped == KEY_MAX:
+                continue
+            keys, _, _ = axis.sample()
+            if not axis.sample_full or int(keys[-1]) >= dropped:
+                return False
+        return True
+
+    def statistics(self) -> AuditStats:
+        """Statistics of the whole drawing: definitions from the head, then every block."""
+        stats = self._head.stats
+        stats.merge(self._entities)
+        return stats
+
+    def fingerprint(self, issues: List[dict]) -> RevisionFingerprint:
+        limits = self._sample_limits()
+        for block in self.blocks:
+            block.trim(limits)
+        sections = dict(self._sections.digests)
+        entities = hashlib.blake2b(b''.join(block.digest for block in self.blocks), digest_size=16)
+        sections['ENTITIES'] = entities.hexdigest()
+        return RevisionFingerprint(self.rules.fingerprint, sections, issues, self.blocks)
+
+
+def _issue_key(issue: dict) -> Tuple[str, Optional[str]]:
+    return issue.get('rule') or issue['code'], issue.get('layer')
+
+
+def build_delta(previous: Optional[RevisionFingerprint], current: RevisionFingerprint) -> dict:
+    """Sections, entities and issues that changed since the previous revision."""
+    if previous is None:
+        return {'previous_found': False}
+
+    sections = sorted(set(previous.sections) | set(current.sections))
+    changed_sections = [name for name in sections if previous.sections.get(name) != current.sections.get(name)]
+
+    old_handles, old_hashes = previous.handles()
+    new_handles, new_hashes = current.handles()
+    _, old_at, new_at = np.intersect1d(old_handles, new_handles, assume_unique=False, return_indices=True)
+    modified = new_handles[new_at][old_hashes[old_at] != new_hashes[new_at]]
+    added = np.setdiff1d(new_handles, old_handles)
+    removed = np.setdiff1d(old_handles, new_handles)
+
+    old_issues = {_issue_key(i): i for i in previous.issues}
+    new_issues = {_issue_key(i): i for i in current.issues}
+
+    def hex_list(handles: np.ndarray) -> List[str]:
+        return [format(int(h), 'X') for h in handles[:DELTA_LIST_LIMIT]]
+
+    return {
+        'previous_found': True,
+        'sections': {
+            'changed': changed_sections,
+            'unchanged': [name for name in sections if name not in changed_sections]
+        },
+        'entities': {
+            'added': int(len(added)),
+            'removed': int(len(removed)),
+            'modified': int(len(modified)),
+            'unchanged': int(len(new_at) - len(modified)),
+            'added_handles': hex_list(added),
+            'removed_handles': hex_list(removed),
+            'modified_handles': hex_list(modified)
+        },
+        'issues': {
+            'new': [issue for key, issue in new_issues.items() if key not in old_issues],
+            'resolved': [issue for key, issue in old_issues.items() if key not in new_issues],
+            'unchanged': [issue for key, issue in new_issues.items() if key in old_issues]
+        }
+    }
+
+
+async def load_fingerprint(file_key: str) -> Optional[RevisionFingerprint]:
+    """The stored fingerprint of a drawing, None if there is none."""
+    try:
+        data = await read_object(fingerprint_key(file_key))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+    try:
+        return RevisionFingerprint.from_bytes(data)
+    except ValueError as e:
+        # Older format: the revision is parsed in full and stores a new one
+        logger.warning(f"Ignoring stored fingerprint of {file_key}: {e}")
+        return None
+
+
+async def _run(
+    file_key: str,
+    rules: CompiledRuleSet,
+    previous: Optional[RevisionFingerprint],
+    on_progress: Optional[ProgressCallback],
+    memory: MemoryMonitor,
+    profile: AuditProfile
+) -> RevisionAuditor:
+    auditor = RevisionAuditor(rules, previous)
+    decoder = StreamDecoder()
+    bytes_read = 0
+    async with open_object_stream(file_key) as stream:
+        waiting = time.perf_counter()
+        async for chunk in stream.iter_chunks(AUDIT_CHUNK_SIZE):
+            received = time.perf_counter()
+            for block in decoder.feed(chunk):
+                # Blocks are cut on ASCII group-code lines
+                if auditor.lines == 0 and block.startswith(BINARY_SENTINEL):
+                    raise ValueError("Revision audits need an ASCII DXF")
+                auditor.feed(block)
+                if auditor.done:
+                    break
+            bytes_read += len(chunk)
+            memory.sample()
+            profile.bytes += len(chunk)
+            profile.add('download', received - waiting)
+            waiting = time.perf_counter()
+            profile.add('parse', waiting - received)
+            if on_progress is not None:
+                on_progress(bytes_read, stream.size, auditor.total_lines)
+            if auditor.done:
+                break
+        else:
+            for block in decoder.close():
+                auditor.feed(block)
+            auditor.close()
+    return auditor
+
+
+async def revision_audit_large_dxf(
+    file_url: str,
+    previous_file_key: Optional[str] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    rules_id: Optional[str] = None
+) -> dict:
+    """
+    Audit an R2 drawing (r2://<file_key>) incrementally against the stored
+    fingerprint of `previous_file_key`, and store its own fingerprint for
+    the next revision. The result is the streaming audit report plus a
+    `revision` delta. Without a previous fingerprint every block is parsed.
+    """
+    file_key = object_key(file_url)
+    if file_key is None:
+        raise ValueError("Revision audits need an R2 source")
+    rules = load_ruleset(rules_id)
+    memory = MemoryMonitor()
+    profile = AuditProfile('revision')
+    logger.info(f"Revision audit for {file_key} (previous: {previous_file_key})")
+
+    try:
+        with profile.stage('fingerprint'):
+            previous = await load_fingerprint(previous_file_key) if previous_file_key else None
+        auditor = await _run(file_key, rules, previous, on_progress, memory, profile)
+        if not auditor.sample_exact():
+            logger.info("Reused coordinate samples are too sparse, auditing the revision in full")
+            auditor = await _run(file_key, rules, None, on_progress, memory, profile)
+
+        with profile.stage('rules'):
+            result = build_audit_report(auditor.statistics(), auditor.total_lines, rules)
+        issues = [issue for issue in result['details'] if issue['severity'] != 'pass']
+        with profile.stage('fingerprint'):
+            fingerprint = auditor.fingerprint(issues)
+            delta = build_delta(previous, fingerprint)
+        delta.update({
+            'previous_file_key': previous_file_key,
+            'blocks': len(auditor.blocks),
+            'reused_blocks': auditor.reused_blocks,
+            'parsed_bytes': auditor.parsed_bytes
+        })
+        result['revision'] = delta
+        result['summary']['memory'] = memory.finish()
+        with profile.stage('fingerprint'):
+            await write_object(fingerprint_key(file_key), fingerprint.to_bytes(), 'application/octet-stream')
+        result['summary']['profile'] = profile.report()
+
+        logger.info(f"Revision audit complete: {auditor.reused_blocks}/{len(auditor.blocks)} blocks reused, {auditor.parsed_bytes:,} bytes parsed")
+        return result
+
+    except AuditCancelled:
+        logger.info(f"Revision audit cancelled for {file_key}")
+        raise
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code', 'Unknown')
+        logger.error(f"Revision audit could not read object: {code}")
+        return audit_error_result('DOWNLOAD_ERROR', f'Failed to read object: {code}', code)
+    except Exception as e:
+        logger.error(f"Revision audit error: {str(e)}")
+        return audit_error_result('PROCESSING_ERROR', str(e))
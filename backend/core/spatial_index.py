@@ -0,0 +1,251 @@
+"""
+Spatial Index
+Uniform grid over entity extents, bulk-built with NumPy, for pairwise geometric
+checks (overlapping elements, minimum clearance) on an entity index.
+
+Every box is bucketed into the grid cells it covers and candidate pairs are
+only generated inside a cell, so the work grows with the number of nearby
+pairs instead of n². A pair sharing several cells is reported once, by the
+cell holding the lower-left corner of the two boxes' overlap. Boxes that span
+too many cells (site outlines, grid lines) or lie far outside the bulk of the
+drawing (stray entities) are tested against the rest directly instead of
+being bucketed.
+
+The grid is sized from the median box and the percentile extent of the
+boxes, never from the full extent, so one entity a million units away
+cannot turn the whole drawing into a single cell.
+"""
+
+import itertools
+import math
+from typing import Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Boxes covering more cells than this are tested on their own
+MAX_CELLS_PER_BOX = 64
+
+# Candidate pairs generated per block, to bound peak memory (a dense cell is split over several blocks)
+PAIR_BLOCK_SIZE = 4_000_000
+
+# Percentile of the box corners taken as the edge of the drawing on each side
+EXTENT_PERCENTILE = 1.0
+
+# Columns and rows of the grid at most; the cell grows instead (keeps cell ids well inside int64)
+MAX_GRID_SIDE = 1 << 20
+
+
+def _gaps(bounds: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Euclidean distance between box pairs, 0 where they touch or overlap."""
+    a, b = bounds[left], bounds[right]
+    dx = np.maximum(0.0, np.maximum(a[:, 0], b[:, 0]) - np.minimum(a[:, 2], b[:, 2]))
+    dy = np.maximum(0.0, np.maximum(a[:, 1], b[:, 1]) - np.minimum(a[:, 3], b[:, 3]))
+    return np.hypot(dx, dy)
+
+
+def _overlap_areas(bounds: np.ndarray, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    a, b = bounds[left], bounds[right]
+    w = np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0])
+    h = np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1])
+    return np.maximum(w, 0.0) * np.maximum(h, 0.0)
+
+
+def _pairs_within_groups(starts: np.ndarray, sizes: np.ndarray) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    All (p, q) positions with p < q inside each group of a sorted array, in
+    blocks of about PAIR_BLOCK_SIZE pairs. Blocks may end inside a group.
+    """
+    firsts = np.cumsum(sizes) - sizes
+    positions = np.repeat(starts - firsts, sizes) + np.arange(int(sizes.sum()), dtype=np.int64)
+    group_end = np.repeat(starts + sizes, sizes)
+    partners = group_end - positions - 1
+    block_of = (np.cumsum(partners) - partners) // PAIR_BLOCK_SIZE
+    cuts = np.flatnonzero(np.diff(block_of)) + 1
+    for block_positions, block_partners in zip(np.split(positions, cuts), np.split(partners, cuts)):
+        total = int(block_partners.sum())
+        left = np.repeat(block_positions, block_partners)
+        # Offset of each partner within its run: 0, 1, ... partners - 1
+        run_start = np.repeat(np.cumsum(block_partners) - block_partners, block_partners)
+        right = left + 1 + (np.arange(total, dtype=np.int64) - run_start)
+        yield left, right
+
+
+class SpatialGrid:
+    """
+    Uniform grid over boxes (min_x, min_y, max_x, max_y).
+
+    Rows with NaN bounds (entities without coordinates) are left out. Row
+    numbers returned by the queries refer to the `bounds` array given here.
+    """
+
+    def __init__(self, bounds: np.ndarray, cell_size: Optional[float] = None, padding: float = 0.0):
+        self.bounds = bounds
+        self.padding = padding
+        valid = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+        padded = bounds[valid] + np.array([-padding, -padding, padding, padding])
+        self.rows = valid
+        self._padded = padded
+
+        low, high = self._percentile_extent(padded)
+        size = cell_size or self._default_cell_size(padded, high - low)
+        # Widened by the bulk's own size on every side: all of the drawing, but not entities far away from it
+        margin = np.maximum(high - low, size)
+        low, high = low - margin, high + margin
+        self.origin = low
+        self.cell_size = max(size, float((high - low).max()) / (MAX_GRID_SIDE - 1)) or 1.0
+        sides = np.minimum(np.floor((high - low) / self.cell_size) + 1, MAX_GRID_SIDE).astype(np.int64)
+        self._columns = int(sides[0])
+
+        # Boxes outside that extent would stretch the grid: they join the large ones
+        outside = (padded[:, :2] < low).any(axis=1) | (padded[:, 2:] > high).any(axis=1)
+        scaled = (padded - np.tile(low, 2)) / self.cell_size
+        cells = np.floor(np.clip(scaled, 0, np.tile(sides - 1, 2))).astype(np.int64)
+        self._cells = cells
+        spans = (cells[:, 2] - cells[:, 0] + 1) * (cells[:, 3] - cells[:, 1] + 1)
+        self._large = outside | (spans > MAX_CELLS_PER_BOX)
+
+        # (cell id, position in self.rows), sorted by cell
+        small = np.flatnonzero(~self._large)
+        counts = spans[small]
+        owners = np.repeat(small, counts)
+        offset = np.arange(len(owners), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        widths = np.repeat(cells[small, 2] - cells[small, 0] + 1, counts)
+        cx = np.repeat(cells[small, 0], counts) + offset % widths
+        cy = np.repeat(cells[small, 1], counts) + offset // widths
+        cell_ids = cy * self._columns + cx
+        order = np.argsort(cell_ids, kind='stable')
+        self._cell_ids = cell_ids[order]
+        self._owners = owners[order]
+
+    @staticmethod
+    def _percentile_extent(padded: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Lower-left and upper-right corners of the bulk of the boxes, ignoring the outermost ones."""
+        if not len(padded):
+            return np.zeros(2), np.zeros(2)
+        low = np.percentile(padded[:, :2], EXTENT_PERCENTILE, axis=0)
+        high = np.percentile(padded[:, 2:], 100 - EXTENT_PERCENTILE, axis=0)
+        return low, np.maximum(high, low)
+
+    @staticmethod
+    def _default_cell_size(padded: np.ndarray, extent: np.ndarray) -> float:
+        """About one typical box per cell: the median box size, or the mean spacing when boxes are points."""
+        if not len(padded):
+            return 1.0
+        sizes = np.maximum(padded[:, 2] - padded[:, 0], padded[:, 3] - padded[:, 1])
+        size = float(np.median(sizes))
+        if size > 0:
+            return size
+        area = float(extent[0] * extent[1])
+        return math.sqrt(area / len(padded)) if area > 0 else float(extent.max()) / len(padded)
+
+    def query(self, window: Tuple[float, float, float, float]) -> np.ndarray:
+        """Rows whose boxes overlap the window."""
+        min_x, min_y, max_x, max_y = window
+        b = self.bounds[self.rows]
+        hit = (b[:, 0] <= max_x) & (b[:, 2] >= min_x) & (b[:, 1] <= max_y) & (b[:, 3] >= min_y)
+        return self.rows[hit]
+
+    def pairs(self, distance: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Every pair of rows whose boxes are at most `distance` apart, as
+        (left rows, right rows, gaps) with left < right. `distance` may not
+        exceed twice the padding the grid was built with.
+        """
+        if distance > 2 * self.padding + 1e-12:
+            raise ValueError("distance is larger than the grid padding allows")
+        lefts, rights, gaps = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        # Candidates are filtered block by block, so only the pairs found are kept
+        for left, right in itertools.chain(self._cell_pairs(), self._large_pairs()):
+            left, right = self.rows[left], self.rows[right]
+            swap = left > right
+            left[swap], right[swap] = right[swap], left[swap]
+            gap = _gaps(self.bounds, left, right)
+            keep = gap <= distance
+            lefts.append(left[keep])
+            rights.append(right[keep])
+            gaps.append(gap[keep])
+        left, right, gap = np.concatenate(lefts), np.concatenate(rights), np.concatenate(gaps)
+        order = np.lexsort((right, left))
+        return left[order], right[order], gap[order]
+
+    def _cell_pairs(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Blocks of candidate pairs sharing a cell, each reported by exactly one cell."""
+        cell_ids, owners = self._cell_ids, self._owners
+        if not len(cell_ids):
+            return
+        boundaries = np.flatnonzero(np.diff(cell_ids)) + 1
+        starts = np.concatenate(([0], boundaries))
+        sizes = np.diff(np.append(starts, len(cell_ids)))
+        shared = sizes > 1
+        cells = self._cells
+        for left, right in _pairs_within_groups(starts[shared], sizes[shared]):
+            a, b = owners[left], owners[right]
+            # Lower-left corner of the overlap decides which cell reports the pair
+            cx = np.maximum(cells[a, 0], cells[b, 0])
+            cy = np.maximum(cells[a, 1], cells[b, 1])
+            keep = cy * self._columns + cx == cell_ids[left]
+            yield a[keep], b[keep]
+
+    def _large_pairs(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Pairs involving a box that was kept out of the cells, one block per such box."""
+        padded = self._padded
+        for position in np.flatnonzero(self._large):
+            c = padded[position]
+            # Padded boxes meeting is necessary for the boxes to be within the distance
+            hit = (padded[:, 0] <= c[2]) & (padded[:, 2] >= c[0]) & (padded[:, 1] <= c[3]) & (padded[:, 3] >= c[1])
+            # Pairs of two large boxes are found once, from the lower one
+            hit &= ~self._large | (np.arange(len(padded)) > position)
+            hit[position] = False
+            partners = np.flatnonzero(hit)
+            yield np.full(len(partners), position, dtype=np.int64), partners
+
+
+def find_overlaps(bounds: np.ndarray, min_area: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pairs of rows whose boxes overlap by more than `min_area`: (left, right, area)."""
+    grid = SpatialGrid(bounds)
+    left, right, _ = grid.pairs(0.0)
+    areas = _overlap_areas(bounds, left, right)
+    keep = areas > min_area
+    return left[keep], right[keep], areas[keep]
+
+
+def find_clearance_violations(bounds: np.ndarray, clearance: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pairs of rows closer than `clearance` without touching: (left, right, gap)."""
+    grid = SpatialGrid(bounds, padding=clearance / 2)
+    left, right, gaps = grid.pairs(clearance)
+    keep = (gaps > 0) & (gaps < clearance)
+    return left[keep], right[keep], gaps[keep]
+
+
+def index_conflicts(
+    index,
+    clearance: float = 0.0,
+    layers: Optional[Sequence[str]] = None,
+    entity_types: Optional[Sequence[str]] = None,
+    offset: int = 0,
+    limit: int = 100
+) -> dict:
+    """
+    One page of the geometric conflicts among the selected rows of an
+    EntityIndex: overlapping boxes when `clearance` is 0, otherwise pairs
+    closer than `clearance` without touching. Largest overlaps / smallest
+    gaps come first.
+    """
+    rows = index.select(layers, entity_types)
+    bounds = index.bounds[rows]
+    if clearance > 0:
+        left, right, measure = find_clearance_violations(bounds, clearance)
+        order = np.argsort(measure, kind='stable')
+        key = 'gap'
+    else:
+        left, right, measure = find_overlaps(bounds)
+        order = np.argsort(-measure, kind='stable')
+        key = 'overlap_area'
+    items = []
+    for pair in order[offset:offset + limit]:
+        items.append({
+            'a': index.describe(int(rows[left[pair]])),
+            'b': index.describe(int(rows[right[pair]])),
+            key: float(measure[pair])
+        })
+    return {'total': int(len(order)), 'offset': offset, 'limit': limit, 'items': items}
@@ -4,17 +4,744 @@ Processes DXF files line-by-line without loading entire file into memory.
 Designed for files 100MB+ up to several GB.
 """
 
+import os
+import time
+from contextlib import AsyncExitStack
+
 import httpx
+from botocore.exceptions import ClientError
 from loguru import logger
-from typing import Optional
-import re
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from core.audit_rules import EARLY_RULE_TYPES, CompiledRuleSet, load_ruleset
+from core.coordinate_stats import CoordinateStats
+from core.dxf_formats import StreamDecoder
+from core.dxf_tokenizer import DxfTokenizer
+from core.entity_index import EntityIndexBuilder, save_entity_index
+from core.memory_stats import MemoryMonitor
+from core.metrics import AuditProfile
+from core.r2_reader import object_key, open_object_stream
+
+# Bytes requested per read from the HTTP stream
+AUDIT_CHUNK_SIZE = 1024 * 1024
+
+# Distinct names tracked per kind (layers, entity types, table and block
+# definitions); what falls beyond is only counted, in the report's `overflow`
+AUDIT_MAX_TRACKED_NAMES = int(os.getenv("AUDIT_MAX_TRACKED_NAMES", "20000"))
+
+# Names are tracked by their first bytes at most (DXF names stay under 256 characters)
+MAX_NAME_BYTES = 1024
+
+VERSION_MAP = {
+    'AC1014': 'R14',
+    'AC1015': '2000',
+    'AC1018': '2004',
+    'AC1021': '2007',
+    'AC1024': '2010',
+    'AC1027': '2013',
+    'AC1032': '2018'
+}
+
+TRACKED_ENTITIES = (
+    'LINE', 'LWPOLYLINE', 'POLYLINE', 'CIRCLE', 'ARC', 'TEXT', 'MTEXT',
+    'INSERT', 'POINT', 'DIMENSION', 'SOLID', 'HATCH', '3DFACE', 'SPLINE',
+    'ELLIPSE'
+)
+
+# Sub-entities that belong to a parent entity and are not counted on their own
+UNCOUNTED_ENTITIES = frozenset((b'ENDSEC', b'SEQEND', b'ATTRIB', b'VERTEX'))
+
+# Entity color codes with a special meaning
+COLOR_BYBLOCK = 0
+COLOR_BYLAYER = 256
+
+# Overflow counters that belong to table / block definitions
+DEFINITION_OVERFLOWS = ('layer_records', 'linetypes', 'blocks')
+
+# on_progress(bytes_read, total_bytes, lines)
+ProgressCallback = Callable[[int, Optional[int], int], None]
+
+# on_event(kind, data): 'progress' snapshots and early 'issue' findings
+AuditEventCallback = Callable[[str, dict], None]
+
+# Seconds between the progress events of an audit, and entity types listed in each
+AUDIT_EVENT_INTERVAL = float(os.getenv("AUDIT_EVENT_INTERVAL", "0.5"))
+EVENT_ENTITY_TYPES = 20
+
+
+class AuditCancelled(Exception):
+    """Raised from a progress callback to stop a running audit."""
+
+
+class _SectionEnd(Exception):
+    """Internal: an ENDSEC that changes what the rest of the stream means."""
+
+
+def _merge_counts(target: dict, source: dict, overflow: Dict[str, int], kind: str) -> None:
+    """Add `source` counters to `target`, counting keys beyond the name limit as overflow."""
+    for key, count in source.items():
+        if key in target:
+            target[key] += count
+        elif len(target) < AUDIT_MAX_TRACKED_NAMES:
+            target[key] = count
+        else:
+            overflow[kind] = overflow.get(kind, 0) + count
+
+
+class AuditStats:
+    """
+    Counters collected by the streaming auditor. Partial results can be merged.
+
+    Name-keyed counters hold at most AUDIT_MAX_TRACKED_NAMES keys each, in
+    order of first appearance; `overflow` counts what was left out (entities
+    on untracked layers or of untracked types, skipped definitions, truncated
+    lines, numeric fields whose value is not a number). Merging in file order keeps the same names as one sequential
+    pass, unless a single part already overflowed on its own.
+    """
+
+    def __init__(self):
+        self.entity_types: Dict[bytes, int] = {}  # Raw entity names, including sub-entities
+        self.layers: Dict[bytes, int] = {}
+        self.layer_props: Dict[bytes, dict] = {}  # LAYER table: color, linetype, lineweight
+        self.linetypes: Dict[bytes, str] = {}  # LTYPE table: name -> description
+        self.blocks: Set[bytes] = set()  # Block definitions (BLOCK_RECORD table and BLOCKS)
+        self.explicit_colors: Dict[Tuple[bytes, int], int] = {}  # (layer, color) of entities with their own color
+        self.rule_hits: Dict[str, int] = {}  # Value-rule violations by rule id
+        self.overflow: Dict[str, int] = {}  # What the limits (or unreadable values) left out, by kind
+        self.version: Optional[str] = None
+        self.coords = CoordinateStats()
+
+    def merge(self, other: 'AuditStats') -> None:
+        """Add the counters of a later part of the same file."""
+        overflow = self.overflow
+        _merge_counts(self.entity_types, other.entity_types, overflow, 'entity_types')
+        _merge_counts(self.layers, other.layers, overflow, 'layers')
+        for key, count in other.explicit_colors.items():
+            # Entities of layers left out are already in the layer overflow
+            if key[0] in self.layers:
+                self.explicit_colors[key] = self.explicit_colors.get(key, 0) + count
+        self.merge_definitions(other)
+        for rule_id, count in other.rule_hits.items():
+            self.rule_hits[rule_id] = self.rule_hits.get(rule_id, 0) + count
+        for kind, count in other.overflow.items():
+            if kind not in DEFINITION_OVERFLOWS:
+                overflow[kind] = overflow.get(kind, 0) + count
+        if self.version is None:
+            self.version = other.version
+        self.coords.merge(other.coords)
+
+    def merge_definitions(self, other: 'AuditStats') -> None:
+        """Add table and block definitions only (no entity counters)."""
+        overflow = self.overflow
+        for kind, mine, theirs in (
+            ('layer_records', self.layer_props, other.layer_props),
+            ('linetypes', self.linetypes, other.linetypes),
+        ):
+            for name, value in theirs.items():
+                if name in mine:
+                    continue
+                if len(mine) < AUDIT_MAX_TRACKED_NAMES:
+                    mine[name] = value
+                else:
+                    overflow[kind] = overflow.get(kind, 0) + 1
+        for name in other.blocks - self.blocks:
+            if len(self.blocks) < AUDIT_MAX_TRACKED_NAMES:
+                self.blocks.add(name)
+            else:
+                overflow['blocks'] = overflow.get('blocks', 0) + 1
+        for kind in DEFINITION_OVERFLOWS:
+            if other.overflow.get(kind):
+                overflow[kind] = overflow.get(kind, 0) + other.overflow[kind]
+
+    def resolved_colors(self) -> Dict[bytes, Dict[int, int]]:
+        """
+        Effective entity colors per layer: ByLayer entities take the layer's
+        table color (7 when the layer is not in the table). ByBlock stays 0.
+        """
+        explicit: Dict[bytes, Dict[int, int]] = {}
+        for (layer, color), count in self.explicit_colors.items():
+            if color != COLOR_BYLAYER:
+                per_layer = explicit.setdefault(layer, {})
+                per_layer[color] = per_layer.get(color, 0) + count
+        resolved = {}
+        for layer, total in self.layers.items():
+            colors = dict(explicit.get(layer, {}))
+            by_layer = total - sum(colors.values())
+            if by_layer > 0:
+                # A negative table color only means the layer is off
+                layer_color = abs(self.layer_props.get(layer, {}).get('color', 7))
+                colors[layer_color] = colors.get(layer_color, 0) + by_layer
+            resolved[layer] = colors
+        return resolved
+
+    @property
+    def entities(self) -> Dict[str, int]:
+        """Counts of the tracked entity types, everything else as OTHER."""
+        entities = dict.fromkeys(TRACKED_ENTITIES, 0)
+        entities['OTHER'] = 0
+        for raw, count in self.entity_types.items():
+            if raw in UNCOUNTED_ENTITIES:
+                continue
+            name = raw.decode('ascii', 'replace')
+            if name in entities:
+                entities[name] += count
+            else:
+                entities['OTHER'] += count
+        return entities
+
+
+class DxfStreamAuditor:
+    """
+    Incremental DXF auditor.
+
+    Bytes are tokenized into (group_code, value) pairs and every pair is
+    dispatched through a handler table keyed by the integer group code.
+    The table is swapped whenever the parser enters a new section, and in
+    ENTITIES whenever a new entity starts: the rule set compiles its value
+    checks into one table per entity type, so codes that no rule targets
+    cost a single dict lookup however many rules are loaded.
+
+    With `mid_entities=True` the auditor starts on an entity boundary of
+    unknown section (a byte range of a larger file). It parses as if inside
+    ENTITIES and, at the first section marker, moves everything collected so
+    far into `leading`, so the caller can keep or drop it once the section
+    of the previous range is known.
+
+    Nothing after the ENTITIES section is audited, so the auditor is `done`
+    at its ENDSEC and further input is ignored. Callers stop reading there,
+    which skips trailing OBJECTS / THUMBNAILIMAGE data entirely.
+
+    Given an `index` builder, the ENTITIES tables also collect one index row
+    per entity. Without one the tables are exactly as before, so audits that
+    do not build an index pay nothing for it. Only whole-file audits can build
+    an index (rows of a speculative range could not be split off).
+    """
+
+    def __init__(self, mid_entities: bool = False, rules: Optional[CompiledRuleSet] = None, index: Optional[EntityIndexBuilder] = None):
+        if mid_entities and index is not None:
+            raise ValueError("An entity index needs a whole-file audit")
+        self._tokenizer = DxfTokenizer()
+        self.index = index
+        self.rules = rules or load_ruleset()
+        self.stats = AuditStats()
+        self.leading: Optional[AuditStats] = None
+        self.leading_lines: Optional[int] = None
+        self.done = False
+        self._truncated_lines = 0
+        self._end_line = 0
+        self._speculative = mid_entities
+        self._header_var = None
+        self._entity_layer = b'0'
+        self._layer_record: dict = {}
+        self._ltype_name = b''
+        self._section: Optional[bytes] = b'ENTITIES' if mid_entities else None
+        self._bind_handlers()
+        self._handlers = self._section_handlers[b'ENTITIES'] if mid_entities else self._outside_handlers
+
+    def _bind_handlers(self) -> None:
+        stats = self.stats
+        self._outside_handlers: Dict[int, Callable[[bytes], None]] = {
+            0: self._on_structure,
+        }
+        self._section_name_handlers = {
+            0: self._on_structure,
+            2: self._on_section_name,
+        }
+        self._section_handlers = {
+            b'HEADER': {
+                0: self._on_structure,
+                9: self._on_header_variable,
+                1: self._on_header_string,
+            },
+            b'TABLES': {
+                0: self._on_table_record,
+            },
+            b'BLOCKS': {
+                0: self._on_block_entity,
+            },
+        }
+        # Table records that feed the layer index, by record type
+        record_fields = {
+            b'LAYER': {
+                2: self._on_layer_record_name,
+                62: self._on_layer_record_color,
+                6: self._on_layer_record_linetype,
+                370: self._on_layer_record_lineweight,
+            },
+            b'LTYPE': {
+                2: self._on_ltype_name,
+                3: self._on_ltype_description,
+            },
+            b'BLOCK_RECORD': {
+                2: self._on_block_name,
+            },
+        }
+        self._table_record_handlers = {
+            record: {0: self._on_table_record, **fields} for record, fields in record_fields.items()
+        }
+        self._block_header_handlers = {
+            0: self._on_block_entity,
+            2: self._on_block_name,
+        }
+        entity_handlers = {
+            0: self._on_entity,
+            8: self._on_layer,
+            62: self._on_entity_color,
+            # Coordinates are buffered raw and reduced once per chunk
+            10: stats.coords.x.pending.append,
+            20: stats.coords.y.pending.append,
+            30: stats.coords.z.pending.append,
+        }
+        if self.index is not None:
+            entity_handlers = self.index.extend_entity_handlers(entity_handlers)
+        self._entity_default, self._entity_tables = self.rules.bind_entity_tables(entity_handlers, stats.rule_hits)
+        if self.index is not None:
+            self.index.bind_entity_tables(self._entity_default, self._entity_tables)
+        # A range parsed speculatively may really be inside TABLES or BLOCKS:
+        # those record types never occur in ENTITIES, so keep their definitions
+        self._entity_tables[b'BLOCK'] = {**self._entity_default, 2: self._on_block_name}
+        for record, fields in record_fields.items():
+            self._entity_tables[record] = {**self._entity_default, **fields}
+        self._section_handlers[b'ENTITIES'] = self._entity_default
+
+    @property
+    def total_lines(self) -> int:
+        """Lines audited: up to the end of ENTITIES once the auditor is done."""
+        return self._end_line if self.done else self._tokenizer.total_lines
+
+    @property
+    def binary(self) -> bool:
+        """Whether the input turned out to be binary DXF."""
+        return self._tokenizer.binary
+
+    @property
+    def section(self) -> Optional[bytes]:
+        """Name of the section the parser is in, None between sections."""
+        return self._section
+
+    def feed(self, chunk: bytes) -> None:
+        """Tokenize and audit the next chunk of the file."""
+        if self.done:
+            return
+        self._consume(self._tokenizer.feed(chunk))
+        self.stats.coords.flush()
+        if self.index is not None:
+            self.index.flush()
+        self._count_truncated_lines()
+
+    def close(self) -> None:
+        """Process whatever is left once the stream ends."""
+        if self.done:
+            return
+        self._consume(self._tokenizer.close())
+        self.stats.coords.flush()
+        self._count_truncated_lines()
+
+    def _count_truncated_lines(self) -> None:
+        truncated = self._tokenizer.truncated_lines
+        if truncated != self._truncated_lines:
+            self._add_overflow('long_lines', truncated - self._truncated_lines)
+            self._truncated_lines = truncated
+
+    def _add_overflow(self, kind: str, count: int = 1) -> None:
+        overflow = self.stats.overflow
+        overflow[kind] = overflow.get(kind, 0) + count
+
+    def _new_name(self, names, value: bytes, kind: str) -> Optional[bytes]:
+        """Key for a name not tracked yet (cut to MAX_NAME_BYTES), None once `names` is full."""
+        if len(value) > MAX_NAME_BYTES:
+            value = value[:MAX_NAME_BYTES]
+            if value in names:
+                return value
+        if len(names) >= AUDIT_MAX_TRACKED_NAMES:
+            self._add_overflow(kind)
+            return None
+        return value
+
+    def _consume(self, pairs) -> None:
+        while True:
+            try:
+                handlers = self._handlers
+                for code, value in pairs:
+                    handler = handlers.get(code)
+                    if handler is not None:
+                        handler(value)
+                        handlers = self._handlers
+                return
+            except _SectionEnd:
+                # Rare: pin the exact line of this ENDSEC, independent of chunking
+                line = self._tokenizer.lines_consumed()
+                if self.done:
+                    # Whatever follows ENTITIES in the chunk is never read
+                    self._end_line = line
+                    return
+                self.leading_lines = line
+
+    def _close_leading(self) -> None:
+        """Split off everything parsed before the first section marker."""
+        self._speculative = False
+        self.stats.coords.flush()
+        self.leading = self.stats
+        self.stats = AuditStats()
+        self._bind_handlers()
+
+    # ------------------------------------------------------------------
+    # Section tracking
+    # ------------------------------------------------------------------
+
+    def _on_structure(self, value: bytes) -> None:
+        if value == b'SECTION':
+            self._handlers = self._section_name_handlers
+        elif value == b'ENDSEC':
+            self._section = None
+            self._handlers = self._outside_handlers
+
+    def _on_section_name(self, value: bytes) -> None:
+        self._section = value
+        self._handlers = self._section_handlers.get(value, self._outside_handlers)
+
+    # ------------------------------------------------------------------
+    # HEADER
+    # ------------------------------------------------------------------
 
+    def _on_header_variable(self, value: bytes) -> None:
+        self._header_var = value
 
-async def stream_audit_large_dxf(file_url: str) -> dict:
+    def _on_header_string(self, value: bytes) -> None:
+        if self._header_var == b'$ACADVER':
+            version = value.decode('ascii', 'replace')
+            self.stats.version = VERSION_MAP.get(version, version)
+
+    # ------------------------------------------------------------------
+    # TABLES
+    # ------------------------------------------------------------------
+
+    def _on_table_record(self, value: bytes) -> None:
+        if value == b'ENDSEC':
+            self._section = None
+            self._handlers = self._outside_handlers
+        else:
+            self._handlers = self._table_record_handlers.get(value, self._section_handlers[b'TABLES'])
+
+    def _on_layer_record_name(self, value: bytes) -> None:
+        layer_props = self.stats.layer_props
+        if value not in layer_props:
+            value = self._new_name(layer_props, value, 'layer_records')
+            if value is None:
+                self._layer_record = {}  # Collects the fields of the skipped record
+                return
+        self._layer_record = layer_props.setdefault(
+            value, {'color': 7, 'linetype': 'Continuous', 'lineweight': -3}
+        )
+
+    def _on_layer_record_color(self, value: bytes) -> None:
+        try:
+            self._layer_record['color'] = int(value)
+        except ValueError:
+            self._add_overflow('invalid_values')
+
+    def _on_layer_record_linetype(self, value: bytes) -> None:
+        self._layer_record['linetype'] = value.decode('utf-8', 'replace')
+
+    def _on_layer_record_lineweight(self, value: bytes) -> None:
+        try:
+            self._layer_record['lineweight'] = int(value)
+        except ValueError:
+            self._add_overflow('invalid_values')
+
+    def _on_ltype_name(self, value: bytes) -> None:
+        linetypes = self.stats.linetypes
+        if value not in linetypes:
+            value = self._new_name(linetypes, value, 'linetypes')
+            if value is not None:
+                linetypes.setdefault(value, '')
+        self._ltype_name = value
+
+    def _on_ltype_description(self, value: bytes) -> None:
+        if self._ltype_name in self.stats.linetypes:
+            self.stats.linetypes[self._ltype_name] = value.decode('utf-8', 'replace')
+
+    # ------------------------------------------------------------------
+    # BLOCKS
+    # ------------------------------------------------------------------
+
+    def _on_block_entity(self, value: bytes) -> None:
+        if value == b'ENDSEC':
+            self._section = None
+            self._handlers = self._outside_handlers
+        elif value == b'BLOCK':
+            self._handlers = self._block_header_handlers
+        else:
+            self._handlers = self._section_handlers[b'BLOCKS']
+
+    def _on_block_name(self, value: bytes) -> None:
+        blocks = self.stats.blocks
+        if value not in blocks:
+            value = self._new_name(blocks, value, 'blocks')
+            if value is not None:
+                blocks.add(value)
+
+    # ------------------------------------------------------------------
+    # ENTITIES
+    # ------------------------------------------------------------------
+
+    def _on_entity(self, value: bytes) -> None:
+        if value == b'ENDSEC':
+            if self._speculative:
+                self._close_leading()
+            else:
+                self.done = True
+            self._section = None
+            self._handlers = self._outside_handlers
+            raise _SectionEnd()
+        self._handlers = self._entity_tables.get(value, self._entity_default)
+        # Raw names are counted here and grouped once, when the report is built
+        entity_types = self.stats.entity_types
+        count = entity_types.get(value)
+        if count is not None:
+            entity_types[value] = count + 1
+        else:
+            value = self._new_name(entity_types, value, 'entity_types')
+            if value is not None:
+                entity_types[value] = entity_types.get(value, 0) + 1
+
+    def _on_layer(self, value: bytes) -> None:
+        layers = self.stats.layers
+        count = layers.get(value)
+        if count is not None:
+            layers[value] = count + 1
+        else:
+            # None (layer left out) also stops tracking the entity's colors
+            value = self._new_name(layers, value, 'layers')
+            if value is not None:
+                layers[value] = layers.get(value, 0) + 1
+        self._entity_layer = value
+
+    def _on_entity_color(self, value: bytes) -> None:
+        # Group 8 precedes 62, so the entity's layer is already known
+        if self._entity_layer is None:
+            return
+        try:
+            key = (self._entity_layer, int(value))
+        except ValueError:
+            # The entity keeps counting as ByLayer
+            self._add_overflow('invalid_values')
+            return
+        colors = self.stats.explicit_colors
+        colors[key] = colors.get(key, 0) + 1
+
+    # ------------------------------------------------------------------
+    # Report
+    # ------------------------------------------------------------------
+
+    def build_report(self) -> dict:
+        """Turn the collected statistics into the audit result payload."""
+        return build_audit_report(self.stats, self.total_lines, self.rules)
+
+
+def build_audit_report(stats: AuditStats, total_lines: int, rules: Optional[CompiledRuleSet] = None) -> dict:
+    """Apply the rule set to collected statistics and build the result payload."""
+    rules = rules or load_ruleset()
+    layer_names = {raw: raw.decode('utf-8', 'replace') for raw in stats.layers}
+    entities = stats.entities
+    total_entities = sum(entities.values())
+    resolved_colors = stats.resolved_colors()
+    layer_list = []
+    for raw, count in stats.layers.items():
+        props = stats.layer_props.get(raw, {})
+        layer_list.append({
+            'name': layer_names[raw],
+            'color': props.get('color', 7),
+            'linetype': props.get('linetype', 'Continuous'),
+            'lineweight': props.get('lineweight', -3),
+            'entity_count': count,
+            # String keys so the payload survives a JSON round trip unchanged
+            'entity_colors': {str(color): n for color, n in sorted(resolved_colors[raw].items())}
+        })
+
+    # Bounding box ignores isolated stray points (see CoordinateStats)
+    bounding_box = stats.coords.bounding_box()
+    issues = rules.evaluate(stats, bounding_box if stats.coords.x.count else None)
+    score, status = rules.score(issues)
+
+    # Add pass message if no issues
+    if not issues:
+        issues.append({
+            'code': 'ALL_CHECKS_PASSED',
+            'severity': 'pass',
+            'message': 'Archivo procesado correctamente. No se encontraron problemas.'
+        })
+
+    summary = {
+        'total_layers': len(stats.layers),
+        'entities': total_entities,
+        'version': stats.version or 'Unknown',
+        'score': score,
+        'total_lines': total_lines,
+        'bounding_box': bounding_box,
+        'ruleset': rules.id
+    }
+    result = {
+        'status': status,
+        'summary': summary,
+        'layers': layer_list[:50],  # First 50 layers; the entity index pages through all of them
+        'details': issues,
+        'entity_breakdown': {k: v for k, v in entities.items() if v > 0}
+    }
+    if stats.overflow:
+        # Only present when something was left out, so other reports keep their shape
+        summary['overflow'] = {kind: stats.overflow[kind] for kind in sorted(stats.overflow)}
+        logger.warning(f"Audit left values out: {summary['overflow']}")
+    return result
+
+
+def audit_error_result(code: str, error: str, message: Optional[str] = None) -> dict:
+    """Result payload for an audit that could not be completed."""
+    return {
+        'status': 'error',
+        'summary': {
+            'total_layers': 0,
+            'entities': 0,
+            'version': 'Unknown',
+            'score': 0,
+            'error': error
+        },
+        'layers': [],
+        'details': [{'code': code, 'severity': 'fail', 'message': message or error}]
+    }
+
+
+class AuditEventEmitter:
+    """
+    Live view of a running audit for streamed responses: a progress snapshot
+    (bytes, lines, section, running entity counts) at most every `interval`
+    seconds, plus each issue as soon as it is certain. Only EARLY_RULE_TYPES
+    findings are reported early, once ENTITIES is being read; their counts
+    may still grow, and the final report has the definitive list.
+    """
+
+    def __init__(self, auditor: DxfStreamAuditor, on_event: AuditEventCallback, interval: float = AUDIT_EVENT_INTERVAL):
+        self.auditor = auditor
+        self.on_event = on_event
+        self.interval = interval
+        self._last = 0.0
+        self._reported: Set[str] = set()
+
+    def update(self, bytes_read: int, total_bytes: Optional[int], final: bool = False) -> None:
+        now = time.monotonic()
+        if not final and now - self._last < self.interval:
+            return
+        self._last = now
+        self.on_event('progress', self.snapshot(bytes_read, total_bytes))
+        for issue in self._new_issues():
+            self.on_event('issue', issue)
+
+    def snapshot(self, bytes_read: int, total_bytes: Optional[int]) -> dict:
+        auditor = self.auditor
+        stats = auditor.stats
+        section = auditor.section
+        counted = [(name, count) for name, count in stats.entity_types.items() if name not in UNCOUNTED_ENTITIES]
+        counted.sort(key=lambda item: item[1], reverse=True)
+        return {
+            'bytes_processed': bytes_read,
+            'total_bytes': total_bytes,
+            'lines_processed': auditor.total_lines,
+            'section': section.decode('ascii', 'replace') if section else None,
+            'entities': sum(count for _, count in counted),
+            'entity_types': {name.decode('ascii', 'replace'): count for name, count in counted[:EVENT_ENTITY_TYPES]},
+            'layers': len(stats.layers)
+        }
+
+    def _new_issues(self) -> List[dict]:
+        if self.auditor.section != b'ENTITIES' and not self.auditor.done:
+            return []
+        issues = self.auditor.rules.evaluate(self.auditor.stats, None, types=EARLY_RULE_TYPES)
+        fresh = [issue for issue in issues if issue['rule'] not in self._reported]
+        self._reported.update(issue['rule'] for issue in fresh)
+        return fresh
+
+
+async def _audit_chunks(
+    auditor: DxfStreamAuditor,
+    chunks: AsyncIterator[bytes],
+    total_bytes: Optional[int],
+    on_progress: Optional[ProgressCallback],
+    memory: Optional[MemoryMonitor] = None,
+    profile: Optional[AuditProfile] = None,
+    events: Optional[AuditEventEmitter] = None
+) -> Optional[str]:
     """
-    Stream-process a large DXF file from URL.
-    Extracts metadata without loading entire file into memory.
-    
+    Feed a byte stream to the auditor, stopping once it is done. gzip and
+    zstd streams are decompressed on the way; progress counts raw bytes.
+    `memory` is sampled after every chunk; `profile` gets the time spent
+    waiting for chunks (download) and handling them (parse); `events` is
+    updated after every chunk and once more at the end.
+    Returns the compression found, if any.
+    """
+    decoder = StreamDecoder()
+    bytes_read = 0
+    next_log = 1000000
+    waiting = time.perf_counter()
+    async for chunk in chunks:
+        received = time.perf_counter()
+        for block in decoder.feed(chunk):
+            auditor.feed(block)
+            if auditor.done:
+                break
+        bytes_read += len(chunk)
+        if memory is not None:
+            memory.sample()
+        if profile is not None:
+            profile.bytes += len(chunk)
+            profile.add('download', received - waiting)
+            waiting = time.perf_counter()
+            profile.add('parse', waiting - received)
+        if on_progress is not None:
+            on_progress(bytes_read, total_bytes, auditor.total_lines)
+        if events is not None:
+            events.update(bytes_read, total_bytes, final=auditor.done)
+
+        # Progress logging every 1M lines
+        if auditor.total_lines >= next_log:
+            logger.info(f"Processed {auditor.total_lines:,} lines...")
+            next_log += 1000000
+
+        if auditor.done:
+            if total_bytes:
+                logger.info(f"ENTITIES complete, skipping last {total_bytes - bytes_read:,} bytes")
+            return decoder.compression
+
+    for block in decoder.close():
+        auditor.feed(block)
+    auditor.close()
+    if events is not None:
+        events.update(bytes_read, total_bytes, final=True)
+    return decoder.compression
+
+
+async def stream_audit_large_dxf(
+    file_url: str,
+    on_progress: Optional[ProgressCallback] = None,
+    rules_id: Optional[str] = None,
+    build_index: bool = False,
+    client: Optional[httpx.AsyncClient] = None,
+    on_event: Optional[AuditEventCallback] = None
+) -> dict:
+    """
+    Stream-process a large DXF file from URL, or from the R2 bucket when
+    given an r2://<file_key> source (read with the shared S3 client).
+    Extracts metadata without loading entire file into memory. Accepts
+    ASCII or binary DXF, optionally gzip / zstd compressed.
+
+    `on_progress(bytes_read, total_bytes, lines)` is called after every
+    chunk; it may raise AuditCancelled to stop the audit. `rules_id` picks
+    the rule set (rules/<id>.json), the default one when None.
+    `build_index` also stores an entity index next to an R2 source
+    (<file_key>.index.npz, see core.entity_index); it is ignored for URLs.
+    `client` downloads URLs (the API process passes its shared one); a
+    client of its own is opened when None. `on_event(kind, data)` receives
+    progress snapshots and early issues (see AuditEventEmitter).
+
     Returns audit result with:
     - Layer names and counts
     - Entity counts by type
@@ -22,225 +749,87 @@ async def stream_audit_large_dxf(file_url: str) -> dict:
     - File statistics
     """
     logger.info(f"Starting streaming audit for: {file_url[:100]}...")
-    
-    stats = {
-        'total_lines': 0,
-        'layers': {},
-        'entities': {
-            'LINE': 0,
-            'LWPOLYLINE': 0,
-            'POLYLINE': 0,
-            'CIRCLE': 0,
-            'ARC': 0,
-            'TEXT': 0,
-            'MTEXT': 0,
-            'INSERT': 0,
-            'POINT': 0,
-            'DIMENSION': 0,
-            'SOLID': 0,
-            'HATCH': 0,
-            '3DFACE': 0,
-            'SPLINE': 0,
-            'ELLIPSE': 0,
-            'OTHER': 0
-        },
-        'min_x': float('inf'),
-        'max_x': float('-inf'),
-        'min_y': float('inf'),
-        'max_y': float('-inf'),
-        'min_z': float('inf'),
-        'max_z': float('-inf'),
-        'version': 'Unknown',
-        'errors': []
-    }
-    
-    current_entity = None
-    current_layer = None
-    in_entities_section = False
-    in_header_section = False
-    prev_line = ""
-    
+
+    file_key = object_key(file_url)
+    memory = MemoryMonitor()
+    profile = AuditProfile('stream')
+    index = EntityIndexBuilder() if build_index and file_key is not None else None
+    auditor = DxfStreamAuditor(rules=load_ruleset(rules_id), index=index)
+    events = AuditEventEmitter(auditor, on_event) if on_event is not None else None
+
     try:
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            async with client.stream('GET', file_url) as response:
+        if file_key is not None:
+            async with open_object_stream(file_key) as stream:
+                compression = await _audit_chunks(auditor, stream.iter_chunks(AUDIT_CHUNK_SIZE), stream.size, on_progress, memory, profile, events)
+        else:
+            async with AsyncExitStack() as stack:
+                if client is None:
+                    client = await stack.enter_async_context(httpx.AsyncClient(timeout=300.0))
+                response = await stack.enter_async_context(client.stream('GET', file_url))
                 if response.status_code != 200:
-                    return {
-                        'status': 'error',
-                        'summary': {
-                            'total_layers': 0,
-                            'entities': 0,
-                            'version': 'Unknown',
-                            'score': 0,
-                            'error': f'Failed to download file: {response.status_code}'
-                        },
-                        'layers': [],
-                        'details': [{'code': 'DOWNLOAD_ERROR', 'severity': 'fail', 'message': f'HTTP {response.status_code}'}]
-                    }
-                
-                buffer = ""
-                async for chunk in response.aiter_text():
-                    buffer += chunk
-                    lines = buffer.split('\n')
-                    buffer = lines[-1]  # Keep incomplete line for next iteration
-                    
-                    for line in lines[:-1]:
-                        line = line.strip()
-                        stats['total_lines'] += 1
-                        
-                        # Detect sections
-                        if line == 'HEADER':
-                            in_header_section = True
-                            in_entities_section = False
-                        elif line == 'ENTITIES':
-                            in_entities_section = True
-                            in_header_section = False
-                        elif line == 'ENDSEC':
-                            in_header_section = False
-                            in_entities_section = False
-                        
-                        # Extract version from header
-                        if in_header_section and prev_line == '9' and line == '$ACADVER':
-                            pass  # Next value after 1 will be version
-                        if in_header_section and prev_line == '1' and line.startswith('AC'):
-                            version_map = {
-                                'AC1014': 'R14',
-                                'AC1015': '2000',
-                                'AC1018': '2004',
-                                'AC1021': '2007',
-                                'AC1024': '2010',
-                                'AC1027': '2013',
-                                'AC1032': '2018'
-                            }
-                            stats['version'] = version_map.get(line, line)
-                        
-                        # Detect entity types
-                        if in_entities_section and prev_line == '0':
-                            if line in stats['entities']:
-                                stats['entities'][line] += 1
-                                current_entity = line
-                            elif line not in ['ENDSEC', 'SEQEND', 'ATTRIB', 'VERTEX']:
-                                stats['entities']['OTHER'] += 1
-                                current_entity = 'OTHER'
-                        
-                        # Extract layer names (group code 8)
-                        if prev_line == '8' and in_entities_section:
-                            if line not in stats['layers']:
-                                stats['layers'][line] = {'count': 0, 'color': 7}
-                            stats['layers'][line]['count'] += 1
-                            current_layer = line
-                        
-                        # Extract coordinates for bounding box
-                        if prev_line == '10':  # X coordinate
-                            try:
-                                x = float(line)
-                                stats['min_x'] = min(stats['min_x'], x)
-                                stats['max_x'] = max(stats['max_x'], x)
-                            except ValueError:
-                                pass
-                        if prev_line == '20':  # Y coordinate
-                            try:
-                                y = float(line)
-                                stats['min_y'] = min(stats['min_y'], y)
-                                stats['max_y'] = max(stats['max_y'], y)
-                            except ValueError:
-                                pass
-                        if prev_line == '30':  # Z coordinate
-                            try:
-                                z = float(line)
-                                stats['min_z'] = min(stats['min_z'], z)
-                                stats['max_z'] = max(stats['max_z'], z)
-                            except ValueError:
-                                pass
-                        
-                        prev_line = line
-                        
-                        # Progress logging every 1M lines
-                        if stats['total_lines'] % 1000000 == 0:
-                            logger.info(f"Processed {stats['total_lines']:,} lines...")
-        
-        # Calculate results
-        total_entities = sum(stats['entities'].values())
-        layer_list = [
-            {'name': name, 'color': data['color'], 'linetype': 'Continuous', 'entity_count': data['count']}
-            for name, data in stats['layers'].items()
-        ]
-        
-        # Generate issues
-        issues = []
-        
-        # Check for unnamed layers
-        if '' in stats['layers'] or '0' in stats['layers']:
-            issues.append({
-                'code': 'LAYER_DEFAULT',
-                'severity': 'warning',
-                'layer': '0',
-                'message': 'Entidades en capa por defecto (0). Considerar organizar en capas nombradas.'
-            })
-        
-        # Check bounding box for scale issues
-        if stats['max_x'] != float('-inf'):
-            width = stats['max_x'] - stats['min_x']
-            height = stats['max_y'] - stats['min_y']
-            if width > 10000 or height > 10000:
-                issues.append({
-                    'code': 'SCALE_LARGE',
-                    'severity': 'warning',
-                    'message': f'Dimensiones muy grandes ({width:.0f} x {height:.0f}). Verificar unidades.'
-                })
-        
-        # Calculate score
-        score = 100
-        for issue in issues:
-            if issue['severity'] == 'fail':
-                score -= 20
-            elif issue['severity'] == 'warning':
-                score -= 5
-        score = max(0, score)
-        
-        # Add pass message if no issues
-        if not issues:
-            issues.append({
-                'code': 'ALL_CHECKS_PASSED',
-                'severity': 'pass',
-                'message': 'Archivo procesado correctamente. No se encontraron problemas.'
-            })
-        
-        result = {
-            'status': 'pass' if score >= 70 else ('warning' if score >= 50 else 'fail'),
-            'summary': {
-                'total_layers': len(stats['layers']),
-                'entities': total_entities,
-                'version': stats['version'],
-                'score': score,
-                'total_lines': stats['total_lines'],
-                'bounding_box': {
-                    'min': [stats['min_x'] if stats['min_x'] != float('inf') else 0,
-                            stats['min_y'] if stats['min_y'] != float('inf') else 0,
-                            stats['min_z'] if stats['min_z'] != float('inf') else 0],
-                    'max': [stats['max_x'] if stats['max_x'] != float('-inf') else 0,
-                            stats['max_y'] if stats['max_y'] != float('-inf') else 0,
-                            stats['max_z'] if stats['max_z'] != float('-inf') else 0]
-                }
-            },
-            'layers': layer_list[:50],  # Limit to first 50 layers
-            'details': issues,
-            'entity_breakdown': {k: v for k, v in stats['entities'].items() if v > 0}
-        }
-        
-        logger.info(f"Streaming audit complete: {total_entities:,} entities, {len(stats['layers'])} layers, {stats['total_lines']:,} lines")
+                    return audit_error_result(
+                        'DOWNLOAD_ERROR',
+                        f'Failed to download file: {response.status_code}',
+                        f'HTTP {response.status_code}'
+                    )
+
+                total_bytes = int(response.headers['content-length']) if 'content-length' in response.headers else None
+                compression = await _audit_chunks(auditor, response.aiter_bytes(AUDIT_CHUNK_SIZE), total_bytes, on_progress, memory, profile, events)
+
+        with profile.stage('rules'):
+            result = auditor.build_report()
+        if index is not None:
+            with profile.stage('index'):
+                entity_index = index.build()
+                size = await save_entity_index(file_key, entity_index)
+            result['summary']['entity_index'] = {'entities': len(entity_index), 'size_bytes': size}
+            logger.info(f"Entity index stored: {len(entity_index):,} rows, {size:,} bytes")
+        result['summary']['memory'] = memory.finish()
+        result['summary']['profile'] = profile.report()
+
+        input_format = 'binary' if auditor.binary else 'ASCII'
+        logger.info(f"Input: {input_format} DXF" + (f", {compression} compressed" if compression else ''))
+        logger.info(f"Streaming audit complete: {result['summary']['entities']:,} entities, {result['summary']['total_layers']} layers, {auditor.total_lines:,} lines, peak RSS {result['summary']['memory']['peak_rss_mb']} MB")
         return result
-        
+
+    except AuditCancelled:
+        logger.info(f"Streaming audit cancelled after {auditor.total_lines:,} lines")
+        raise
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code', 'Unknown')
+        logger.error(f"Streaming audit could not read object: {code}")
+        return audit_error_result('DOWNLOAD_ERROR', f'Failed to read object: {code}', code)
     except Exception as e:
         logger.error(f"Streaming audit error: {str(e)}")
-        return {
-            'status': 'error',
-            'summary': {
-                'total_layers': 0,
-                'entities': 0,
-                'version': 'Unknown',
-                'score': 0,
-                'error': str(e)
-            },
-            'layers': [],
-            'details': [{'code': 'PROCESSING_ERROR', 'severity': 'fail', 'message': str(e)}]
-        }
+        return audit_error_result('PROCESSING_ERROR', str(e))
+
+
+def audit_local_file(path: str, rules_id: Optional[str] = None) -> dict:
+    """
+    Streaming audit of a file on local disk, in bounded memory (runs inside
+    a worker process). Used for downloads too large or too compressed for
+    an in-memory ezdxf load.
+    """
+    memory = MemoryMonitor()
+    profile = AuditProfile('stream-local')
+    auditor = DxfStreamAuditor(rules=load_ruleset(rules_id))
+    decoder = StreamDecoder()
+    with open(path, 'rb') as f, profile.stage('parse'):
+        while not auditor.done:
+            chunk = f.read(AUDIT_CHUNK_SIZE)
+            if not chunk:
+                for block in decoder.close():
+                    auditor.feed(block)
+                auditor.close()
+                break
+            profile.bytes += len(chunk)
+            for block in decoder.feed(chunk):
+                auditor.feed(block)
+                if auditor.done:
+                    break
+            memory.sample()
+    with profile.stage('rules'):
+        result = auditor.build_report()
+    result['summary']['memory'] = memory.finish()
+    result['summary']['profile'] = profile.report()
+    return result
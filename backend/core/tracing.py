@@ -0,0 +1,134 @@
+"""
+Request Tracing
+OpenTelemetry-style spans kept in process: every API request opens a trace
+and what it runs (audit stages, R2 calls, Gemini calls) is recorded as spans
+under it, with trace / span / parent ids and attributes. Finished traces are
+kept in a short history for inspection. Outside a trace spans cost nothing.
+"""
+
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+# Finished traces kept in memory
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "200"))
+
+# Spans recorded per trace at most (an audit of a large R2 object makes many calls)
+MAX_SPANS_PER_TRACE = 500
+
+
+class Trace:
+    """The spans of one request. Spans may be added from worker threads."""
+
+    def __init__(self, name: str):
+        self.trace_id = os.urandom(16).hex()
+        self.name = name
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+
+    def add(
+        self,
+        name: str,
+        span_id: str,
+        parent_id: Optional[str],
+        start: float,
+        duration: float,
+        attributes: Dict[str, Any],
+        status: str = 'ok'
+    ) -> None:
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped += 1
+            return
+        self.spans.append({
+            'name': name,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'start_ms': round((start - self.start) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3),
+            'status': status,
+            'attributes': attributes
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            'spans': sorted(self.spans, key=lambda span: span['start_ms']),
+            'dropped_spans': self.dropped
+        }
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+_span_id: ContextVar[Optional[str]] = ContextVar('span_id', default=None)
+
+_history: deque = deque(maxlen=TRACE_HISTORY)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Trace]:
+    """Open a trace with a root span; it is kept in the history once finished."""
+    trace = Trace(name)
+    token = _trace.set(trace)
+    try:
+        with span(name, **attributes):
+            yield trace
+    finally:
+        _trace.reset(token)
+        _history.append(trace.to_dict())
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Dict[str, Any]]:
+    """
+    Record the enclosed block as a span of the current trace. Yields the
+    attribute dict, so results (sizes, token counts) can be added on the way.
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield attributes
+        return
+    span_id = os.urandom(8).hex()
+    parent_id = _span_id.get()
+    token = _span_id.set(span_id)
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield attributes
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        _span_id.reset(token)
+        trace.add(name, span_id, parent_id, start, time.perf_counter() - start, attributes, status)
+
+
+def add_span(name: str, duration: float, start: Optional[float] = None, status: str = 'ok', **attributes) -> None:
+    """
+    Record a span measured elsewhere (a worker process, a client hook) under
+    the current span. `start` is a perf_counter() value; by default the span
+    ends now.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return
+    if start is None:
+        start = time.perf_counter() - duration
+    trace.add(name, os.urandom(8).hex(), _span_id.get(), start, duration, attributes, status)
+
+
+def recent_traces(limit: int = 50, min_duration_ms: float = 0.0) -> List[Dict[str, Any]]:
+    """Latest finished traces, newest first."""
+    traces = [trace for trace in reversed(_history) if trace['duration_ms'] >= min_duration_ms]
+    return traces[:limit]
@@ -0,0 +1,67 @@
+"""
+Multipart Upload Sessions
+Server-side record of each multipart upload (key, size, part size) so an
+interrupted upload can be resumed, plus the server's choice of part size.
+"""
+
+import math
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# S3/R2 multipart limits
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PARTS = 10000
+
+# Part sizing: never below the floor, and aim for about TARGET_PARTS parts
+PART_SIZE_FLOOR = 8 * 1024 * 1024
+TARGET_PARTS = int(os.getenv("UPLOAD_TARGET_PARTS", "500"))
+
+# Sessions kept in memory (oldest dropped first)
+UPLOAD_SESSION_LIMIT = int(os.getenv("UPLOAD_SESSION_LIMIT", "10000"))
+
+
+def choose_part_size(file_size: int) -> int:
+    """
+    Part size for a file: small files use the floor, large ones grow the
+    part size (rounded up to whole MiB) so the part count stays near
+    TARGET_PARTS and never exceeds the 10,000-part limit.
+    """
+    mib = 1024 * 1024
+    wanted = max(PART_SIZE_FLOOR, math.ceil(file_size / TARGET_PARTS))
+    wanted = max(wanted, math.ceil(file_size / MAX_PARTS))
+    return min(MAX_PART_SIZE, math.ceil(wanted / mib) * mib)
+
+
+class UploadSessionStore:
+    """Bounded in-memory store of upload sessions, keyed by upload_id."""
+
+    def __init__(self, limit: int = UPLOAD_SESSION_LIMIT):
+        self.limit = limit
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def create(self, upload_id: str, file_key: str, filename: str, file_size: Optional[int], part_size: Optional[int], total_parts: int) -> Dict[str, Any]:
+        session = {
+            'upload_id': upload_id,
+            'file_key': file_key,
+            'filename': filename,
+            'file_size': file_size,
+            'part_size': part_size,
+            'total_parts': total_parts,
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+        self._sessions[upload_id] = session
+        while len(self._sessions) > self.limit:
+            self._sessions.popitem(last=False)
+        return session
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        return self._sessions.get(upload_id)
+
+    def remove(self, upload_id: str) -> None:
+        self._sessions.pop(upload_id, None)
+
+
+upload_sessions = UploadSessionStore()
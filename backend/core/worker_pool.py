@@ -0,0 +1,54 @@
+"""
+Audit Worker Pool
+Shared process pool for CPU-bound DXF parsing, kept off the API event loop.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Coroutine, Optional
+
+from loguru import logger
+
+# Number of parser processes (defaults to the number of CPUs)
+AUDIT_WORKER_PROCESSES = int(os.getenv("AUDIT_WORKER_PROCESSES", str(os.cpu_count() or 2)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Event loop of this worker process, kept between tasks
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                logger.info(f"Starting audit worker pool with {AUDIT_WORKER_PROCESSES} processes")
+                _pool = ProcessPoolExecutor(max_workers=AUDIT_WORKER_PROCESSES)
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the worker processes (called on application shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def run_in_worker_loop(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Run a coroutine in a worker process on the loop it keeps for its whole
+    life. Unlike asyncio.run, the loop (and so the process's shared HTTP
+    client, which belongs to it) survives from one task to the next.
+    """
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.is_closed():
+        _worker_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_worker_loop)
+    return _worker_loop.run_until_complete(coro)
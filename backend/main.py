@@ -1,11 +1,22 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from loguru import logger
 import uvicorn
-import os
-
-from core.audit_engine import process_cad_file, process_cad_file_sync
+import json
+
+from core.audit_jobs import QueueFullError, audit_jobs
+from core.audit_cache import audit_cache, cached_audit
+from core.batch_audit import AUDIT_BATCH_MAX_FILES, audit_in_pool, audit_limiter, run_batch
+from core.audit_rules import RuleSetError, load_ruleset
+from core.http_client import close_http_client, get_http_client
+from core.loop_monitor import loop_monitor
+from core.memory_stats import audit_memory
+from core.metrics import RequestMetricsMiddleware, observe_audit, render_metrics
+from core.r2_reader import object_url
+from core.tracing import recent_traces
+from core.worker_pool import shutdown_process_pool
 
 # Initialize App
 app = FastAPI(
@@ -21,43 +32,166 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
+# One trace per request, latency by route (see /metrics)
+app.add_middleware(RequestMetricsMiddleware)
+
 # Models
 class AuditRequest(BaseModel):
     file_id: str
-    file_url: str
+    file_url: str | None = None
+    file_key: str | None = None  # R2 object, read directly from the bucket
     audit_rules_id: str | None = None
+    build_index: bool = False  # Store the entity index next to the R2 object
+    previous_file_key: str | None = None  # Earlier revision to diff against (incremental audit)
+    fingerprint: bool = False  # Store the revision fingerprint (implied by previous_file_key)
 
 class AuditResponse(BaseModel):
     job_id: str
     status: str
-    estimated_time: str
+    queue_position: int
 
 class SyncAuditRequest(BaseModel):
-    file_url: str
+    file_url: str | None = None
+    file_key: str | None = None  # R2 object, read directly from the bucket
+    audit_rules_id: str | None = None  # rules/<id>.json, default rule set when empty
+    parallel: bool = False  # Parse byte ranges in the worker pool (large files)
+    build_index: bool = False  # Store the entity index next to the R2 object
+    previous_file_key: str | None = None  # Earlier revision to diff against (incremental audit)
+    fingerprint: bool = False  # Store the revision fingerprint (implied by previous_file_key)
+    stream: str | None = None  # 'ndjson' or 'sse': progress and early issues while parsing, then the report
+
+class BatchAuditFile(BaseModel):
+    file_id: str | None = None  # Echoed back with the file's result
+    file_url: str | None = None
+    file_key: str | None = None  # R2 object, read directly from the bucket
+
+class BatchAuditRequest(BaseModel):
+    files: list[BatchAuditFile]
+    audit_rules_id: str | None = None  # One rule set for the whole project
+
+@app.on_event("startup")
+async def start_job_queue():
+    loop_monitor.start()
+    await audit_jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    loop_monitor.stop()
+    await audit_jobs.stop()
+    await close_http_client()
+    shutdown_process_pool()
 
 # Health Check
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "service": "sigebim-core"}
+    return {"status": "ok", "service": "sigebim-core", "event_loop_lag": loop_monitor.snapshot()}
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+def resolve_audit_source(file_url: str | None, file_key: str | None) -> str:
+    """
+    Audit input: an R2 file_key (read with the shared S3 client, no presigned
+    URL round trip) takes precedence over a plain URL.
+    """
+    if file_key:
+        return object_url(file_key)
+    if file_url:
+        return file_url
+    raise HTTPException(status_code=400, detail="file_url or file_key is required")
+
+def resolve_ruleset(rules_id: str | None):
+    """Compiled rule set for a request, 400 when it does not exist or is invalid."""
+    try:
+        return load_ruleset(rules_id)
+    except RuleSetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-# Async Audit Endpoint (Background)
+def check_index_request(build_index: bool, file_key: str | None) -> None:
+    """The entity index is stored next to the object, so it needs an R2 source."""
+    if build_index and not file_key:
+        raise HTTPException(status_code=400, detail="build_index requires file_key")
+
+def check_revision_request(request) -> bool:
+    """
+    Whether the request asks for a revision audit. Fingerprints are stored
+    next to the object, so they need an R2 source, and the block-wise pass
+    cannot build an entity index at the same time.
+    """
+    revision = request.fingerprint or bool(request.previous_file_key)
+    if revision and not request.file_key:
+        raise HTTPException(status_code=400, detail="previous_file_key and fingerprint require file_key")
+    if revision and request.build_index:
+        raise HTTPException(status_code=400, detail="build_index cannot be combined with a revision audit")
+    return revision
+
+async def measured(audit):
+    """Await an audit and record its stages, bytes and memory in this process's metrics."""
+    result = await audit
+    observe_audit(result)
+    return result
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def ndjson_event(event: str, data: dict) -> str:
+    return json.dumps({"type": event, "data": data}) + "\n"
+
+STREAM_FORMATS = {
+    "ndjson": (ndjson_event, "application/x-ndjson"),
+    "sse": (sse_event, "text/event-stream"),
+}
+
+# Async Audit Endpoint (Job Queue)
 @app.post("/api/v1/audit", response_model=AuditResponse)
-async def trigger_audit(request: AuditRequest, background_tasks: BackgroundTasks):
+async def trigger_audit(request: AuditRequest):
     logger.info(f"Recibida solicitud de auditoría para archivo: {request.file_id}")
     
-    if not request.file_url:
-        raise HTTPException(status_code=400, detail="file_url is required")
+    source = resolve_audit_source(request.file_url, request.file_key)
+    resolve_ruleset(request.audit_rules_id)
+    check_index_request(request.build_index, request.file_key)
+    revision = check_revision_request(request)
 
-    background_tasks.add_task(process_cad_file, request.file_id, request.file_url)
+    try:
+        job = audit_jobs.submit(
+            request.file_id, source, request.audit_rules_id, request.build_index,
+            revision=revision, previous_file_key=request.previous_file_key
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     return {
-        "job_id": f"job-{request.file_id}",
-        "status": "queued",
-        "estimated_time": "15s"
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "queue_position": audit_jobs.queue_depth()
     }
 
+@app.get("/api/v1/audit/{job_id}")
+async def get_audit_job(job_id: str):
+    """
+    Job status with live progress (bytes and lines processed).
+    """
+    job = audit_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/v1/audit/{job_id}/cancel")
+async def cancel_audit_job(job_id: str):
+    """
+    Cancel a queued or running audit job.
+    """
+    job = audit_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 # Sync Audit Endpoint (Immediate Response)
 @app.post("/api/v1/audit/sync")
 async def sync_audit(request: SyncAuditRequest):
@@ -65,49 +199,358 @@ async def sync_audit(request: SyncAuditRequest):
     Synchronous audit - downloads file, processes, returns results immediately.
     Use for smaller files or when immediate feedback is needed.
     """
-    logger.info(f"Sync audit requested for: {request.file_url}")
+    source = resolve_audit_source(request.file_url, request.file_key)
+    rules = resolve_ruleset(request.audit_rules_id)
+    check_index_request(request.build_index, request.file_key)
+    revision = check_revision_request(request)
+    logger.info(f"Sync audit requested for: {source}")
+
+    if request.stream is not None:
+        if request.stream not in STREAM_FORMATS:
+            raise HTTPException(status_code=400, detail="stream must be 'ndjson' or 'sse'")
+        if revision or request.parallel:
+            raise HTTPException(status_code=400, detail="stream is only available for the sequential streaming audit")
+        return streamed_sync_audit(request, source, rules)
     
     try:
-        # Use streaming audit for memory-efficient processing of large files
-        from core.streaming_audit import stream_audit_large_dxf
-        result = await stream_audit_large_dxf(request.file_url)
-        return result
+        # Slots shared with batch requests: a global cap and one per source host
+        async with audit_limiter.slot(source):
+            if revision:
+                # The delta depends on the previous revision, so it is not cached
+                from core.revision_audit import revision_audit_large_dxf
+                return await measured(revision_audit_large_dxf(source, request.previous_file_key, rules_id=request.audit_rules_id))
+
+            if request.build_index:
+                # Index rows come from one sequential pass over the whole file. Not cached:
+                # the same content under another file_key still needs its own index
+                from core.streaming_audit import stream_audit_large_dxf
+                return await measured(stream_audit_large_dxf(source, rules_id=request.audit_rules_id, build_index=True))
+
+            if request.parallel:
+                from core.parallel_audit import parallel_audit_large_dxf as audit
+                options = {}
+            else:
+                # Use streaming audit for memory-efficient processing of large files
+                from core.streaming_audit import stream_audit_large_dxf as audit
+                options = {'client': get_http_client()}
+
+            # Both paths produce the same report, so they share cache entries
+            result = await cached_audit(
+                'stream', source, lambda: measured(audit(source, rules_id=request.audit_rules_id, **options)), rules.fingerprint
+            )
+            return result
     except Exception as e:
         logger.error(f"Sync audit failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def streamed_sync_audit(request: SyncAuditRequest, source: str, rules) -> StreamingResponse:
+    """
+    Sync audit that reports while it runs: `progress` events (bytes and lines
+    processed, section, running entity counts), `issue` events as findings
+    become certain, then `report` with the full result, or `error`. A client
+    that disconnects cancels the audit, which stops reading and parsing at
+    the next chunk. A cached result comes back as a lone `report`.
+    """
+    from core.streaming_audit import stream_audit_large_dxf
+    format_event, media_type = STREAM_FORMATS[request.stream]
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def on_event(event: str, data: dict) -> None:
+        queue.put_nowait((event, data))
+
+    async def run() -> dict:
+        def audit():
+            return measured(stream_audit_large_dxf(
+                source, rules_id=request.audit_rules_id, build_index=request.build_index,
+                client=get_http_client(), on_event=on_event
+            ))
+
+        try:
+            async with audit_limiter.slot(source):
+                if request.build_index:
+                    # Not cached: the index must be stored under this file_key
+                    return await audit()
+                return await cached_audit('stream', source, audit, rules.fingerprint)
+        finally:
+            queue.put_nowait(None)
+
+    async def events():
+        task = asyncio.create_task(run())
+        try:
+            while (item := await queue.get()) is not None:
+                yield format_event(*item)
+            try:
+                result = task.result()
+            except Exception as e:
+                logger.error(f"Sync audit failed: {str(e)}")
+                yield format_event("error", {"message": str(e)})
+                return
+            yield format_event("report", result)
+        finally:
+            if not task.done():
+                logger.info(f"Client gone, cancelling sync audit of {source[:100]}")
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/v1/audit/batch")
+async def batch_audit(request: BatchAuditRequest):
+    """
+    Audit many files (the sheets of a project) in one request, under the
+    same concurrency caps as sync audits. Results stream back as NDJSON in
+    completion order, one line per file ({"type": "result", "index",
+    "file_id", "seconds", "result"}), then a project rollup line
+    ({"type": "rollup"}: score distribution, most common issue codes,
+    layer-standard compliance across sheets).
+    """
+    if not request.files:
+        raise HTTPException(status_code=400, detail="files is required")
+    if len(request.files) > AUDIT_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {AUDIT_BATCH_MAX_FILES} files per batch")
+    rules = resolve_ruleset(request.audit_rules_id)
+    sources = [
+        {'index': i, 'file_id': item.file_id, 'source': resolve_audit_source(item.file_url, item.file_key)}
+        for i, item in enumerate(request.files)
+    ]
+    logger.info(f"Batch audit requested for {len(sources)} files")
+
+    async def audit(source: str) -> dict:
+        # Parsed in the worker pool: the loop only probes the cache and writes lines
+        return await cached_audit(
+            'stream', source, lambda: measured(audit_in_pool(source, request.audit_rules_id)), rules.fingerprint
+        )
+
+    async def lines():
+        async for record in run_batch(sources, audit, rules):
+            yield json.dumps(record) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/api/v1/audit/cache/stats")
+async def audit_cache_stats():
+    """
+    Hit/miss counters and size of the audit result cache.
+    """
+    return audit_cache.stats()
+
+
+@app.get("/api/v1/audit/memory/stats")
+async def audit_memory_stats():
+    """
+    Peak memory of the audits run so far (streaming and revision audits,
+    background jobs included) and the current RSS of the API process.
+    """
+    return audit_memory.stats()
+
+
+@app.get("/api/v1/traces")
+async def list_traces(
+    limit: int = Query(50, ge=1, le=200),
+    min_duration_ms: float = Query(0.0, ge=0)
+):
+    """
+    Latest request traces, newest first: each span (audit stages, R2 and
+    Gemini calls) with its parent, start offset and duration. The X-Trace-Id
+    response header names the trace of a request.
+    """
+    return {"traces": recent_traces(limit, min_duration_ms)}
+
+
+# ============================================================================
+# ENTITY INDEX (follow-up queries without re-parsing)
+# ============================================================================
+import asyncio
+from typing import List
+from core.entity_index import forget_entity_index, index_key, load_entity_index
+from core.revision_audit import fingerprint_key
+from core.spatial_index import index_conflicts
+
+# Rows returned per page at most
+INDEX_PAGE_LIMIT = 1000
+
+async def get_entity_index(file_key: str):
+    try:
+        index = await load_entity_index(file_key)
+    except Exception as e:
+        logger.error(f"Entity index could not be loaded: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if index is None:
+        raise HTTPException(status_code=404, detail="Índice no encontrado. Ejecute la auditoría con build_index.")
+    return index
+
+def parse_window(bbox: str | None):
+    """'min_x,min_y,max_x,max_y' -> tuple of floats."""
+    if bbox is None:
+        return None
+    try:
+        window = tuple(float(v) for v in bbox.split(','))
+    except ValueError:
+        window = ()
+    if len(window) != 4 or window[0] > window[2] or window[1] > window[3]:
+        raise HTTPException(status_code=400, detail="bbox must be min_x,min_y,max_x,max_y")
+    return window
+
+@app.get("/api/v1/index/layers")
+async def index_layers(
+    file_key: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=INDEX_PAGE_LIMIT)
+):
+    """
+    Every layer of an indexed drawing with its entity counts, paginated.
+    """
+    index = await get_entity_index(file_key)
+    return index.layer_page(offset, limit)
+
+@app.get("/api/v1/index/entities")
+async def index_entities(
+    file_key: str,
+    layer: List[str] | None = Query(None),
+    type: List[str] | None = Query(None),
+    bbox: str | None = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=INDEX_PAGE_LIMIT)
+):
+    """
+    Entities of an indexed drawing filtered by layer, entity type and/or a
+    spatial window (bbox=min_x,min_y,max_x,max_y), paginated.
+    """
+    window = parse_window(bbox)
+    index = await get_entity_index(file_key)
+    return index.query(layer, type, window, offset, limit)
+
+@app.get("/api/v1/index/conflicts")
+async def index_conflicts_check(
+    file_key: str,
+    clearance: float = Query(0.0, ge=0.0),
+    layer: List[str] | None = Query(None),
+    type: List[str] | None = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=INDEX_PAGE_LIMIT)
+):
+    """
+    Geometric conflicts among the selected entities of an indexed drawing:
+    overlapping extents, or with clearance > 0 pairs closer than that
+    distance without touching. Pairs come from a spatial grid, not n².
+    """
+    index = await get_entity_index(file_key)
+    return await asyncio.to_thread(index_conflicts, index, clearance, layer, type, offset, limit)
+
+
 # ============================================================================
 # GEMINI AI CHAT
 # ============================================================================
-from core.gemini_service import chat_with_gemini
+from core.chat_cache import chat_cache
+from core.chat_sessions import ChatSession, chat_sessions
+from core.gemini_service import GeminiNotConfigured, chat_in_session, stream_chat_in_session
 from typing import Optional, Dict, Any
 
 class ChatRequest(BaseModel):
     message: str
+    # Needed on the first turn only (or when the file changes): sessions keep it
     file_context: Optional[Dict[str, Any]] = None
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
     success: bool
+    session_id: Optional[str] = None
+
+def resolve_chat_session(request: ChatRequest) -> ChatSession:
+    """Session of a chat request: a new one without session_id, 404 once it expired."""
+    if request.session_id is None:
+        return chat_sessions.create(request.file_context)
+    session = chat_sessions.get(request.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    if request.file_context is not None:
+        session.file_context = request.file_context
+    return session
 
 @app.post("/api/v1/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
     AI Chat endpoint - restricted to CAD/BIM/Construction topics only.
     Optionally accepts file context for more relevant responses.
+    The conversation lives on the server: pass back the returned session_id
+    to continue it, without resending the history or the file context.
     """
     logger.info(f"Chat request: {request.message[:50]}...")
+    session = resolve_chat_session(request)
     
     try:
-        response = await chat_with_gemini(
-            user_message=request.message,
-            file_context=request.file_context
-        )
-        return {"response": response, "success": True}
+        response = await chat_in_session(session, request.message)
+        return {"response": response, "success": True, "session_id": session.session_id}
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
-        return {"response": f"Error: {str(e)}", "success": False}
+        return {"response": f"Error: {str(e)}", "success": False, "session_id": session.session_id}
+
+
+@app.get("/api/v1/chat/sessions/{session_id}")
+async def get_chat_session(session_id: str):
+    """
+    Turn counts and summary size of a chat session.
+    """
+    session = chat_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    return session.to_dict()
+
+
+@app.delete("/api/v1/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    """
+    End a chat session (a new conversation starts without session_id).
+    """
+    if not chat_sessions.remove(session_id):
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    return {"success": True}
+
+
+@app.get("/api/v1/chat/cache/stats")
+async def chat_cache_stats():
+    """
+    Hit/miss/coalesced counters and size of the chat response cache.
+    """
+    return chat_cache.stats()
+
+
+@app.post("/api/v1/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same as /api/v1/chat, but the answer is streamed as Server-Sent Events
+    while Gemini writes it: `token` events ({"text": ...}), then `done`
+    ({"session_id": ...}), or `error` ({"message": ...}) if the call fails.
+    """
+    logger.info(f"Chat stream request: {request.message[:50]}...")
+    session = resolve_chat_session(request)
+
+    async def events():
+        try:
+            async for text in stream_chat_in_session(session, request.message):
+                yield sse_event("token", {"text": text})
+        except GeminiNotConfigured as e:
+            yield sse_event("error", {"message": str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}")
+            yield sse_event("error", {"message": f"❌ Error al procesar tu pregunta: {str(e)}"})
+            return
+        yield sse_event("done", {"session_id": session.session_id})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # No caching nor proxy buffering: tokens must reach the browser as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # ============================================================================
@@ -169,6 +612,11 @@ async def delete_storage_file(file_key: str):
     
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete file")
+
+    # Entity index and revision fingerprint stored next to the drawing, if any
+    await delete_file(index_key(file_key))
+    forget_entity_index(file_key)
+    await delete_file(fingerprint_key(file_key))
     
     return {"success": True}
 
@@ -178,38 +626,118 @@ async def delete_storage_file(file_key: str):
 # ============================================================================
 from core.r2_multipart import (
     initiate_multipart_upload,
-    generate_part_upload_url,
+    generate_part_upload_urls,
+    list_uploaded_parts,
+    find_part_mismatch,
     complete_multipart_upload,
     abort_multipart_upload
 )
+from core.r2_presign import PART_URL_PAGE_SIZE
+from core.upload_sessions import MAX_PARTS, choose_part_size, upload_sessions
 
 class InitiateUploadRequest(BaseModel):
     filename: str
     content_type: str = 'application/octet-stream'
-    total_parts: int
+    file_size: Optional[int] = None  # When given, the server chooses the part size
+    total_parts: Optional[int] = None
 
 @app.post("/api/v1/storage/multipart/initiate")
 async def initiate_upload(request: InitiateUploadRequest):
     """
     Start a multipart upload for large files.
-    Returns upload_id, file_key, and presigned URLs for all parts.
+    Returns upload_id, file_key, the part size and presigned URLs for the first page of parts.
+    Remaining part URLs are fetched from /multipart/{upload_id}/parts.
     """
+    if request.file_size:
+        part_size = choose_part_size(request.file_size)
+        total_parts = -(-request.file_size // part_size)
+    elif request.total_parts:
+        part_size = None
+        total_parts = request.total_parts
+    else:
+        raise HTTPException(status_code=400, detail="file_size or total_parts is required")
+
+    if total_parts > MAX_PARTS:
+        raise HTTPException(status_code=400, detail=f"Too many parts (max {MAX_PARTS})")
+
     result = await initiate_multipart_upload(request.filename, request.content_type)
     
     if not result:
         raise HTTPException(status_code=500, detail="Failed to initiate multipart upload")
     
-    # Generate URLs for all parts
-    part_urls = []
-    for i in range(1, request.total_parts + 1):
-        url = await generate_part_upload_url(result['file_key'], result['upload_id'], i)
-        if url:
-            part_urls.append({'part_number': i, 'upload_url': url})
+    upload_sessions.create(result['upload_id'], result['file_key'], request.filename, request.file_size, part_size, total_parts)
+
+    # Sign only the first page so the response time does not grow with the part count
+    first_page = min(total_parts, PART_URL_PAGE_SIZE)
+    part_urls = generate_part_upload_urls(result['file_key'], result['upload_id'], 1, first_page) or []
     
     return {
         'upload_id': result['upload_id'],
         'file_key': result['file_key'],
+        'part_size': part_size,
         'part_urls': part_urls,
+        'total_parts': total_parts,
+        'page_size': PART_URL_PAGE_SIZE,
+        'success': True
+    }
+
+
+def resolve_upload_key(upload_id: str, file_key: Optional[str]) -> str:
+    """file_key from the request, or from the upload session."""
+    session = upload_sessions.get(upload_id)
+    if session:
+        return session['file_key']
+    if not file_key:
+        raise HTTPException(status_code=404, detail="Unknown upload session; file_key is required")
+    return file_key
+
+
+@app.get("/api/v1/storage/multipart/{upload_id}/parts")
+async def get_part_urls(
+    upload_id: str,
+    file_key: Optional[str] = None,
+    from_part: int = Query(1, alias="from", ge=1),
+    count: int = Query(PART_URL_PAGE_SIZE, ge=1, le=PART_URL_PAGE_SIZE)
+):
+    """
+    Presigned URLs for a page of parts, on demand.
+    """
+    file_key = resolve_upload_key(upload_id, file_key)
+    session = upload_sessions.get(upload_id)
+    if session:
+        count = max(0, min(count, session['total_parts'] - from_part + 1))
+
+    part_urls = generate_part_upload_urls(file_key, upload_id, from_part, count)
+    
+    if part_urls is None:
+        raise HTTPException(status_code=500, detail="Failed to generate part URLs")
+    
+    return {'upload_id': upload_id, 'part_urls': part_urls, 'success': True}
+
+
+@app.get("/api/v1/storage/multipart/{upload_id}/status")
+async def get_upload_status(upload_id: str, file_key: Optional[str] = None):
+    """
+    Resume support: which parts storage has already received.
+    The client re-uploads only the parts listed in missing_parts.
+    """
+    file_key = resolve_upload_key(upload_id, file_key)
+    uploaded = await list_uploaded_parts(file_key, upload_id)
+
+    if uploaded is None:
+        raise HTTPException(status_code=404, detail="Upload not found or already completed")
+
+    session = upload_sessions.get(upload_id) or {}
+    done = {p['PartNumber'] for p in uploaded}
+    total_parts = session.get('total_parts')
+    return {
+        'upload_id': upload_id,
+        'file_key': file_key,
+        'part_size': session.get('part_size'),
+        'total_parts': total_parts,
+        'uploaded_parts': uploaded,
+        'uploaded_bytes': sum(p['Size'] for p in uploaded),
+        'missing_parts': [n for n in range(1, total_parts + 1) if n not in done] if total_parts else None,
         'success': True
     }
 
@@ -217,22 +745,34 @@ async def initiate_upload(request: InitiateUploadRequest):
 class CompleteUploadRequest(BaseModel):
     file_key: str
     upload_id: str
-    parts: list  # [{'PartNumber': 1, 'ETag': 'xxx'}, ...]
+    parts: Optional[list] = None  # [{'PartNumber': 1, 'ETag': 'xxx'}, ...], checked against storage
 
 @app.post("/api/v1/storage/multipart/complete")
 async def complete_upload(request: CompleteUploadRequest):
     """
     Complete a multipart upload after all parts have been uploaded.
+    The part list is taken from storage (list_parts), not from the client.
     """
+    uploaded = await list_uploaded_parts(request.file_key, request.upload_id)
+
+    if uploaded is None:
+        raise HTTPException(status_code=500, detail="Failed to list uploaded parts")
+
+    session = upload_sessions.get(request.upload_id) or {}
+    problem = find_part_mismatch(uploaded, request.parts, session.get('total_parts'))
+    if problem:
+        raise HTTPException(status_code=409, detail=problem)
+
     success = await complete_multipart_upload(
         request.file_key,
         request.upload_id,
-        request.parts
+        [{'PartNumber': p['PartNumber'], 'ETag': p['ETag']} for p in uploaded]
     )
     
     if not success:
         raise HTTPException(status_code=500, detail="Failed to complete multipart upload")
     
+    upload_sessions.remove(request.upload_id)
     return {"success": True, "file_key": request.file_key}
 
 
@@ -246,6 +786,7 @@ async def abort_upload(request: AbortUploadRequest):
     Abort a multipart upload (cleanup).
     """
     await abort_multipart_upload(request.file_key, request.upload_id)
+    upload_sessions.remove(request.upload_id)
     return {"success": True}
 
 
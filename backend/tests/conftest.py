@@ -0,0 +1,43 @@
+"""
+Shared test fixtures: sample drawings and an in-memory S3 standing in for R2.
+"""
+
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import core.r2_client as r2_client
+from benchmarks.dxf_generator import DrawingGenerator
+from core.r2_client import R2_BUCKET
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_sample.dxf')
+
+
+@pytest.fixture(scope='session')
+def sample_dxf() -> bytes:
+    """The small drawing shipped with the backend."""
+    with open(SAMPLE_PATH, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture(scope='session')
+def drawing() -> bytes:
+    """A synthetic drawing of about 6 MB with tables, blocks and a few hundred layers."""
+    return b''.join(DrawingGenerator(6 * 1024 * 1024, layers=300, seed=3).iter_bytes())
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """Moto S3 installed as the shared R2 client, with the bucket created."""
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+        monkeypatch.setenv(name, 'testing')
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=R2_BUCKET)
+        monkeypatch.setattr(r2_client, 'R2_ENDPOINT', 'https://r2.test')
+        monkeypatch.setattr(r2_client, 'R2_ACCESS_KEY_ID', 'testing')
+        monkeypatch.setattr(r2_client, 'R2_SECRET_ACCESS_KEY', 'testing')
+        monkeypatch.setattr(r2_client, '_client', client)
+        yield client
@@ -0,0 +1,15 @@
+"""
+Test helpers shared by several test modules.
+"""
+
+from core.audit_rules import load_ruleset
+from core.streaming_audit import DxfStreamAuditor
+
+
+def audit_bytes(data: bytes, chunk_size: int = 64 * 1024, rules_id=None) -> dict:
+    """Sequential streaming audit of `data`, fed in chunks of `chunk_size`."""
+    auditor = DxfStreamAuditor(rules=load_ruleset(rules_id))
+    for start in range(0, len(data), chunk_size):
+        auditor.feed(data[start:start + chunk_size])
+    auditor.close()
+    return auditor.build_report()
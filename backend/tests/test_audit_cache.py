@@ -0,0 +1,115 @@
+"""
+Audit result cache: how sources are identified, when results are reused
+and how both tiers stay within their bounds.
+"""
+
+import asyncio
+import os
+
+import httpx
+import pytest
+
+import core.audit_cache as audit_cache_module
+from core.audit_cache import AuditResultCache, cached_audit, resolve_content_id
+from core.r2_client import R2_BUCKET
+from core.r2_reader import object_url
+
+
+@pytest.fixture
+def http_server(monkeypatch):
+    """
+    URLs answered by a mock server: `headers[path]` are the response headers
+    of a path. Yields that dict.
+    """
+    headers = {}
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(206, headers={'content-range': 'bytes 0-0/1000', **headers.get(request.url.path, {})}, content=b'0')
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+    monkeypatch.setattr(audit_cache_module, 'get_http_client', lambda: client)
+    yield headers
+
+
+def content_id(url: str):
+    return asyncio.run(resolve_content_id(url))
+
+
+def test_url_id_holds_the_path_and_strong_etag(http_server):
+    http_server['/a.dxf'] = {'etag': '"abc"'}
+    http_server['/b.dxf'] = {'etag': '"abc"'}
+    first = content_id('https://files.test/a.dxf?X-Amz-Signature=1')
+
+    assert first == 'url:https://files.test/a.dxf|etag:abc:1000'
+    # Presigned query strings change, the object does not
+    assert content_id('https://FILES.test/a.dxf?X-Amz-Signature=2') == first
+    # Made-up ETags can repeat across paths and hosts
+    assert content_id('https://files.test/b.dxf') != first
+    assert content_id('https://other.test/a.dxf') != first
+
+
+@pytest.mark.parametrize('headers', ({'etag': 'W/"abc"'}, {}))
+def test_url_without_a_strong_etag_is_not_cached(http_server, headers):
+    http_server['/a.dxf'] = headers
+    assert content_id('https://files.test/a.dxf') is None
+
+
+def test_bucket_objects_are_identified_by_content(s3):
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/a.dxf', Body=b'same')
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/b.dxf', Body=b'same')
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/c.dxf', Body=b'other')
+    a, b, c = (content_id(object_url(f'projects/{name}.dxf')) for name in 'abc')
+    assert a == b != c
+    assert content_id(object_url('projects/missing.dxf')) is None
+
+
+def test_results_are_reused_per_rule_set(s3, monkeypatch):
+    monkeypatch.setattr(audit_cache_module, 'audit_cache', AuditResultCache(cache_dir=None))
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/a.dxf', Body=b'drawing')
+    runs = []
+
+    async def audit():
+        runs.append(1)
+        return {'status': 'pass' if len(runs) > 1 else 'error'}
+
+    def run(fingerprint):
+        return asyncio.run(cached_audit('stream', object_url('projects/a.dxf'), audit, fingerprint))
+
+    # Errors are not kept
+    assert run('rules-1')['status'] == 'error'
+    assert run('rules-1')['status'] == 'pass'
+    assert run('rules-1')['status'] == 'pass'
+    assert len(runs) == 2
+    run('rules-2')
+    assert len(runs) == 3
+
+
+def test_memory_tier_is_a_bounded_lru():
+    cache = AuditResultCache(max_entries=2, cache_dir=None)
+    cache.put('a', {'n': 1})
+    cache.put('b', {'n': 2})
+    cache.get('a')
+    cache.put('c', {'n': 3})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'n': 1}
+
+    # Callers get copies
+    cache.get('a')['n'] = 99
+    assert cache.get('a') == {'n': 1}
+
+
+def test_disk_tier_survives_restarts_and_evicts_oldest(tmp_path):
+    cache = AuditResultCache(max_entries=1, cache_dir=str(tmp_path), max_bytes=150)
+    for index, key in enumerate('abc'):
+        cache.put(key, {'padding': 'x' * 40})
+        os.utime(tmp_path / f'{key}.json', (index, index))
+    assert sorted(os.listdir(tmp_path)) == ['b.json', 'c.json']
+    assert cache.counters['evictions'] == 1
+
+    restarted = AuditResultCache(max_entries=1, cache_dir=str(tmp_path), max_bytes=150)
+    assert restarted.get('b') == {'padding': 'x' * 40}
+    assert restarted.counters['disk_hits'] == 1
+
+    (tmp_path / 'c.json').write_text('{not json')
+    assert restarted.get('c') is None
+    assert not (tmp_path / 'c.json').exists()
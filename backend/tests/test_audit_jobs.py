@@ -0,0 +1,105 @@
+"""
+Audit job queue on moto S3, with worker threads standing in for the worker
+processes: job states, cancellation and the bounded queue.
+"""
+
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import core.audit_cache as audit_cache_module
+from core.audit_cache import AuditResultCache
+from core.audit_jobs import (
+    JOB_ERROR, JOB_PROCESSED, JOB_PROCESSING, JOB_QUEUED, AuditJobManager, QueueFullError
+)
+from core.r2_client import R2_BUCKET
+from core.r2_reader import object_url
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MIGRATION = os.path.join(REPO_ROOT, 'supabase', 'migrations', '20241226000000_init.sql')
+
+
+def enum_values(name: str) -> set:
+    """Values of a Postgres enum declared in the initial migration."""
+    with open(MIGRATION) as f:
+        match = re.search(rf"create type {name} as enum \(([^)]*)\)", f.read())
+    return set(re.findall(r"'([^']+)'", match.group(1)))
+
+
+@pytest.fixture
+def storage(s3, monkeypatch):
+    monkeypatch.setattr(audit_cache_module, 'audit_cache', AuditResultCache(cache_dir=None))
+    return s3
+
+
+def run_jobs(manager: AuditJobManager, queue, before_start=None) -> list:
+    """
+    Submit `queue` (file_id, file_key) pairs, optionally act on the queued
+    jobs, then let one worker drain the queue.
+    """
+    async def run():
+        manager._queue = asyncio.Queue(maxsize=manager.queue_size)
+        manager._pool = ThreadPoolExecutor(max_workers=1)
+        manager._progress, manager._cancelled = {}, {}
+        jobs = [manager.submit(file_id, object_url(file_key)) for file_id, file_key in queue]
+        if before_start is not None:
+            before_start(jobs)
+        worker = asyncio.create_task(manager._worker_loop(0))
+        await manager._queue.join()
+        worker.cancel()
+        manager._pool.shutdown()
+        return jobs
+
+    return asyncio.run(run())
+
+
+def test_job_states_are_upload_status_values():
+    states = {JOB_QUEUED, JOB_PROCESSING, JOB_PROCESSED, JOB_ERROR}
+    assert states <= enum_values('upload_status')
+
+
+def test_queued_job_is_audited(storage, sample_dxf):
+    storage.put_object(Bucket=R2_BUCKET, Key='projects/a.dxf', Body=sample_dxf)
+    seen = []
+    job, = run_jobs(AuditJobManager(workers=1), [('file-a', 'projects/a.dxf')], lambda jobs: seen.append(dict(jobs[0])))
+
+    assert (seen[0]['status'], seen[0]['audit_status']) == (JOB_QUEUED, 'pending')
+    assert job['status'] == JOB_PROCESSED
+    assert job['audit_status'] in enum_values('audit_status') - {'pending'}
+    assert job['audit_status'] == job['result']['status']
+    assert job['started_at'] and job['finished_at']
+
+
+def test_missing_file_ends_in_error(storage):
+    job, = run_jobs(AuditJobManager(workers=1), [('file-a', 'projects/missing.dxf')])
+    assert job['status'] == JOB_ERROR
+    assert job['error']
+    assert job['audit_status'] == 'pending'
+
+
+def test_cancelled_job_is_never_run(storage, sample_dxf):
+    storage.put_object(Bucket=R2_BUCKET, Key='projects/a.dxf', Body=sample_dxf)
+    manager = AuditJobManager(workers=1)
+    queue = [('file-a', 'projects/a.dxf'), ('file-b', 'projects/a.dxf')]
+    first, second = run_jobs(manager, queue, lambda jobs: manager.cancel(jobs[0]['job_id']))
+
+    assert (first['status'], first['cancelled'], first['started_at']) == (JOB_ERROR, True, None)
+    assert second['status'] == JOB_PROCESSED
+
+
+def test_full_queue_rejects_jobs():
+    manager = AuditJobManager(workers=1, queue_size=2)
+
+    async def fill():
+        manager._queue = asyncio.Queue(maxsize=manager.queue_size)
+        for index in range(2):
+            manager.submit(f'file-{index}', object_url('projects/a.dxf'))
+        with pytest.raises(QueueFullError):
+            manager.submit('file-2', object_url('projects/a.dxf'))
+
+    asyncio.run(fill())
+    assert manager.queue_depth() == 2
+    assert len(manager.jobs) == 2
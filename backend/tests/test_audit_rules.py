@@ -0,0 +1,98 @@
+"""
+Rule sets: validation when they are compiled, value checks run during the
+streaming pass, custom messages and scoring.
+"""
+
+import re
+
+import pytest
+
+from core.audit_rules import RuleSetError, compile_ruleset, load_ruleset
+from core.streaming_audit import DxfStreamAuditor
+
+
+def ruleset(*rules, **spec):
+    return compile_ruleset({'rules': list(rules), **spec})
+
+
+def audit_with(rules, data: bytes) -> dict:
+    auditor = DxfStreamAuditor(rules=rules)
+    auditor.feed(data)
+    auditor.close()
+    return auditor.build_report()
+
+
+def entities(*lines) -> bytes:
+    """ENTITIES section with one LINE per (layer, lineweight)."""
+    body = b''
+    for layer, lineweight in lines:
+        body += f"  0\nLINE\n  8\n{layer}\n370\n{lineweight}\n 10\n0.0\n 20\n0.0\n 11\n1.0\n 21\n1.0\n".encode()
+    return b"  0\nSECTION\n  2\nENTITIES\n" + body + b"  0\nENDSEC\n  0\nEOF\n"
+
+
+@pytest.mark.parametrize('ruleset_id', ('default', 'arquitectura'))
+def test_shipped_rule_sets_compile(ruleset_id):
+    assert load_ruleset(ruleset_id).rules
+
+
+@pytest.mark.parametrize('ruleset_id', ('no-such-set', '../default', 'a b'))
+def test_unknown_rule_set_ids_are_rejected(ruleset_id):
+    with pytest.raises(RuleSetError):
+        load_ruleset(ruleset_id)
+
+
+@pytest.mark.parametrize('rule, problem', [
+    ({'id': 'R', 'type': 'no_such_type'}, 'unknown type'),
+    ({'id': 'R', 'type': 'layer_color', 'layer': 'MUROS'}, 'missing color'),
+    ({'id': 'R', 'type': 'required_layer', 'layers': ['A'], 'severity': 'critical'}, 'severity must be one of'),
+    ({'id': 'R', 'type': 'layer_name', 'pattern': '[A-'}, 'invalid pattern'),
+    ({'id': 'R', 'type': 'entity_value', 'entity': 'LINE', 'group_code': 370}, 'needs min, max or allowed'),
+    ({'id': 'R', 'type': 'entity_value', 'entity': 'LINE', 'group_code': '370', 'max': 1}, 'group_code must be'),
+    ({'id': 'R', 'type': 'required_layer', 'layers': ['A'], 'message': 'Falta {layer}'}, 'unknown message placeholder(s) {layer}'),
+    ({'id': 'R', 'type': 'required_layer', 'layers': ['A'], 'message': 'Falta {layers.__class__}'}, 'unknown message placeholder'),
+    ({'id': 'R', 'type': 'required_layer', 'layers': ['A'], 'message': 'Falta {}'}, 'unknown message placeholder'),
+    ({'id': 'R', 'type': 'required_layer', 'layers': ['A'], 'message': 'Falta {layers'}, 'invalid message'),
+])
+def test_invalid_rules_are_rejected(rule, problem):
+    with pytest.raises(RuleSetError, match=re.escape(problem)):
+        ruleset(rule)
+
+
+def test_duplicate_rule_ids_are_rejected():
+    rule = {'id': 'R', 'type': 'required_layer', 'layers': ['A']}
+    with pytest.raises(RuleSetError, match='unique'):
+        ruleset(rule, rule)
+
+
+def test_value_rules_count_offending_entities():
+    rules = ruleset(
+        {'id': 'GROSOR', 'type': 'entity_value', 'entity': 'LINE', 'group_code': 370, 'allowed': [-1, 25, 50]},
+        {'id': 'GROSOR_MAX', 'type': 'entity_value', 'entity': '*', 'group_code': 370, 'max': 40,
+         'message': '{count} grosor(es) mayores de 0.40 mm en {entity}', 'severity': 'fail'},
+    )
+    report = audit_with(rules, entities(('A', 25), ('A', 50), ('A', 60), ('A', 'grueso'), ('A', -1)))
+    issues = {issue['rule']: issue for issue in report['details'] if issue['severity'] != 'pass'}
+
+    assert set(issues) == {'GROSOR', 'GROSOR_MAX'}
+    assert issues['GROSOR']['message'].startswith('2 valor(es) del código 370')
+    # Values that are not numbers fail range checks as well
+    assert issues['GROSOR_MAX']['message'] == '3 grosor(es) mayores de 0.40 mm en *'
+
+
+def test_penalties_and_status_thresholds():
+    rules = ruleset(
+        {'id': 'CAPAS', 'type': 'required_layer', 'layers': ['MUROS'], 'severity': 'fail'},
+        {'id': 'BLOQUES', 'type': 'required_block', 'blocks': ['ROTULO'], 'penalty': 1},
+        scoring={'penalties': {'fail': 40}, 'pass_score': 90},
+    )
+    issues = {rule['id']: {'rule': rule['id'], 'severity': rule['severity']} for rule in rules.rules}
+    assert rules.score([]) == (100, 'pass')
+    assert rules.score([issues['BLOQUES']]) == (99, 'pass')
+    assert rules.score([issues['CAPAS']]) == (60, 'warning')
+    assert rules.score([issues['CAPAS'], issues['CAPAS'], issues['BLOQUES']]) == (19, 'fail')
+
+
+def test_fingerprint_follows_the_rule_set_contents():
+    rule = {'id': 'R', 'type': 'required_layer', 'layers': ['A']}
+    assert ruleset(rule).fingerprint == ruleset(dict(rule)).fingerprint
+    assert ruleset(rule).fingerprint != ruleset({**rule, 'layers': ['B']}).fingerprint
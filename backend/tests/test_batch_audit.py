@@ -0,0 +1,100 @@
+"""
+Batch audits: concurrency caps, the project rollup and the HTTP client
+a worker process keeps across the files it audits.
+"""
+
+import asyncio
+from collections import Counter
+
+import httpx
+import pytest
+
+import core.batch_audit as batch_audit
+import core.http_client as http_client
+import core.worker_pool as worker_pool
+from core.audit_rules import load_ruleset
+from core.batch_audit import AuditLimiter, audit_source, run_batch
+
+
+@pytest.fixture
+def worker_process(monkeypatch, sample_dxf):
+    """
+    This process set up as a fresh audit worker whose HTTP clients serve
+    `sample_dxf` for any URL. Yields the list of clients created.
+    """
+    created = []
+    real_client = httpx.AsyncClient
+
+    def client(**kwargs):
+        created.append(real_client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=sample_dxf)), **kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(httpx, 'AsyncClient', client)
+    monkeypatch.setattr(http_client, '_client', None)
+    monkeypatch.setattr(worker_pool, '_worker_loop', None)
+    yield created
+    if worker_pool._worker_loop is not None:
+        worker_pool._worker_loop.run_until_complete(http_client.close_http_client())
+        worker_pool._worker_loop.close()
+
+
+def test_worker_reuses_its_http_client(worker_process):
+    results = [audit_source(f'https://files.test/sheet-{i}.dxf') for i in range(3)]
+    assert [result['status'] for result in results] == [results[0]['status']] * 3
+    assert results[0]['status'] != 'error'
+    assert len(worker_process) == 1
+
+
+def fake_result(status: str, score: int, rule_ids) -> dict:
+    rules = {rule['id']: rule for rule in load_ruleset(None).rules}
+    details = [{'code': rules[r]['code'], 'severity': rules[r]['severity'], 'rule': r, 'message': ''} for r in rule_ids]
+    return {'status': status, 'summary': {'score': score}, 'details': details}
+
+
+def collect(sources, audit) -> list:
+    async def run():
+        return [record async for record in run_batch(sources, audit, load_ruleset(None))]
+    return asyncio.run(run())
+
+
+def test_batch_respects_caps_and_rolls_up(monkeypatch):
+    monkeypatch.setattr(batch_audit, 'audit_limiter', AuditLimiter(total=3, per_host=2))
+    sources = [
+        {'index': i, 'file_id': f'f{i}', 'source': source}
+        for i, source in enumerate(
+            [f'https://a.test/{i}.dxf' for i in range(4)]
+            + [f'https://b.test/{i}.dxf' for i in range(4)]
+            + ['r2://projects/x.dxf', 'r2://projects/broken.dxf']
+        )
+    ]
+    results = {
+        'https://a.test/0.dxf': fake_result('fail', 40, ['MUROS_COLOR', 'LAYER_DEFAULT']),
+        'https://b.test/0.dxf': fake_result('warning', 55, ['SCALE_LARGE']),
+    }
+    active, peak = Counter(), Counter()
+
+    async def audit(source):
+        host = batch_audit.source_host(source)
+        active.update((host, 'all'))
+        for key in (host, 'all'):
+            peak[key] = max(peak[key], active[key])
+        await asyncio.sleep(0.01)
+        active.subtract((host, 'all'))
+        if source.endswith('broken.dxf'):
+            raise RuntimeError('corrupt')
+        return results.get(source, fake_result('pass', 100, []))
+
+    records = collect(sources, audit)
+
+    assert [record['type'] for record in records] == ['result'] * 10 + ['rollup']
+    assert sorted(record['index'] for record in records[:-1]) == list(range(10))
+    assert max(peak['a.test'], peak['b.test'], peak['r2']) == 2
+    assert peak['all'] == 3
+
+    rollup = records[-1]
+    assert (rollup['files'], rollup['audited'], rollup['errors']) == (10, 9, 1)
+    assert rollup['score']['min'] == 40 and rollup['score']['max'] == 100
+    assert {issue['code'] for issue in rollup['top_issues']} == {'WRONG_COLOR', 'LAYER_DEFAULT', 'SCALE_LARGE'}
+    # SCALE_LARGE is not a layer-standard rule
+    assert rollup['layer_standard']['compliant_sheets'] == 8
+    assert rollup['layer_standard']['failing_sheets_by_rule'] == {'MUROS_COLOR': 1, 'LAYER_DEFAULT': 1}
@@ -0,0 +1,157 @@
+"""
+Chat response cache: request coalescing, TTL and LRU, directly and through
+the chat service running on the fake Gemini backend (core.gemini_fake).
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import core.chat_cache as chat_cache_module
+import core.gemini_fake as gemini_fake
+import core.gemini_service as gemini_service
+from core.chat_cache import ChatResponseCache, chat_cache_key
+from core.gemini_fake import FakeGenerativeModel
+
+QUESTION = "¿Cuántas capas tiene el plano?"
+
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fast_fake(monkeypatch):
+    monkeypatch.setattr(gemini_fake, 'GEMINI_FAKE_LATENCY_MS', 50)
+    monkeypatch.setattr(gemini_fake, 'GEMINI_FAKE_CHUNK_MS', 0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(chat_cache_module, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def ask(model: FakeGenerativeModel, question: str = QUESTION):
+    async def call() -> str:
+        response = await model.start_chat().send_message_async(question)
+        return response.text
+    return call
+
+
+def test_key_ignores_case_accents_spacing_and_punctuation():
+    assert chat_cache_key(QUESTION, 'ctx', 'm') == chat_cache_key("  cuantas CAPAS tiene el   plano ", 'ctx', 'm')
+    assert chat_cache_key(QUESTION, 'ctx', 'm') != chat_cache_key(QUESTION, 'other', 'm')
+
+
+def test_concurrent_identical_questions_share_one_call():
+    cache = ChatResponseCache()
+    model = FakeGenerativeModel('fake')
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_call('k', ask(model)) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert model.calls == 1
+    assert len({answer for answer, _ in results}) == 1
+    assert sorted(source for _, source in results) == ['coalesced'] * 9 + ['model']
+    assert cache.stats()['in_flight'] == 0
+
+    answer, source = asyncio.run(cache.get_or_call('k', ask(model)))
+    assert (source, model.calls) == ('cache', 1)
+
+
+def test_answers_expire_after_the_ttl(clock):
+    cache = ChatResponseCache(ttl=60)
+    model = FakeGenerativeModel('fake')
+    asyncio.run(cache.get_or_call('k', ask(model)))
+
+    clock.now += 59
+    assert asyncio.run(cache.get_or_call('k', ask(model)))[1] == 'cache'
+    clock.now += 2
+    assert asyncio.run(cache.get_or_call('k', ask(model)))[1] == 'model'
+    assert model.calls == 2
+    assert cache.counters['expired'] == 1
+
+
+def test_zero_ttl_disables_storing():
+    cache = ChatResponseCache(ttl=0)
+    model = FakeGenerativeModel('fake')
+    asyncio.run(cache.get_or_call('k', ask(model)))
+    asyncio.run(cache.get_or_call('k', ask(model)))
+    assert model.calls == 2
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = ChatResponseCache(max_entries=2)
+    for key in ('a', 'b'):
+        cache.put(key, key)
+    cache.get('a')
+    cache.put('c', 'c')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'a' and cache.get('c') == 'c'
+    assert cache.counters['evictions'] == 1
+
+
+def test_failed_call_fails_every_waiter_and_is_not_cached():
+    cache = ChatResponseCache()
+    calls = []
+
+    async def failing() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_call('k', failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get('k') is None
+    assert asyncio.run(cache.get_or_call('k', ask(FakeGenerativeModel('fake'))))[1] == 'model'
+
+
+@pytest.fixture
+def fake_service(monkeypatch):
+    """Chat service on the fake backend with an empty cache and model registry."""
+    monkeypatch.setattr(gemini_service, 'GEMINI_BACKEND', 'fake')
+    monkeypatch.setattr(gemini_service, 'chat_cache', ChatResponseCache())
+    monkeypatch.setattr(gemini_service, '_models', type(gemini_service._models)())
+    return gemini_service
+
+
+def model_calls(service) -> int:
+    return sum(model.calls for model in service._models.values())
+
+
+def test_service_coalesces_concurrent_questions(fake_service):
+    file_context = {'filename': 'plano.dxf', 'layers': [{'name': 'MUROS', 'entity_count': 10}]}
+
+    async def run():
+        return await asyncio.gather(*(
+            fake_service.chat_with_gemini(QUESTION, file_context) for _ in range(10)
+        ))
+
+    answers = asyncio.run(run())
+    assert len(set(answers)) == 1 and answers[0].startswith("Respuesta de prueba")
+    assert model_calls(fake_service) == 1
+    assert fake_service.chat_cache.counters['coalesced'] == 9
+
+    # Another file is another context: no shared answer
+    asyncio.run(fake_service.chat_with_gemini(QUESTION, {'filename': 'otro.dxf', 'layers': []}))
+    assert model_calls(fake_service) == 2
+
+
+def test_service_refuses_off_topic_questions_locally(fake_service):
+    answer = asyncio.run(fake_service.chat_with_gemini("Cuéntame un chiste de fútbol"))
+    assert answer == fake_service.OFF_TOPIC_REPLY
+    assert model_calls(fake_service) == 0
@@ -0,0 +1,118 @@
+"""
+Server-side chat sessions: bounded history with a running summary, the
+session store's limits, and conversations through the API on the fake
+Gemini backend (core.gemini_fake).
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import core.chat_sessions as chat_sessions_module
+import core.gemini_fake as gemini_fake
+import core.gemini_service as gemini_service
+from core.chat_cache import ChatResponseCache
+from core.chat_sessions import ChatSession, ChatSessionStore
+
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(chat_sessions_module, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_old_turns_are_folded_into_the_summary(monkeypatch):
+    monkeypatch.setattr(chat_sessions_module, 'CHAT_HISTORY_TURNS', 2)
+    session = ChatSession('s', None)
+    for i in range(5):
+        session.add_turn(f"Pregunta {i}", f"Respuesta {i}. Detalle largo que no entra en el resumen.")
+
+    assert [turn['question'] for turn in session.turns] == ['Pregunta 3', 'Pregunta 4']
+    assert session.summary.split('\n') == [f"- P: Pregunta {i} R: Respuesta {i}." for i in range(3)]
+    history = session.history()
+    assert history[0]['parts'][0].endswith(session.summary)
+    assert [item['role'] for item in history] == ['user', 'model'] * 3
+    assert session.to_dict()['turns'] == 5
+
+
+def test_summary_drops_its_oldest_lines(monkeypatch):
+    monkeypatch.setattr(chat_sessions_module, 'CHAT_HISTORY_TURNS', 0)
+    monkeypatch.setattr(chat_sessions_module, 'CHAT_SUMMARY_CHARS', 200)
+    session = ChatSession('s', None)
+    for i in range(20):
+        session.add_turn(f"Pregunta {i} " + 'x' * 300, "Sí.")
+    assert len(session.summary) <= 200
+    assert session.summary.startswith('- P: Pregunta 19')
+
+
+def test_store_keeps_the_most_recently_used_sessions(clock):
+    store = ChatSessionStore(limit=2, idle_seconds=60)
+    first, second = store.create(), store.create()
+    store.get(first.session_id)
+    third = store.create()
+    assert store.get(second.session_id) is None
+    assert store.get(first.session_id) is first and store.get(third.session_id) is third
+
+
+class HeldLock:
+    """Lock of a session whose turn is running."""
+
+    def locked(self) -> bool:
+        return True
+
+
+def test_idle_sessions_expire_unless_a_turn_is_running(clock):
+    store = ChatSessionStore(idle_seconds=60)
+    idle = store.create()
+    clock.now += 30
+    recent = store.create()
+    clock.now += 31
+    assert store.get(idle.session_id) is None
+    assert store.get(recent.session_id) is recent
+
+    recent.lock = HeldLock()
+    clock.now += 120
+    assert store.get(recent.session_id) is recent
+    assert len(store) == 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """API client on the fake chat backend with empty sessions and cache."""
+    from main import app
+
+    monkeypatch.setattr(gemini_fake, 'GEMINI_FAKE_LATENCY_MS', 0)
+    monkeypatch.setattr(gemini_fake, 'GEMINI_FAKE_CHUNK_MS', 0)
+    monkeypatch.setattr(gemini_service, 'GEMINI_BACKEND', 'fake')
+    monkeypatch.setattr(gemini_service, 'chat_cache', ChatResponseCache())
+    monkeypatch.setattr(gemini_service, '_models', type(gemini_service._models)())
+    monkeypatch.setattr('main.chat_sessions', ChatSessionStore())
+    return TestClient(app)
+
+
+def test_conversation_through_the_api(client):
+    file_context = {'filename': 'plano.dxf', 'layers': [{'name': 'MUROS', 'entity_count': 10}]}
+    first = client.post('/api/v1/chat', json={'message': '¿Cuántas capas tiene el plano?', 'file_context': file_context}).json()
+    assert first['success'] and first['session_id']
+
+    second = client.post('/api/v1/chat', json={'message': '¿Y cuántos muros?', 'session_id': first['session_id']}).json()
+    assert second['session_id'] == first['session_id']
+
+    info = client.get(f"/api/v1/chat/sessions/{first['session_id']}").json()
+    assert (info['turns'], info['has_file_context']) == (2, True)
+
+    assert client.delete(f"/api/v1/chat/sessions/{first['session_id']}").status_code == 200
+    response = client.post('/api/v1/chat', json={'message': '¿Y las columnas?', 'session_id': first['session_id']})
+    assert response.status_code == 404
@@ -0,0 +1,61 @@
+"""
+Robust extents of streamed coordinates: percentiles follow how often each
+value occurs, partial results merge exactly and outliers do not cost score.
+"""
+
+import numpy as np
+import pytest
+
+from core.audit_rules import load_ruleset
+from core.coordinate_stats import AxisStats
+
+
+def axis_of(values, sample_size: int = 8192, chunk: int = 1000) -> AxisStats:
+    axis = AxisStats(sample_size)
+    for start in range(0, len(values), chunk):
+        axis.pending.extend(values[start:start + chunk])
+        axis.flush()
+    return axis
+
+
+@pytest.mark.parametrize('distinct', (3, 5, 20))
+def test_few_distinct_values_still_leave_a_far_value_out(distinct):
+    values = [float(v) for v in range(distinct)] * 1000 + [1e7]
+    robust_min, robust_max, outliers = axis_of(values).robust_extent()
+    assert (robust_min, robust_max, outliers) == (0.0, distinct - 1, 1)
+
+
+def test_outliers_are_estimated_once_the_sample_is_full():
+    rng = np.random.default_rng(5)
+    values = list(rng.uniform(0, 100, 50000)) + list(rng.uniform(1e7, 2e7, 500))
+    rng.shuffle(values)
+    robust_min, robust_max, outliers = axis_of(values, sample_size=2048).robust_extent()
+    assert robust_max < 100
+    assert outliers == pytest.approx(500, rel=0.3)
+
+
+def test_merged_partials_match_one_pass():
+    rng = np.random.default_rng(7)
+    values = list(np.round(rng.normal(0, 50, 30000), 1)) + [5e6, -5e6]
+    whole = axis_of(values, sample_size=1024)
+
+    merged = AxisStats(1024)
+    for start in range(0, len(values), 7000):
+        merged.merge(axis_of(values[start:start + 7000], sample_size=1024))
+    for got, want in zip(merged.sample(), whole.sample()):
+        np.testing.assert_array_equal(got, want)
+    assert merged.robust_extent() == whole.robust_extent()
+
+
+def test_restored_partial_keeps_the_counts():
+    axis = axis_of([1.0] * 900 + [2.0] * 100 + [1e7])
+    _, values, counts = axis.sample()
+    restored = AxisStats.restore(axis.count, axis.min, axis.max, values, counts)
+    assert restored.robust_extent() == axis.robust_extent()
+
+
+def test_outliers_are_reported_as_info_without_lowering_the_score():
+    ruleset = load_ruleset(None)
+    assert next(rule for rule in ruleset.rules if rule['id'] == 'EXTENTS_OUTLIER')['severity'] == 'info'
+    issue = {'code': 'EXTENTS_OUTLIER', 'severity': 'info', 'rule': 'EXTENTS_OUTLIER', 'message': ''}
+    assert ruleset.score([issue]) == ruleset.score([])
@@ -0,0 +1,92 @@
+"""
+Upload formats: binary DXF and gzip / zstd compressed uploads audit like
+the ASCII drawing they encode, whatever the chunk boundaries.
+"""
+
+import asyncio
+import gzip
+
+import pytest
+import zstandard
+
+from benchmarks.bench_formats import audit
+from benchmarks.synthetic import build_dxf, iter_chunks, to_binary_dxf
+from core.dxf_formats import DECODE_STEP_SIZE, StreamDecoder, sniff_format
+from core.r2_client import R2_BUCKET
+from core.r2_reader import object_url
+from core.streaming_audit import stream_audit_large_dxf
+
+
+@pytest.fixture(scope='module')
+def ascii_dxf() -> bytes:
+    return build_dxf(entities=5000)
+
+
+def encodings(ascii_dxf: bytes) -> dict:
+    binary_dxf = to_binary_dxf(ascii_dxf)
+    zstd = zstandard.ZstdCompressor(level=3)
+    return {
+        'binary': binary_dxf,
+        'ascii+gzip': gzip.compress(ascii_dxf),
+        'ascii+zstd': zstd.compress(ascii_dxf),
+        'binary+gzip': gzip.compress(binary_dxf),
+        'binary+zstd': zstd.compress(binary_dxf),
+        # Concatenated members and frames decode as one stream
+        'gzip members': gzip.compress(ascii_dxf[:100000]) + gzip.compress(ascii_dxf[100000:]),
+        'zstd frames': zstd.compress(ascii_dxf[:100000]) + zstd.compress(ascii_dxf[100000:]),
+    }
+
+
+def decode(data: bytes, chunk_size: int) -> bytes:
+    decoder = StreamDecoder()
+    blocks = [block for chunk in iter_chunks(data, chunk_size) for block in decoder.feed(chunk)]
+    return b''.join(blocks + list(decoder.close()))
+
+
+@pytest.mark.parametrize('head, found', [
+    (b'\x1f\x8b\x08\x00', 'gzip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'AutoCAD Binary DXF\r\n\x1a\x00', 'binary'),
+    (b'  0\nSECTION\n', 'ascii'),
+    (b'', 'ascii'),
+])
+def test_sniff_format(head, found):
+    assert sniff_format(head) == found
+
+
+def test_every_encoding_audits_like_ascii(ascii_dxf):
+    reference = audit(ascii_dxf)
+    for name, data in encodings(ascii_dxf).items():
+        assert audit(data) == reference, name
+
+
+@pytest.mark.parametrize('chunk_size', (1, 3, 4099))
+def test_chunk_boundaries_do_not_matter(ascii_dxf, chunk_size):
+    data = ascii_dxf[:50000]
+    for name, encoded in encodings(data).items():
+        if name.startswith('binary'):
+            continue
+        assert decode(encoded, chunk_size) == data, name
+
+
+def test_compressed_blocks_stay_bounded():
+    data = b'  0\nLINE\n  8\n0\n' * 500000
+    decoder = StreamDecoder()
+    blocks = list(decoder.feed(gzip.compress(data))) + list(decoder.close())
+    assert b''.join(blocks) == data
+    assert max(len(block) for block in blocks) <= 16 * DECODE_STEP_SIZE
+
+
+@pytest.mark.parametrize('compress', (gzip.compress, zstandard.ZstdCompressor().compress))
+def test_truncated_uploads_are_errors(s3, ascii_dxf, compress):
+    data = compress(ascii_dxf)
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/a.dxf.gz', Body=data[:len(data) // 2])
+    report = asyncio.run(stream_audit_large_dxf(object_url('projects/a.dxf.gz')))
+    assert report['status'] == 'error'
+    assert 'Truncated' in report['details'][0]['message']
+
+
+def test_compressed_upload_from_r2(s3, ascii_dxf):
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/a.dxf.zst', Body=zstandard.ZstdCompressor().compress(ascii_dxf))
+    report = asyncio.run(stream_audit_large_dxf(object_url('projects/a.dxf.zst')))
+    assert report['summary']['entities'] == audit(ascii_dxf)['summary']['entities']
@@ -0,0 +1,105 @@
+"""
+Tokenizer input edge cases: results must not depend on chunking, and
+inputs the line-based auditor accepted (BOM, stray blank lines, trailing
+newlines) must still audit.
+"""
+
+import pytest
+
+from benchmarks.synthetic import to_binary_dxf
+from core.dxf_tokenizer import UTF8_BOM, DxfTokenizer
+from tests.helpers import audit_bytes
+
+CHUNK_SIZES = (7, 4096, 1024 * 1024)
+
+
+def tokenize(data: bytes, chunk_size: int):
+    tokenizer = DxfTokenizer()
+    pairs = []
+    for start in range(0, len(data), chunk_size):
+        pairs.extend(tokenizer.feed(data[start:start + chunk_size]))
+    pairs.extend(tokenizer.close())
+    return pairs, tokenizer
+
+
+def entities_offset(data: bytes) -> int:
+    """Start of a group-code line a few entities into the ENTITIES section."""
+    start = data.index(b'ENTITIES')
+    return data.index(b'\n  0\n', start + 200) + 1
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_pairs_do_not_depend_on_chunking(sample_dxf, chunk_size):
+    expected, _ = tokenize(sample_dxf, len(sample_dxf))
+    pairs, _ = tokenize(sample_dxf, chunk_size)
+    assert pairs == expected
+
+
+@pytest.mark.parametrize('chunk_size', (1, 2, 4096))
+def test_leading_bom_is_dropped(sample_dxf, chunk_size):
+    expected, _ = tokenize(sample_dxf, 4096)
+    pairs, _ = tokenize(UTF8_BOM + sample_dxf, chunk_size)
+    assert pairs == expected
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_blank_line_where_a_code_belongs_is_skipped(sample_dxf, chunk_size):
+    at = entities_offset(sample_dxf)
+    expected, _ = tokenize(sample_dxf, 4096)
+    pairs, tokenizer = tokenize(sample_dxf[:at] + b'\n' + sample_dxf[at:], chunk_size)
+    assert pairs == expected
+    assert tokenizer.skipped_lines == 1
+
+
+def test_stray_text_where_a_code_belongs_is_skipped(sample_dxf):
+    at = entities_offset(sample_dxf)
+    expected, _ = tokenize(sample_dxf, 4096)
+    pairs, tokenizer = tokenize(sample_dxf[:at] + b'garbage\n' + sample_dxf[at:], 4096)
+    assert pairs == expected
+    assert tokenizer.skipped_lines == 1
+
+
+def test_blank_values_are_kept():
+    pairs, tokenizer = tokenize(b'  0\nTEXT\n  1\n\n  8\nA\n', 4096)
+    assert pairs == [(0, b'TEXT'), (1, b''), (8, b'A')]
+    assert tokenizer.skipped_lines == 0
+
+
+def test_crlf_and_padding_around_codes():
+    pairs, _ = tokenize(b'  0\r\nLINE\r\n  8\r\nMUROS  \r\n', 3)
+    assert pairs == [(0, b'LINE'), (8, b'MUROS')]
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('variant', ['bom', 'blank_line', 'trailing_newlines', 'crlf'])
+def test_malformed_inputs_audit_like_the_clean_file(sample_dxf, variant, chunk_size):
+    expected = audit_bytes(sample_dxf)
+    at = entities_offset(sample_dxf)
+    data = {
+        'bom': UTF8_BOM + sample_dxf,
+        'blank_line': sample_dxf[:at] + b'\n' + sample_dxf[at:],
+        'trailing_newlines': sample_dxf + b'\n\n',
+        'crlf': sample_dxf.replace(b'\n', b'\r\n'),
+    }[variant]
+    result = audit_bytes(data, chunk_size)
+    assert result['status'] != 'error'
+    if variant == 'blank_line':
+        # The extra line is read, so it is counted
+        expected['summary']['total_lines'] += 1
+    assert result == expected
+
+
+@pytest.mark.parametrize('chunk_size', (997, 65536, 1024 * 1024))
+def test_audited_lines_stop_at_the_end_of_entities(drawing, chunk_size):
+    end = drawing.index(b'ENDSEC', drawing.index(b'ENTITIES'))
+    end_line = drawing[:end].count(b'\n') + 1
+    result = audit_bytes(drawing + b'\n\n  0\nJUNK\n', chunk_size)
+    assert result['summary']['total_lines'] == end_line
+
+
+def test_binary_dxf_audits_like_ascii(drawing):
+    ascii_result = audit_bytes(drawing)
+    binary_result = audit_bytes(to_binary_dxf(drawing))
+    assert binary_result['summary']['entities'] == ascii_result['summary']['entities']
+    assert binary_result['layers'] == ascii_result['layers']
+    assert binary_result['details'] == ascii_result['details']
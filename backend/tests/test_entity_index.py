@@ -0,0 +1,111 @@
+"""
+Entity index builds through the API and the job queue, on moto S3: every
+file_key gets its own index, and the API never serves a replaced or
+deleted one from memory.
+"""
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import core.audit_cache as audit_cache_module
+import core.entity_index as entity_index
+import core.streaming_audit as streaming_audit
+from core.audit_cache import AuditResultCache
+from core.audit_jobs import JOB_PROCESSED, AuditJobManager
+from core.r2_client import R2_BUCKET
+from core.r2_reader import object_url
+
+
+@pytest.fixture
+def client(s3, monkeypatch):
+    """API client with an empty audit cache and no index loaded."""
+    from main import app
+
+    monkeypatch.setattr(audit_cache_module, 'audit_cache', AuditResultCache(cache_dir=None))
+    monkeypatch.setattr(entity_index, '_loaded', OrderedDict())
+    return TestClient(app)
+
+
+def upload(s3, file_key: str, data: bytes) -> None:
+    s3.put_object(Bucket=R2_BUCKET, Key=file_key, Body=data)
+
+
+def build_index(client, file_key: str, stream=None) -> None:
+    body = {'file_key': file_key, 'build_index': True, 'stream': stream}
+    response = client.post('/api/v1/audit/sync', json=body)
+    assert response.status_code == 200
+    assert '"entity_index"' in response.text
+
+
+def indexed_layers(client, file_key: str):
+    response = client.get('/api/v1/index/layers', params={'file_key': file_key})
+    return response.status_code, response.json()
+
+
+@pytest.mark.parametrize('stream', (None, 'ndjson'))
+def test_same_drawing_under_a_new_key_gets_its_own_index(client, s3, sample_dxf, stream):
+    upload(s3, 'projects/a.dxf', sample_dxf)
+    upload(s3, 'projects/b.dxf', sample_dxf)
+    build_index(client, 'projects/a.dxf', stream)
+    build_index(client, 'projects/b.dxf', stream)
+
+    status, layers = indexed_layers(client, 'projects/b.dxf')
+    assert status == 200
+    assert layers == indexed_layers(client, 'projects/a.dxf')[1]
+
+
+def test_deleted_index_is_not_served_from_memory(client, s3, sample_dxf):
+    upload(s3, 'projects/a.dxf', sample_dxf)
+    build_index(client, 'projects/a.dxf')
+    assert indexed_layers(client, 'projects/a.dxf')[0] == 200
+
+    assert client.delete('/api/v1/storage/projects/a.dxf').status_code == 200
+    assert indexed_layers(client, 'projects/a.dxf')[0] == 404
+
+
+def run_index_job(file_key: str) -> dict:
+    """One build_index job through the job queue, on a thread standing in for a worker process."""
+    manager = AuditJobManager(workers=1)
+
+    async def run():
+        manager._queue = asyncio.Queue()
+        manager._pool = ThreadPoolExecutor(max_workers=1)
+        manager._progress, manager._cancelled = {}, {}
+        worker = asyncio.create_task(manager._worker_loop(0))
+        job = manager.submit('file', object_url(file_key), build_index=True)
+        await manager._queue.join()
+        worker.cancel()
+        manager._pool.shutdown()
+        return job
+
+    return asyncio.run(run())
+
+
+def test_index_rebuilt_by_a_job_replaces_the_loaded_copy(client, s3, sample_dxf, drawing, monkeypatch):
+    save = entity_index.save_entity_index
+
+    async def save_in_worker(file_key, index):
+        # A worker process only drops the copies loaded in that process
+        loaded = entity_index._loaded
+        entity_index._loaded = OrderedDict()
+        try:
+            return await save(file_key, index)
+        finally:
+            entity_index._loaded = loaded
+
+    upload(s3, 'projects/a.dxf', sample_dxf)
+    build_index(client, 'projects/a.dxf')
+    _, before = indexed_layers(client, 'projects/a.dxf')
+
+    # New revision uploaded under the same key, index rebuilt in the background
+    upload(s3, 'projects/a.dxf', drawing)
+    monkeypatch.setattr(streaming_audit, 'save_entity_index', save_in_worker)
+    job = run_index_job('projects/a.dxf')
+    assert job['status'] == JOB_PROCESSED
+
+    _, after = indexed_layers(client, 'projects/a.dxf')
+    assert after['total'] > before['total']
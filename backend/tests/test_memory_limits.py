@@ -0,0 +1,74 @@
+"""
+Memory ceilings of the streaming audit: peak RSS must stay flat however
+large or pathological the input, and name-keyed counters must stop at their
+limit. A multi-GB drawing runs with `make test-large` (AUDIT_LARGE_TEST_GB).
+"""
+
+import os
+
+import pytest
+
+import core.streaming_audit as streaming_audit
+from benchmarks.bench_memory import DEFAULT_CEILING_MB, no_line_breaks
+from benchmarks.synthetic import iter_large_dxf
+from core.memory_stats import MemoryMonitor, current_rss
+from core.streaming_audit import DxfStreamAuditor
+
+# Streamed per case; the ceiling stays well under it, so buffering the input would fail
+CASE_BYTES = 48 * 1024 * 1024
+CEILING_MB = 32
+
+# Size of the multi-GB case (1-5 GB); skipped when unset
+LARGE_TEST_GB = float(os.getenv("AUDIT_LARGE_TEST_GB", "0"))
+
+pytestmark = pytest.mark.skipif(current_rss() is None, reason="RSS is read from /proc")
+
+
+def audit_stream(chunks):
+    memory = MemoryMonitor(trace=False)
+    auditor = DxfStreamAuditor()
+    size = 0
+    for chunk in chunks:
+        auditor.feed(chunk)
+        size += len(chunk)
+        memory.sample()
+    auditor.close()
+    return auditor.build_report(), memory.finish(), size
+
+
+@pytest.mark.parametrize('case', ['drawing', 'cr_line_endings', 'long_lines', 'no_line_breaks'])
+def test_peak_rss_stays_under_the_ceiling(case):
+    chunks = {
+        'drawing': lambda: iter_large_dxf(CASE_BYTES),
+        'cr_line_endings': lambda: iter_large_dxf(CASE_BYTES, line_ending=b'\r'),
+        'long_lines': lambda: iter_large_dxf(CASE_BYTES, long_line_bytes=1024 * 1024),
+        'no_line_breaks': lambda: no_line_breaks(CASE_BYTES),
+    }[case]()
+    report, memory, size = audit_stream(chunks)
+    assert size >= CASE_BYTES * 0.9
+    assert report['status'] != 'error'
+    assert memory['peak_increase_mb'] <= CEILING_MB
+
+
+def test_long_lines_are_cut_and_counted():
+    report, _, _ = audit_stream(iter_large_dxf(8 * 1024 * 1024, long_line_bytes=1024 * 1024))
+    assert report['summary']['overflow']['long_lines'] > 0
+    assert report['summary']['entities'] > 0
+
+
+def test_layer_names_stop_at_the_tracking_limit(monkeypatch):
+    monkeypatch.setattr(streaming_audit, 'AUDIT_MAX_TRACKED_NAMES', 200)
+    report, _, _ = audit_stream(iter_large_dxf(8 * 1024 * 1024))
+    assert report['summary']['total_layers'] == 200
+    assert report['summary']['overflow']['layers'] > 0
+
+
+@pytest.mark.large
+@pytest.mark.skipif(not LARGE_TEST_GB, reason="set AUDIT_LARGE_TEST_GB (1-5) to stream a multi-GB drawing")
+def test_multi_gigabyte_drawing_stays_under_the_ceiling():
+    target = int(LARGE_TEST_GB * 1024 ** 3)
+    report, memory, size = audit_stream(iter_large_dxf(target))
+    assert size >= target
+    assert report['status'] != 'error'
+    assert report['summary']['entities'] > 0
+    assert memory['peak_increase_mb'] <= DEFAULT_CEILING_MB
@@ -0,0 +1,121 @@
+"""
+Parallel (byte-range) audit against the sequential streaming audit: the
+merged per-range results must give the same report, wherever the ranges
+are cut.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+import core.parallel_audit as parallel_audit
+from core.audit_rules import load_ruleset
+from core.metrics import AuditProfile
+from core.parallel_audit import merge_range_results
+from core.streaming_audit import build_audit_report
+from core.worker_pool import shutdown_process_pool
+from tests.helpers import audit_bytes
+
+
+class MemoryRangeReader:
+    """
+    Range reader over bytes held in memory (same interface as the HTTP and
+    R2 readers), recording how much is read and how many reads overlap.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.bytes_read = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def size(self):
+        return len(self.data)
+
+    async def read(self, start: int, end: int) -> bytes:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0)
+        self.active -= 1
+        self.bytes_read += end - start
+        return self.data[start:end]
+
+
+@pytest.fixture(scope='module', autouse=True)
+def worker_pool():
+    yield
+    shutdown_process_pool()
+
+
+def parallel_report(data: bytes, rules_id=None) -> dict:
+    parts = asyncio.run(parallel_audit._audit_ranges(MemoryRangeReader(data), rules_id, AuditProfile('parallel')))
+    assert parts is not None and len(parts) > 2
+    stats, total_lines = merge_range_results(parts)
+    return build_audit_report(stats, total_lines, load_ruleset(rules_id))
+
+
+@pytest.mark.parametrize('range_size', (300 * 1024, 1024 * 1024))
+@pytest.mark.parametrize('rules_id', (None, 'arquitectura'))
+def test_parallel_matches_sequential(monkeypatch, drawing, range_size, rules_id):
+    monkeypatch.setattr(parallel_audit, 'PARALLEL_RANGE_SIZE', range_size)
+    assert parallel_report(drawing, rules_id) == audit_bytes(drawing, rules_id=rules_id)
+
+
+def test_parallel_ignores_what_follows_entities(monkeypatch, drawing):
+    monkeypatch.setattr(parallel_audit, 'PARALLEL_RANGE_SIZE', 512 * 1024)
+    data = drawing + b'\n\n'
+    assert parallel_report(data) == audit_bytes(data)
+
+
+def test_small_files_are_not_split(drawing):
+    parts = asyncio.run(parallel_audit._audit_ranges(MemoryRangeReader(drawing), None, AuditProfile('parallel')))
+    assert parts is None
+
+
+def test_cr_only_files_are_not_split(monkeypatch, drawing):
+    monkeypatch.setattr(parallel_audit, 'PARALLEL_RANGE_SIZE', 512 * 1024)
+    reader = MemoryRangeReader(drawing.replace(b'\r\n', b'\n').replace(b'\n', b'\r'))
+    assert asyncio.run(parallel_audit._audit_ranges(reader, None, AuditProfile('parallel'))) is None
+    assert reader.bytes_read == parallel_audit.BOUNDARY_PROBE_SIZE
+
+
+def test_split_point_without_a_boundary_stops_the_probe(monkeypatch, drawing):
+    monkeypatch.setattr(parallel_audit, 'PARALLEL_RANGE_SIZE', 512 * 1024)
+    monkeypatch.setattr(parallel_audit, 'BOUNDARY_SEARCH_LIMIT', 128 * 1024)
+    # 2 MB of comments: split points inside it have no entity boundary after them for a long way
+    at = drawing.index(b'ENTITIES\n') + len(b'ENTITIES\n')
+    data = drawing[:at] + b'999\nno boundary here\n' * (2 * 1024 * 1024 // 21) + drawing[at:]
+    reader = MemoryRangeReader(data)
+
+    assert asyncio.run(parallel_audit._audit_ranges(reader, None, AuditProfile('parallel'))) is None
+    split_points = len(data) // (512 * 1024)
+    assert reader.bytes_read <= parallel_audit.BOUNDARY_PROBE_SIZE + split_points * (128 * 1024 + 4096)
+
+
+def test_probes_and_fetches_share_the_read_cap(monkeypatch, drawing):
+    monkeypatch.setattr(parallel_audit, 'PARALLEL_RANGE_SIZE', 256 * 1024)
+    monkeypatch.setattr(parallel_audit, 'PARALLEL_MAX_FETCHES', 3)
+    reader = MemoryRangeReader(drawing)
+    parts = asyncio.run(parallel_audit._audit_ranges(reader, None, AuditProfile('parallel')))
+    assert len(parts) > 10
+    assert reader.max_active == 3
+
+
+def range_server(data: bytes) -> httpx.AsyncClient:
+    """Client whose requests are answered from `data`, honouring Range headers."""
+    def handle(request: httpx.Request) -> httpx.Response:
+        first, _, last = request.headers['range'].removeprefix('bytes=').partition('-')
+        body = data[int(first):int(last) + 1]
+        content_range = f"bytes {first}-{int(first) + len(body) - 1}/{len(data)}"
+        return httpx.Response(206, content=body, headers={'Content-Range': content_range})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handle))
+
+
+def test_http_ranges_are_read_with_the_shared_client(monkeypatch, drawing):
+    monkeypatch.setattr(parallel_audit, 'PARALLEL_RANGE_SIZE', 1024 * 1024)
+    monkeypatch.setattr(parallel_audit, 'get_http_client', lambda: range_server(drawing))
+    result = asyncio.run(parallel_audit.parallel_audit_large_dxf('https://files.test/plano.dxf'))
+    expected = audit_bytes(drawing)
+    assert result['summary'].pop('profile')['bytes'] >= len(drawing)
+    assert result == expected
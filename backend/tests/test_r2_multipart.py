@@ -0,0 +1,66 @@
+"""
+Multipart upload completion checks, on their own and against an in-memory
+S3 (moto) standing in for R2.
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from core.r2_client import R2_BUCKET
+from core.r2_multipart import find_part_mismatch, initiate_multipart_upload, list_uploaded_parts
+
+PART_SIZE = 5 * 1024 * 1024  # S3's minimum for every part but the last
+
+
+def parts(*numbers):
+    return [{'PartNumber': n, 'ETag': f"etag-{n}", 'Size': PART_SIZE} for n in numbers]
+
+
+@pytest.mark.parametrize('uploaded, claimed, total, problem', [
+    (parts(1, 2, 3), None, None, None),
+    (parts(1, 2, 3), None, 3, None),
+    (parts(1, 2, 4), None, None, "1 part(s) missing, first missing part: 3"),
+    (parts(2, 3), None, None, "1 part(s) missing, first missing part: 1"),
+    (parts(1, 2), None, 4, "2 part(s) missing, first missing part: 3"),
+    (parts(1, 2, 4), [{'PartNumber': 1, 'ETag': 'etag-1'}], None, "1 part(s) missing, first missing part: 3"),
+    (parts(1, 2), [{'PartNumber': 3, 'ETag': 'etag-3'}], None, "Part 3 was not received by storage"),
+    (parts(1, 2), [{'PartNumber': 2, 'ETag': '"other"'}], None, "Part 2 ETag does not match the stored part"),
+    (parts(1, 2), [{'PartNumber': 2, 'ETag': '"etag-2"'}], 2, None),
+    ([], None, None, "No parts have been uploaded"),
+])
+def test_find_part_mismatch(uploaded, claimed, total, problem):
+    assert find_part_mismatch(uploaded, claimed, total) == problem
+
+
+def upload_part(s3, upload, number: int, size: int = PART_SIZE) -> None:
+    s3.upload_part(
+        Bucket=R2_BUCKET, Key=upload['file_key'], UploadId=upload['upload_id'],
+        PartNumber=number, Body=bytes([number]) * size
+    )
+
+
+def test_completion_without_session_rejects_a_gap(s3):
+    """After a restart there is no session: a gap must not produce a truncated object."""
+    from main import app
+
+    upload = asyncio.run(initiate_multipart_upload('plano.dxf'))
+    for number in (1, 2):
+        upload_part(s3, upload, number)
+    upload_part(s3, upload, 4, size=1024)
+
+    uploaded = asyncio.run(list_uploaded_parts(upload['file_key'], upload['upload_id']))
+    assert [part['PartNumber'] for part in uploaded] == [1, 2, 4]
+
+    client = TestClient(app)
+    body = {'file_key': upload['file_key'], 'upload_id': upload['upload_id']}
+    response = client.post('/api/v1/storage/multipart/complete', json=body)
+    assert response.status_code == 409
+    assert 'first missing part: 3' in response.json()['detail']
+
+    upload_part(s3, upload, 3)
+    response = client.post('/api/v1/storage/multipart/complete', json=body)
+    assert response.status_code == 200
+    stored = s3.head_object(Bucket=R2_BUCKET, Key=upload['file_key'])
+    assert stored['ContentLength'] == 3 * PART_SIZE + 1024
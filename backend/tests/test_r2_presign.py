@@ -0,0 +1,80 @@
+"""
+Local part-URL presigner: its URLs carry the signatures boto3 would
+compute, and the API hands them out one page at a time.
+"""
+
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlsplit
+
+import boto3
+import pytest
+from botocore.config import Config
+from fastapi.testclient import TestClient
+
+import core.r2_presign as r2_presign
+from core.r2_presign import PART_URL_PAGE_SIZE, PartUrlSigner
+
+ENDPOINT = 'https://account.r2.test'
+BUCKET = 'sigebim-files'
+
+
+def boto3_part_url(file_key: str, upload_id: str, part_number: int) -> str:
+    client = boto3.client(
+        's3', endpoint_url=ENDPOINT, aws_access_key_id='key-id', aws_secret_access_key='secret',
+        config=Config(signature_version='s3v4', s3={'addressing_style': 'path'}), region_name='auto'
+    )
+    params = {'Bucket': BUCKET, 'Key': file_key, 'UploadId': upload_id, 'PartNumber': part_number}
+    return client.generate_presigned_url('upload_part', Params=params, ExpiresIn=3600)
+
+
+def split_url(url: str):
+    parts = urlsplit(url)
+    return parts.scheme, parts.netloc, parts.path, dict(parse_qsl(parts.query))
+
+
+@pytest.mark.parametrize('file_key, upload_id', [
+    ('uploads/2024/plano.dxf', 'abc123'),
+    ('uploads/planta baja ñ+1 (rev 2).dxf', 'up/load=id+1'),
+])
+def test_part_urls_match_boto3(file_key, upload_id):
+    signer = PartUrlSigner(ENDPOINT, 'key-id', 'secret', BUCKET)
+    for part_number in (1, 7, 10000):
+        expected = boto3_part_url(file_key, upload_id, part_number)
+        date = split_url(expected)[3]['X-Amz-Date']
+        now = datetime.strptime(date, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+        url, = signer.sign_part_urls(file_key, upload_id, part_number, 1, now=now)
+        assert url['part_number'] == part_number
+        assert split_url(url['upload_url']) == split_url(expected)
+
+
+def test_signing_key_is_derived_once_per_day():
+    signer = PartUrlSigner(ENDPOINT, 'key-id', 'secret', BUCKET)
+    day = datetime(2024, 12, 26, 10, tzinfo=timezone.utc)
+    signer.sign_part_urls('a.dxf', 'u', 1, 3, now=day)
+    key = signer._key_cache
+    signer.sign_part_urls('a.dxf', 'u', 4, 3, now=day.replace(hour=23))
+    assert signer._key_cache is key
+    signer.sign_part_urls('a.dxf', 'u', 7, 3, now=day.replace(day=27))
+    assert signer._key_cache[0] == '20241227'
+
+
+def test_part_urls_are_paged(s3, monkeypatch):
+    from main import app
+
+    for name, value in (('R2_ENDPOINT', ENDPOINT), ('R2_ACCESS_KEY_ID', 'key-id'), ('R2_SECRET_ACCESS_KEY', 'secret')):
+        monkeypatch.setattr(r2_presign, name, value)
+    monkeypatch.setattr(r2_presign, '_signer', None)
+    client = TestClient(app)
+    part_size = 5 * 1024 * 1024
+    response = client.post('/api/v1/storage/multipart/initiate', json={'filename': 'plano.dxf', 'file_size': 250 * part_size})
+    assert response.status_code == 200
+    upload = response.json()
+    total = upload['total_parts']
+    assert [url['part_number'] for url in upload['part_urls']] == list(range(1, PART_URL_PAGE_SIZE + 1))
+
+    numbers = []
+    for first in range(PART_URL_PAGE_SIZE + 1, total + 1, PART_URL_PAGE_SIZE):
+        page = client.get(f"/api/v1/storage/multipart/{upload['upload_id']}/parts", params={'from': first})
+        numbers += [url['part_number'] for url in page.json()['part_urls']]
+    # The last page stops at the session's part count
+    assert numbers == list(range(PART_URL_PAGE_SIZE + 1, total + 1))
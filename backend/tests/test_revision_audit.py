@@ -0,0 +1,106 @@
+"""
+Incremental revision audits: the report matches a full audit, unchanged
+blocks are reused and the delta names what changed, both in memory and
+through R2 (moto).
+"""
+
+import asyncio
+
+import pytest
+
+import core.revision_audit as revision_audit
+from benchmarks.bench_revision import full_audit, make_revision, revision_audit as audit_in_memory
+from benchmarks.synthetic import build_dxf, to_binary_dxf
+from core.audit_rules import compile_ruleset, load_ruleset
+from core.r2_client import R2_BUCKET
+from core.r2_reader import object_url
+from core.revision_audit import RevisionFingerprint, fingerprint_key, revision_audit_large_dxf
+
+
+@pytest.fixture(scope='module')
+def revisions():
+    """A drawing and a revision that edits one stretch of it and adds five entities on a new layer."""
+    first = build_dxf(entities=30000)
+    return first, make_revision(first)
+
+
+def without_run_details(report: dict) -> dict:
+    summary = {k: v for k, v in report['summary'].items() if k not in ('memory', 'profile')}
+    return {**{k: v for k, v in report.items() if k != 'revision'}, 'summary': summary}
+
+
+def test_incremental_report_matches_a_full_audit(revisions):
+    first, second = revisions
+    rules = load_ruleset()
+    _, _, fingerprint = audit_in_memory(first, rules, None)
+    previous = RevisionFingerprint.from_bytes(fingerprint.to_bytes())
+
+    auditor, report, _ = audit_in_memory(second, rules, previous)
+    assert report == full_audit(second, rules)
+    assert 0 < auditor.reused_blocks < len(auditor.blocks)
+    assert auditor.parsed_bytes < len(second) / 2
+
+
+def test_delta_names_the_changes(revisions):
+    first, second = revisions
+    rules = load_ruleset()
+    _, _, previous = audit_in_memory(first, rules, None)
+    _, _, current = audit_in_memory(second, rules, previous)
+    delta = revision_audit.build_delta(previous, current)
+
+    assert delta['sections']['changed'] == ['ENTITIES']
+    entities = delta['entities']
+    assert (entities['added'], entities['removed']) == (5, 0)
+    assert entities['added_handles'] == [f'FFFF{i}' for i in range(5)]
+    assert entities['modified'] > 0
+    assert entities['unchanged'] + entities['modified'] == 30000
+
+
+def test_another_rule_set_reuses_nothing(revisions):
+    first, _ = revisions
+    _, _, previous = audit_in_memory(first, load_ruleset(), None)
+    other = compile_ruleset({'rules': [{'id': 'CAPAS', 'type': 'required_layer', 'layers': ['MUROS']}]})
+    auditor, report, _ = audit_in_memory(first, other, previous)
+    assert auditor.reused_blocks == 0
+    assert report == full_audit(first, other)
+
+
+def audit_revision(file_key: str, previous_file_key=None) -> dict:
+    return asyncio.run(revision_audit_large_dxf(object_url(file_key), previous_file_key))
+
+
+def test_revisions_stored_in_r2(s3, revisions):
+    first, second = revisions
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/v1.dxf', Body=first)
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/v2.dxf', Body=second)
+
+    report = audit_revision('projects/v1.dxf')
+    assert report['revision']['previous_found'] is False
+    stored = s3.get_object(Bucket=R2_BUCKET, Key=fingerprint_key('projects/v1.dxf'))['Body'].read()
+    assert RevisionFingerprint.from_bytes(stored).blocks
+
+    report = audit_revision('projects/v2.dxf', 'projects/v1.dxf')
+    assert report['revision']['previous_found'] is True
+    assert report['revision']['reused_blocks'] > 0
+    assert without_run_details(report) == full_audit(second, load_ruleset())
+
+
+def test_fingerprint_of_an_older_format_is_ignored(s3, revisions, monkeypatch):
+    first, second = revisions
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/v1.dxf', Body=first)
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/v2.dxf', Body=second)
+    with monkeypatch.context() as patch:
+        patch.setattr(revision_audit, 'FINGERPRINT_FORMAT', 1)
+        audit_revision('projects/v1.dxf')
+
+    report = audit_revision('projects/v2.dxf', 'projects/v1.dxf')
+    assert report['status'] != 'error'
+    assert report['revision']['previous_found'] is False
+    assert report['revision']['reused_blocks'] == 0
+
+
+def test_binary_drawings_are_rejected(s3, revisions):
+    s3.put_object(Bucket=R2_BUCKET, Key='projects/v1.dxf', Body=to_binary_dxf(revisions[0]))
+    report = audit_revision('projects/v1.dxf')
+    assert report['status'] == 'error'
+    assert 'ASCII' in report['details'][0]['message']
@@ -0,0 +1,76 @@
+"""
+Spatial grid against brute force, including the inputs that used to size it
+badly: stray far-away entities, one dense cell and extreme coordinates.
+"""
+
+import numpy as np
+import pytest
+
+import core.spatial_index as spatial_index
+from benchmarks.bench_spatial import build_extents
+from core.spatial_index import SpatialGrid, _gaps, find_clearance_violations, find_overlaps
+
+
+def brute_force_pairs(bounds: np.ndarray, distance: float) -> set:
+    rows = np.flatnonzero(~np.isnan(bounds).any(axis=1))
+    left, right = np.triu_indices(len(rows), k=1)
+    left, right = rows[left], rows[right]
+    keep = _gaps(bounds, left, right) <= distance
+    return set(zip(left[keep].tolist(), right[keep].tolist()))
+
+
+def grid_pairs(bounds: np.ndarray, distance: float) -> set:
+    left, right, _ = SpatialGrid(bounds, padding=distance / 2).pairs(distance)
+    return set(zip(left.tolist(), right.tolist()))
+
+
+@pytest.mark.parametrize('distance', (0.0, 0.5))
+def test_pairs_match_brute_force(distance):
+    bounds = build_extents(3000)
+    bounds[::97] = np.nan
+    assert grid_pairs(bounds, distance) == brute_force_pairs(bounds, distance)
+
+
+def test_stray_box_does_not_stretch_the_grid():
+    bounds = build_extents(40000)
+    expected = find_overlaps(bounds)
+    cell_size = SpatialGrid(bounds).cell_size
+
+    stray = np.vstack([bounds, [[1e9, 1e9, 1e9 + 5, 1e9 + 5]]])
+    assert SpatialGrid(stray).cell_size == cell_size
+    for found, wanted in zip(find_overlaps(stray), expected):
+        np.testing.assert_array_equal(found, wanted)
+
+
+def test_boxes_outside_the_bulk_are_still_compared():
+    bounds = build_extents(2000)
+    far = np.array([
+        [1e9, 1e9, 1e9 + 5, 1e9 + 5],
+        [1e9 + 4, 1e9 + 4, 1e9 + 8, 1e9 + 8],
+        [-1e12, -1e12, 1e12, 1e12],
+        [1e300, 1e300, 1e300, 1e300],
+    ])
+    bounds = np.vstack([bounds, far])
+    assert grid_pairs(bounds, 0.0) == brute_force_pairs(bounds, 0.0)
+
+
+def test_dense_cell_is_split_into_blocks(monkeypatch):
+    monkeypatch.setattr(spatial_index, 'PAIR_BLOCK_SIZE', 50)
+    rng = np.random.default_rng(1)
+    corners = rng.uniform(0, 1, (400, 2))
+    bounds = np.hstack([corners, corners + 0.05])
+    # Most boxes stacked on top of each other, a few spread around
+    bounds[:300] = [0.5, 0.5, 0.6, 0.6]
+    assert grid_pairs(bounds, 0.0) == brute_force_pairs(bounds, 0.0)
+
+
+def test_clearance_violations_exclude_touching_boxes():
+    bounds = np.array([
+        [0, 0, 1, 1],
+        [1, 0, 2, 1],      # touches the first
+        [2.3, 0, 3, 1],    # 0.3 from the second
+        [10, 10, 11, 11],
+    ], dtype=float)
+    left, right, gaps = find_clearance_violations(bounds, 0.5)
+    assert list(zip(left, right)) == [(1, 2)]
+    assert gaps[0] == pytest.approx(0.3)
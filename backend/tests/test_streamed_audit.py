@@ -0,0 +1,122 @@
+"""
+Sync audits streamed as NDJSON / SSE: progress and early issues while the
+drawing is read, the report last, and a client that leaves stops the
+download.
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import core.audit_cache as audit_cache_module
+import main
+from core.audit_rules import load_ruleset
+from tests.helpers import audit_bytes
+
+URL = 'https://files.test/plano.dxf'
+CHUNK_SIZE = 64 * 1024
+
+
+class SlowBody(httpx.AsyncByteStream):
+    """Response body that arrives one chunk at a time, recording how much was sent."""
+
+    def __init__(self, data: bytes, delay: float = 0.0):
+        self.data = data
+        self.delay = delay
+        self.chunks = -(-len(data) // CHUNK_SIZE)
+        self.sent = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        for start in range(0, len(self.data), CHUNK_SIZE):
+            await asyncio.sleep(self.delay)
+            self.sent += 1
+            yield self.data[start:start + CHUNK_SIZE]
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Serve `data` at URL (no ETag, so nothing is cached); returns the body being sent."""
+    bodies = []
+
+    def setup(data: bytes, delay: float = 0.0) -> list:
+        def respond(request: httpx.Request) -> httpx.Response:
+            if 'range' in request.headers:
+                return httpx.Response(206, headers={'content-range': f'bytes 0-0/{len(data)}'}, content=data[:1])
+            bodies.append(SlowBody(data, delay))
+            return httpx.Response(200, headers={'content-length': str(len(data))}, stream=bodies[-1])
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+        monkeypatch.setattr(main, 'get_http_client', lambda: client)
+        monkeypatch.setattr(audit_cache_module, 'get_http_client', lambda: client)
+        return bodies
+
+    return setup
+
+
+def ndjson_events(text: str) -> list:
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def test_ndjson_stream_ends_with_the_report(serve, drawing):
+    serve(drawing)
+    response = TestClient(main.app).post('/api/v1/audit/sync', json={'file_url': URL, 'stream': 'ndjson'})
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    events = ndjson_events(response.text)
+
+    kinds = [event['type'] for event in events]
+    assert kinds[0] == 'progress' and kinds[-1] == 'report'
+    assert set(kinds) <= {'progress', 'issue', 'report'}
+    progress = [event['data'] for event in events if event['type'] == 'progress']
+    assert progress[-1]['total_bytes'] == len(drawing)
+    assert [p['bytes_processed'] for p in progress] == sorted(p['bytes_processed'] for p in progress)
+
+    report = events[-1]['data']
+    assert report['summary']['entities'] == audit_bytes(drawing)['summary']['entities']
+    # Issues reported early are in the final report as well
+    final_rules = {issue.get('rule') for issue in report['details']}
+    assert {event['data']['rule'] for event in events if event['type'] == 'issue'} <= final_rules
+
+
+def test_sse_stream(serve, sample_dxf):
+    serve(sample_dxf)
+    response = TestClient(main.app).post('/api/v1/audit/sync', json={'file_url': URL, 'stream': 'sse'})
+    assert response.headers['content-type'].startswith('text/event-stream')
+    blocks = [block for block in response.text.split('\n\n') if block]
+    assert all(block.startswith('event: ') and '\ndata: ' in block for block in blocks)
+    assert blocks[-1].startswith('event: report\n')
+
+
+def test_download_error_is_the_report(monkeypatch):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+    monkeypatch.setattr(main, 'get_http_client', lambda: client)
+    monkeypatch.setattr(audit_cache_module, 'get_http_client', lambda: client)
+    response = TestClient(main.app).post('/api/v1/audit/sync', json={'file_url': URL, 'stream': 'ndjson'})
+    events = ndjson_events(response.text)
+    assert [event['type'] for event in events] == ['report']
+    assert events[0]['data']['status'] == 'error'
+
+
+def test_client_leaving_stops_the_download(serve, drawing):
+    bodies = serve(drawing, delay=0.005)
+    request = main.SyncAuditRequest(file_url=URL, stream='ndjson')
+
+    async def leave_after_first_event():
+        events = main.streamed_sync_audit(request, URL, load_ruleset()).body_iterator
+        first = await events.__anext__()
+        await events.aclose()
+        # Long enough for the whole download, had it gone on
+        await asyncio.sleep(1.0)
+        body, = bodies
+        return json.loads(first), body.closed, body.sent, body.chunks
+
+    first, closed, sent, chunks = asyncio.run(leave_after_first_event())
+    assert first['type'] == 'progress'
+    assert closed
+    assert sent < chunks / 4
@@ -0,0 +1,62 @@
+"""
+Streaming auditor on small hand-written drawings: TABLES records, ByLayer
+color resolution and values that are not numbers.
+"""
+
+from tests.helpers import audit_bytes
+
+
+def pairs(*items) -> bytes:
+    """DXF text from (group code, value) pairs."""
+    return b''.join(f"{code:>3}\n{value}\n".encode() for code, value in items)
+
+
+def drawing(layers, entities) -> bytes:
+    """TABLES with one LAYER record per (name, color, linetype, lineweight), then ENTITIES."""
+    tables = [(0, 'SECTION'), (2, 'TABLES'), (0, 'TABLE'), (2, 'LAYER')]
+    for name, color, linetype, lineweight in layers:
+        tables += [(0, 'LAYER'), (2, name), (70, 0), (62, color), (6, linetype), (370, lineweight)]
+    tables += [(0, 'ENDTAB'), (0, 'ENDSEC')]
+    body = [(0, 'SECTION'), (2, 'ENTITIES')]
+    for layer, color in entities:
+        body += [(0, 'LINE'), (8, layer)]
+        if color is not None:
+            body.append((62, color))
+        body += [(10, 0.0), (20, 0.0), (11, 1.0), (21, 1.0)]
+    body += [(0, 'ENDSEC'), (0, 'EOF')]
+    return pairs(*tables, *body)
+
+
+def layer(report: dict, name: str) -> dict:
+    return next(item for item in report['layers'] if item['name'] == name)
+
+
+def test_layer_records_give_color_linetype_and_lineweight():
+    report = audit_bytes(drawing([('MUROS', 1, 'DASHED', 50), ('COTAS', -3, 'Continuous', -3)], [('MUROS', None)]))
+    muros = layer(report, 'MUROS')
+    assert (muros['color'], muros['linetype'], muros['lineweight'], muros['entity_count']) == (1, 'DASHED', 50, 1)
+    # Only layers holding entities are listed
+    assert [item['name'] for item in report['layers']] == ['MUROS']
+
+
+def test_bylayer_entities_take_the_table_color():
+    entities = [('MUROS', None), ('MUROS', 256), ('MUROS', 3), ('COTAS', None), ('SIN_TABLA', None)]
+    report = audit_bytes(drawing([('MUROS', 1, 'Continuous', -3), ('COTAS', -5, 'Continuous', -3)], entities))
+    assert layer(report, 'MUROS')['entity_colors'] == {'1': 2, '3': 1}
+    # Switched-off layer (negative color) and a layer missing from the table
+    assert layer(report, 'COTAS')['entity_colors'] == {'5': 1}
+    assert layer(report, 'SIN_TABLA')['entity_colors'] == {'7': 1}
+
+
+def test_values_that_are_not_numbers_are_skipped_and_counted():
+    layers = [('MUROS', 'BYLAYER', 'DASHED', 'grueso'), ('COTAS', 2, 'Continuous', 25)]
+    report = audit_bytes(drawing(layers, [('MUROS', 'rojo'), ('MUROS', 4), ('COTAS', None)]))
+
+    assert report['status'] != 'error'
+    assert report['summary']['entities'] == 3
+    assert report['summary']['overflow'] == {'invalid_values': 3}
+    muros = layer(report, 'MUROS')
+    assert (muros['color'], muros['linetype'], muros['lineweight']) == (7, 'DASHED', -3)
+    # The entity with an unreadable color counts as ByLayer
+    assert muros['entity_colors'] == {'4': 1, '7': 1}
+    assert layer(report, 'COTAS')['color'] == 2
@@ -117,29 +117,15 @@ export default function ProjectDetailClient({
                 .update({ upload_status: 'processing' })
                 .eq('id', fileId)
 
-            // Get signed URL for the file from R2
             const file = files.find(f => f.id === fileId)
             if (!file) throw new Error('Archivo no encontrado')
 
-            // Get R2 download URL from backend
+            // Call Python backend SYNC endpoint; it reads the R2 object directly
             const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8005'
-            const urlResponse = await fetch(`${backendUrl}/api/v1/storage/download-url`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ file_key: file.storage_path })
-            })
-
-            if (!urlResponse.ok) {
-                throw new Error('No se pudo generar URL de descarga')
-            }
-
-            const { download_url } = await urlResponse.json()
-
-            // Call Python backend SYNC endpoint
             const response = await fetch(`${backendUrl}/api/v1/audit/sync`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ file_url: download_url }),
+                body: JSON.stringify({ file_key: file.storage_path }),
             })
 
             if (!response.ok) {
@@ -34,6 +34,9 @@ export function AIChat({ fileContext }: AIChatProps) {
     const [input, setInput] = useState('')
     const [loading, setLoading] = useState(false)
     const messagesEndRef = useRef<HTMLDivElement>(null)
+    // Server-side conversation: the file context is only sent when it changes
+    const sessionIdRef = useRef<string | null>(null)
+    const sentContextRef = useRef<string | null>(null)
 
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
@@ -53,16 +56,32 @@ export function AIChat({ fileContext }: AIChatProps) {
 
         try {
             const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8005'
-            const response = await fetch(`${backendUrl}/api/v1/chat`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    message: userMessage,
-                    file_context: fileContext
-                }),
-            })
+            const contextKey = fileContext ? JSON.stringify(fileContext) : null
+            const post = () => {
+                const resend = !sessionIdRef.current || contextKey !== sentContextRef.current
+                return fetch(`${backendUrl}/api/v1/chat`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        message: userMessage,
+                        session_id: sessionIdRef.current,
+                        file_context: resend ? fileContext : undefined
+                    }),
+                })
+            }
+
+            let response = await post()
+            if (response.status === 404 && sessionIdRef.current) {
+                // Session expired on the server: start a new one with the file context
+                sessionIdRef.current = null
+                response = await post()
+            }
 
             const data = await response.json()
+            if (data.session_id) {
+                sessionIdRef.current = data.session_id
+                sentContextRef.current = contextKey
+            }
 
             setMessages(prev => [...prev, {
                 role: 'assistant',
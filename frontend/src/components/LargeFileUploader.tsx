@@ -11,7 +11,16 @@ interface LargeFileUploaderProps {
     onUploadComplete?: () => void
 }
 
-const CHUNK_SIZE = 50 * 1024 * 1024 // 50MB per chunk
+// Unfinished uploads are remembered per file so a reload can resume them
+const RESUME_KEY_PREFIX = 'sigebim-upload:'
+
+interface SavedUpload {
+    upload_id: string
+    file_key: string
+    part_size: number
+    total_parts: number
+    file_record_id: string
+}
 
 export function LargeFileUploader({ projectId, onUploadComplete }: LargeFileUploaderProps) {
     const [uploading, setUploading] = useState(false)
@@ -42,72 +51,113 @@ export function LargeFileUploader({ projectId, onUploadComplete }: LargeFileUplo
             if (!user) throw new Error('No autenticado')
 
             const sanitizedName = sanitizeFilename(file.name)
-            const chunks = Math.ceil(file.size / CHUNK_SIZE)
-            setTotalChunks(chunks)
-
             const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8005'
+            const resumeKey = `${RESUME_KEY_PREFIX}${projectId}:${file.name}:${file.size}:${file.lastModified}`
 
-            // 1. Initiate multipart upload
-            const initResponse = await fetch(`${backendUrl}/api/v1/storage/multipart/initiate`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    filename: sanitizedName,
-                    content_type: 'application/octet-stream',
-                    total_parts: chunks
-                })
-            })
+            // Part URLs arrive in pages; later pages are requested on demand
+            const partUrls = new Map<number, string>()
+            const addPartUrls = (urls: { part_number: number; upload_url: string }[]) => {
+                urls.forEach(({ part_number, upload_url }) => partUrls.set(part_number, upload_url))
+            }
 
-            if (!initResponse.ok) throw new Error('Error al iniciar subida')
+            // 1. Resume a previous upload of this file, or initiate a new one
+            let upload: SavedUpload | null = null
+            const uploadedParts = new Map<number, string>()
 
-            const { upload_id, file_key, part_urls } = await initResponse.json()
+            const saved = localStorage.getItem(resumeKey)
+            if (saved) {
+                const previous: SavedUpload = JSON.parse(saved)
+                const statusResponse = await fetch(
+                    `${backendUrl}/api/v1/storage/multipart/${encodeURIComponent(previous.upload_id)}/status` +
+                    `?file_key=${encodeURIComponent(previous.file_key)}`
+                )
+                if (statusResponse.ok) {
+                    const { uploaded_parts } = await statusResponse.json()
+                    uploaded_parts.forEach(({ PartNumber, ETag }: { PartNumber: number; ETag: string }) => {
+                        uploadedParts.set(PartNumber, ETag.replace(/"/g, ''))
+                    })
+                    upload = previous
+                } else {
+                    localStorage.removeItem(resumeKey)
+                }
+            }
 
-            // 2. Create file record
-            const { data: fileRecord, error: dbError } = await supabase
-                .from('files')
-                .insert({
-                    project_id: projectId,
-                    uploader_id: user.id,
-                    filename: file.name,
-                    storage_path: file_key,
-                    file_type: 'dxf',
-                    size_bytes: file.size,
-                    upload_status: 'uploading'
+            if (!upload) {
+                const initResponse = await fetch(`${backendUrl}/api/v1/storage/multipart/initiate`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({
+                        filename: sanitizedName,
+                        content_type: 'application/octet-stream',
+                        file_size: file.size
+                    })
                 })
-                .select()
-                .single()
 
-            if (dbError) throw new Error(dbError.message)
+                if (!initResponse.ok) throw new Error('Error al iniciar subida')
+
+                const { upload_id, file_key, part_size, total_parts, part_urls } = await initResponse.json()
+                addPartUrls(part_urls)
 
-            // 3. Upload each chunk
-            const uploadedParts: { PartNumber: number; ETag: string }[] = []
+                // 2. Create file record
+                const { data: fileRecord, error: dbError } = await supabase
+                    .from('files')
+                    .insert({
+                        project_id: projectId,
+                        uploader_id: user.id,
+                        filename: file.name,
+                        storage_path: file_key,
+                        file_type: 'dxf',
+                        size_bytes: file.size,
+                        upload_status: 'uploading'
+                    })
+                    .select()
+                    .single()
 
-            for (let i = 0; i < chunks; i++) {
-                setCurrentChunk(i + 1)
-                const start = i * CHUNK_SIZE
-                const end = Math.min(start + CHUNK_SIZE, file.size)
-                const chunk = file.slice(start, end)
+                if (dbError) throw new Error(dbError.message)
 
-                const partUrl = part_urls[i]?.upload_url
-                if (!partUrl) throw new Error(`No URL for part ${i + 1}`)
+                upload = { upload_id, file_key, part_size, total_parts, file_record_id: fileRecord.id }
+                localStorage.setItem(resumeKey, JSON.stringify(upload))
+            }
 
-                const response = await fetch(partUrl, {
-                    method: 'PUT',
-                    body: chunk,
-                    headers: { 'Content-Type': 'application/octet-stream' }
-                })
+            const { upload_id, file_key, part_size, total_parts, file_record_id } = upload
+            setTotalChunks(total_parts)
 
-                if (!response.ok) throw new Error(`Error subiendo parte ${i + 1}`)
+            const getPartUrl = async (partNumber: number) => {
+                if (!partUrls.has(partNumber)) {
+                    const pageResponse = await fetch(
+                        `${backendUrl}/api/v1/storage/multipart/${encodeURIComponent(upload_id)}/parts` +
+                        `?file_key=${encodeURIComponent(file_key)}&from=${partNumber}`
+                    )
+                    if (!pageResponse.ok) throw new Error(`No URL for part ${partNumber}`)
+                    addPartUrls((await pageResponse.json()).part_urls)
+                }
+                return partUrls.get(partNumber)
+            }
+
+            // 3. Upload the parts storage does not have yet
+            for (let partNumber = 1; partNumber <= total_parts; partNumber++) {
+                setCurrentChunk(partNumber)
+                if (!uploadedParts.has(partNumber)) {
+                    const start = (partNumber - 1) * part_size
+                    const end = Math.min(start + part_size, file.size)
+                    const chunk = file.slice(start, end)
 
-                const etag = response.headers.get('ETag')
-                if (etag) {
-                    uploadedParts.push({
-                        PartNumber: i + 1,
-                        ETag: etag.replace(/"/g, '')
+                    const partUrl = await getPartUrl(partNumber)
+                    if (!partUrl) throw new Error(`No URL for part ${partNumber}`)
+
+                    const response = await fetch(partUrl, {
+                        method: 'PUT',
+                        body: chunk,
+                        headers: { 'Content-Type': 'application/octet-stream' }
                     })
+
+                    if (!response.ok) throw new Error(`Error subiendo parte ${partNumber}`)
+
+                    const etag = response.headers.get('ETag')
+                    if (etag) uploadedParts.set(partNumber, etag.replace(/"/g, ''))
                 }
 
-                setProgress(Math.round(((i + 1) / chunks) * 100))
+                setProgress(Math.round((partNumber / total_parts) * 100))
             }
 
             // 4. Complete multipart upload
@@ -117,17 +167,18 @@ export function LargeFileUploader({ projectId, onUploadComplete }: LargeFileUplo
                 body: JSON.stringify({
                     file_key,
                     upload_id,
-                    parts: uploadedParts
+                    parts: Array.from(uploadedParts, ([PartNumber, ETag]) => ({ PartNumber, ETag }))
                 })
             })
 
             if (!completeResponse.ok) throw new Error('Error al completar subida')
+            localStorage.removeItem(resumeKey)
 
             // 5. Update file status
             await supabase
                 .from('files')
                 .update({ upload_status: 'uploaded' })
-                .eq('id', fileRecord.id)
+                .eq('id', file_record_id)
 
             setStatus('complete')
             onUploadComplete?.()